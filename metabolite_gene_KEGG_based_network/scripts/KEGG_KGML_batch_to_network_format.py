@@ -0,0 +1,411 @@
+#!/usr/bin/env python2
+DESCRIPTION = '''
+Converts a directory (or list) of KEGG KGML files into a single merged network using
+KEGG_reaction_KGML_to_network_format.py, all within one process.
+
+NOTE:
+	- Maps are converted by a pool of --workers threads; rows are written by a single writer
+	   in the order the KGML files were given (sorted by file name for --dir).
+	- Node IDs are prefixed with the name of the map they came from ("NAME__"), where NAME is
+	   the KGML file name without the '.kgml' extension.
+	- Maps that fail to convert are reported and left out of the merged files.
+	- --nnf also writes the merged edges in nested network format (each map is a network NAME
+	   inside the "KEGG" parent network) while the edges file is written.
+	- --enrich and --deferred work like they do in KEGG_reaction_KGML_to_network_format.py; with
+	   --deferred the pending entries of all maps are written to one file (with "NAME__" node IDs)
+	   for fill_KEGG_node_annotations.py.
+	- --metrics writes a JSON build report with the fetch/parse metrics of each map (see
+	   KEGG_reaction_KGML_to_network_format.py --metrics) and of all maps combined.
+	- See KEGG_reaction_KGML_to_network_format.py for the --cache_*, --store, --backend and
+	   --threads options (shared by all maps).
+	- With --shard_dir the nodes/edges of each map are kept in their own (shard) files, together
+	   with a manifest of the SHA1 of the KGML file each shard was made from. Later runs only
+	   convert maps whose KGML file changed (or is new), drop the shards of maps that are no
+	   longer given, and build the merged files from the shards.
+	- The manifest is saved every --shard_save_every converted maps (or every 30 seconds) while the
+	   maps are written, so a run that is killed part way keeps the shards it already finished.
+'''
+import sys
+import os
+import argparse
+import logging
+import time
+import json
+import hashlib
+import threading
+from multiprocessing.pool import ThreadPool
+import KEGG_reaction_KGML_to_network_format as KGML
+
+## Pass arguments.
+def main():
+	## Pass command line arguments.
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=DESCRIPTION)
+	parser.add_argument('-d', '--dir', metavar='kgml/',
+		required=False, default=None, type=str,
+		help='Directory with *.kgml files to convert'
+	)
+	parser.add_argument('-l', '--list', metavar='kgml_files.txt',
+		required=False, default=None, type=lambda x: KGML.File(x, 'r'),
+		help='File listing the KGML files to convert (one per line)'
+	)
+	parser.add_argument('-e', '--edges', metavar='KEGG_Pathway_Networks.edges.txt',
+		required=True, type=lambda x: KGML.File(x, 'w'),
+		help='Output [gzip] merged network edges file (required)'
+	)
+	parser.add_argument('-n', '--nodes', metavar='KEGG_Pathway_Networks.nodes.txt',
+		required=True, type=lambda x: KGML.File(x, 'w'),
+		help='Output [gzip] merged network node info file (required)'
+	)
+	parser.add_argument('--nnf', metavar='KEGG_Pathway_Networks.edges.nnf',
+		required=False, default=None, type=lambda x: KGML.File(x, 'w'),
+		help='Output [gzip] merged network edges file in nested network format (default: not written)'
+	)
+	parser.add_argument('-w', '--workers',
+		required=False, default=4, type=int,
+		help='Number of maps to convert at the same time (default: %(default)s)'
+	)
+	parser.add_argument('--cache_dir', metavar='kegg_cache',
+		required=False, default=None, type=str,
+		help='Directory to cache KEGG web pages in (default: no caching)'
+	)
+	parser.add_argument('--cache_ttl',
+		required=False, default=30, type=float,
+		help='Number of days a cached page is valid for; 0 = never expire (default: %(default)s)'
+	)
+	parser.add_argument('--cache_max_size',
+		required=False, default=2048, type=float,
+		help='Max size (MB) of the cache; least recently used pages are removed once exceeded (default: %(default)s)'
+	)
+	parser.add_argument('--cache_only',
+		required=False, action='store_true',
+		help='Offline mode; only use pages in --cache_dir and never download (default: %(default)s)'
+	)
+	parser.add_argument('-s', '--store', metavar='KEGG_annotations.sqlite',
+		required=False, default=None, type=str,
+		help='SQLite database to share fetched entry info between maps (default: no store)'
+	)
+	parser.add_argument('-b', '--backend',
+		required=False, default='html', choices=['html', 'rest'],
+		help='Get entry info from kegg.jp web pages (html) or KEGG REST flat files (rest) (default: %(default)s)'
+	)
+	parser.add_argument('--rest_url', metavar='http://rest.kegg.jp',
+		required=False, default='http://rest.kegg.jp', type=str,
+		help='Base URL of KEGG REST API (default: %(default)s)'
+	)
+	parser.add_argument('-t', '--threads',
+		required=False, default=1, type=int,
+		help='Number of KEGG pages to download at the same time for each map (default: %(default)s)'
+	)
+	parser.add_argument('--enrich', metavar='compound,reaction',
+		required=False, default=','.join(KGML.ENTRY_TYPES), type=KGML.enrich_types,
+		help='Comma separated list of entry types to fetch info for (default: %(default)s)'
+	)
+	parser.add_argument('--deferred', metavar='KEGG_Pathway_Networks.pending.txt',
+		required=False, default=None, type=lambda x: KGML.File(x, 'w'),
+		help='Dont fetch any info; write the entries (of --enrich types) that need info to this file for fill_KEGG_node_annotations.py (default: fetch info now)'
+	)
+	parser.add_argument('--metrics', metavar='build_report.json',
+		required=False, default=None, type=str,
+		help='Output JSON file with the fetch/parse metrics of each map and the whole build (default: not written)'
+	)
+	parser.add_argument('--shard_dir', metavar='kgml_shards',
+		required=False, default=None, type=str,
+		help='Directory to keep the converted nodes/edges of each map in, so unchanged maps are not converted again (default: convert all maps)'
+	)
+	parser.add_argument('--shard_save_every',
+		required=False, default=10, type=int,
+		help='Save the --shard_dir manifest after every N converted maps (and at least every 30 seconds) (default: %(default)s)'
+	)
+	parser.add_argument('--debug',
+		required=False, action='store_true',
+		help='Print DEBUG info (default: %(default)s)'
+	)
+	args = parser.parse_args()
+
+	## Set up basic debugger
+	logFormat = "[%(levelname)s]: %(message)s"
+	logging.basicConfig(format=logFormat, stream=sys.stderr, level=logging.INFO)
+	if args.debug:
+		logging.getLogger().setLevel(logging.DEBUG)
+
+	logging.debug('%s', args) ## DEBUG
+
+	## Get list of KGML files to convert
+	kgml_files = []
+	if args.dir is not None:
+		kgml_files.extend(sorted([os.path.join(args.dir, x) for x in os.listdir(args.dir) if x.endswith('.kgml')]))
+	if args.list is not None:
+		with args.list as list_file:
+			kgml_files.extend([x.strip() for x in list_file if x.strip() and not x.startswith('#')])
+	if not kgml_files:
+		logging.error('No KGML files given (use --dir and/or --list)') ## ERROR
+		sys.exit(1)
+
+	## Set up KEGG web page cache and store shared by all maps
+	cache = None
+	if args.cache_dir is not None:
+		cache = KGML.KEGG_page_cache(args.cache_dir, args.cache_ttl, args.cache_max_size, args.cache_only)
+	elif args.cache_only:
+		logging.error('--cache_only requires --cache_dir to be set')
+		sys.exit(1)
+	store = None
+	if args.store is not None:
+		store = KGML.KEGG_annotation_store(args.store)
+
+	report = {} if args.metrics is not None else None
+	def convert(nnf_file=None, pending_file=None):
+		with args.edges as edge_file, args.nodes as nodes_file:
+			KEGG_KGML_batch_2_Cytoscape_network(kgml_files, edge_file, nodes_file, args.workers,
+				cache, store, args.threads, args.backend, args.rest_url, args.shard_dir, nnf_file, report,
+				args.enrich, pending_file, args.shard_save_every)
+	def convert_nnf(pending_file=None):
+		if args.nnf is not None:
+			with args.nnf as nnf_file:
+				convert(nnf_file, pending_file)
+		else:
+			convert(None, pending_file)
+	if args.deferred is not None:
+		with args.deferred as pending_file:
+			convert_nnf(pending_file)
+	else:
+		convert_nnf()
+	
+	if report is not None:
+		with open(args.metrics, 'w') as metrics_file:
+			json.dump(report, metrics_file, indent=1, sort_keys=True)
+
+	if store is not None:
+		store.close()
+		logging.info('KEGG annotation store: %s from store, %s fetched', store.hits, store.fetched) ## INFO
+
+	if cache is not None:
+		cache.evict()
+		logging.info('KEGG page cache: %s hits, %s misses', cache.hits, cache.misses) ## INFO
+
+
+
+def KEGG_KGML_batch_2_Cytoscape_network(kgml_files, edge_file, nodes_file, workers=4, cache=None, store=None, threads=1, backend='html', rest_url='http://rest.kegg.jp', shard_dir=None, nnf_file=None, report=None, enrich=None, pending_file=None, shard_save_every=10):
+	'''
+	Converts each KGML file in kgml_files and writes all nodes/edges (prefixed by "NAME__") to
+	nodes_file/edge_file.
+
+	Maps are converted by 'workers' threads, which share one session (so connections to kegg.jp
+	are kept alive between maps), the page cache and the annotation store.
+	
+	If shard_dir is given, maps whose KGML file has not changed since they were last converted
+	(with the same backend/enrich/deferred settings) are copied from their shard files instead of being converted.
+	
+	If nnf_file is given the edges of each map are also written to it in nested network format
+	(see KGML.write_nnf()) as they are written to edge_file.
+	
+	If report (dict) is given it is filled with the metrics of each map ('maps') and of all
+	converted maps combined ('total'), see KGML.KEGG_fetch_metrics.
+	
+	enrich/pending_file: see KGML.KEGG_KGML_2_Cytoscape_network().
+	
+	shard_save_every: Save the shard manifest after every N converted maps (see Shard_manifest.checkpoint())
+	'''
+	session = KGML.new_session(max(1, workers) * max(1, threads))
+	shards = None
+	if shard_dir is not None:
+		shards = Shard_manifest(shard_dir, shard_save_every)
+	## Shards are only reused if they were made with the same settings
+	settings = '%s|%s|%s' % (backend, 'all' if enrich is None else ','.join(sorted(enrich)), 'fetched' if pending_file is None else 'deferred')
+
+	def convert(kgml_file_name):
+		## Convert a single map; returns [NAME, status, nodes, edges, pending, metrics] (status = converted/cached/failed)
+		name = kgml_name(kgml_file_name)
+		metrics = KGML.KEGG_fetch_metrics() if report is not None else None
+		start = time.time()
+		try:
+			if shards is not None:
+				digest = file_sha1(kgml_file_name)
+				if shards.is_current(name, digest, settings):
+					logging.debug('KGML file of %s has not changed; using shard', name) ## DEBUG
+					return [name, 'cached', None, None, None, metrics]
+			logging.info('Started processing %s', name) ## INFO
+			fetcher = KGML.KEGG_page_fetcher(cache, threads, backend, rest_url, session, metrics)
+			pending = [] if pending_file is not None else None
+			with KGML.File(kgml_file_name, 'r') as kgml_file:
+				nodes, edges = KGML.parse_KGML(kgml_file, fetcher, store, enrich, pending)
+			if shards is not None:
+				shards.put(name, digest, settings, nodes, edges, pending)
+		except Exception as e:
+			logging.error('Failed to convert %s: %s', kgml_file_name, e) ## ERROR
+			## Let other maps/processes fetch the entries this map claimed but did not fill
+			if store is not None:
+				store.release_claims()
+			if shards is not None:
+				shards.remove(name)
+			return [name, 'failed', None, None, None, metrics]
+		if metrics is not None:
+			metrics.add_time('total', time.time() - start)
+		return [name, 'converted', nodes, edges, pending, metrics]
+
+	nodes_file.write(KGML.NODES_HEADER)
+	edge_file.write(KGML.EDGES_HEADER)
+
+	start = time.time()
+	counts = {'converted':0, 'cached':0, 'failed':0}
+	total_metrics = KGML.KEGG_fetch_metrics()
+	if report is not None:
+		report['maps'] = {}
+	pool = ThreadPool(max(1, workers))
+	try:
+		## imap returns maps in input order, so only this (main) thread writes to the output files.
+		for name, status, nodes, edges, pending, metrics in pool.imap(convert, kgml_files):
+			counts[status] += 1
+			if report is not None:
+				report['maps'][name] = metrics.summary()
+				report['maps'][name]['status'] = status
+				total_metrics.merge(metrics)
+			if status == 'failed':
+				continue
+			if shards is not None:
+				n_nodes, n_edges = shards.splice(name, nodes_file, edge_file, nnf_file, pending_file)
+			else:
+				KGML.write_nodes(nodes_file, nodes, name+'__')
+				KGML.write_edges(edge_file, edges, name+'__')
+				if nnf_file is not None:
+					KGML.write_nnf(nnf_file, edges, name, name+'__')
+				if pending_file is not None:
+					KGML.write_pending(pending_file, pending, name+'__')
+				n_nodes, n_edges = len(nodes), len(edges)
+			logging.info('Done %s (%s nodes, %s edges; %s)', name, n_nodes, n_edges, status) ## INFO
+			if shards is not None and status == 'converted':
+				shards.checkpoint()
+	finally:
+		pool.close()
+		pool.join()
+		if shards is not None:
+			## Drop maps that are no longer given (e.g. removed from br08901.keg)
+			shards.remove_all_except([kgml_name(x) for x in kgml_files])
+			shards.save()
+	logging.info('Converted %s maps, used %s unchanged maps from shards (%s failed) in %.1f seconds', 
+		counts['converted'], counts['cached'], counts['failed'], time.time() - start) ## INFO
+	if report is not None:
+		report['total'] = total_metrics.summary()
+		report['total']['maps'] = counts
+		report['total']['seconds']['wall'] = time.time() - start
+
+
+
+class Shard_manifest(object):
+	'''
+	Nodes/edges files (shards) of each converted map plus a manifest (manifest.json) of the SHA1
+	of the KGML file and the settings (backend, enrich types, deferred) each shard was made with.
+	
+	 - Shards hold the rows already prefixed with "NAME__" and without headers, so the merged
+	    files are just the shards joined together.
+	 - Maps converted with --deferred also have a shard of their pending entries.
+	 - Shards are written to a tmp file and renamed, and a map is only added to the manifest once
+	    its shards are written (so an interrupted run never leaves a partial shard behind).
+	 - checkpoint() saves the manifest after every 'save_every' converted maps (or 'save_seconds'
+	    seconds), so the maps converted before a run is killed do not have to be converted again.
+	'''
+	def __init__(self, shard_dir, save_every=10, save_seconds=30):
+		self.shard_dir = shard_dir
+		self.save_every = max(1, save_every)
+		self.save_seconds = save_seconds
+		self.unsaved = 0 # Maps converted since the manifest was last saved
+		self.last_save = time.time()
+		self.manifest_file = os.path.join(shard_dir, 'manifest.json')
+		self.lock = threading.Lock()
+		if not os.path.exists(shard_dir):
+			os.makedirs(shard_dir)
+		self.maps = {} # {NAME:{'kgml_sha1':, 'settings':, 'nodes':, 'edges':}}
+		if os.path.exists(self.manifest_file):
+			with open(self.manifest_file, 'r') as manifest:
+				self.maps = json.load(manifest)
+	def shard_files(self, name):
+		return [os.path.join(self.shard_dir, name+'.nodes.txt'), os.path.join(self.shard_dir, name+'.edges.txt')]
+	def pending_shard(self, name):
+		return os.path.join(self.shard_dir, name+'.pending.txt')
+	def is_current(self, name, digest, settings):
+		## True if the shards of map 'name' were made from a KGML file with SHA1 'digest' using 'settings'
+		with self.lock:
+			info = self.maps.get(name)
+		if info is None or info['kgml_sha1'] != digest or info.get('settings') != settings:
+			return False
+		shards = self.shard_files(name) + ([self.pending_shard(name)] if info.get('pending') else [])
+		return all([os.path.exists(x) for x in shards])
+	def put(self, name, digest, settings, nodes, edges, pending=None):
+		nodes_shard, edges_shard = self.shard_files(name)
+		shards = [[nodes_shard, KGML.write_nodes, nodes], [edges_shard, KGML.write_edges, edges]]
+		if pending is not None:
+			shards.append([self.pending_shard(name), KGML.write_pending, pending])
+		for shard, write_func, rows in shards:
+			with open(shard+'.tmp', 'w') as shard_file:
+				write_func(shard_file, rows, name+'__')
+			os.rename(shard+'.tmp', shard)
+		with self.lock:
+			self.maps[name] = {'kgml_sha1':digest, 'settings':settings, 'nodes':len(nodes), 'edges':len(edges), 'pending':pending is not None}
+	def splice(self, name, nodes_file, edge_file, nnf_file=None, pending_file=None):
+		## Copy the shards of map 'name' to the merged files (and the edges to nnf_file in nested network format)
+		## RETURN: [number of nodes, number of edges]
+		nodes_shard, edges_shard = self.shard_files(name)
+		with open(nodes_shard, 'r') as shard_file:
+			for line in shard_file:
+				nodes_file.write(line)
+		if nnf_file is not None:
+			KGML.write_nnf(nnf_file, [], name)
+		with open(edges_shard, 'r') as shard_file:
+			for line in shard_file:
+				edge_file.write(line)
+				if nnf_file is not None:
+					KGML.write_nnf(nnf_file, [line.rstrip('\n').split('\t')], name, parent=False)
+		if pending_file is not None:
+			with open(self.pending_shard(name), 'r') as shard_file:
+				for line in shard_file:
+					pending_file.write(line)
+		with self.lock:
+			info = self.maps[name]
+		return [info['nodes'], info['edges']]
+	def remove(self, name):
+		with self.lock:
+			self.maps.pop(name, None)
+		for shard in self.shard_files(name) + [self.pending_shard(name)]:
+			if os.path.exists(shard):
+				os.remove(shard)
+	def remove_all_except(self, names):
+		names = set(names)
+		for name in [x for x in self.maps.keys() if x not in names]:
+			logging.info('Removing shards of %s (map no longer given)', name) ## INFO
+			self.remove(name)
+	def checkpoint(self):
+		## Called for each converted map; saves the manifest every save_every maps or save_seconds seconds
+		self.unsaved += 1
+		if self.unsaved >= self.save_every or time.time() - self.last_save >= self.save_seconds:
+			self.save()
+	def save(self):
+		with self.lock:
+			with open(self.manifest_file+'.tmp', 'w') as manifest:
+				json.dump(self.maps, manifest, indent=1, sort_keys=True)
+			os.rename(self.manifest_file+'.tmp', self.manifest_file)
+		self.unsaved = 0
+		self.last_save = time.time()
+
+
+
+def file_sha1(file_name, block_size=1<<20):
+	## SHA1 of the contents of file_name
+	digest = hashlib.sha1()
+	with open(file_name, 'rb') as fh:
+		for block in iter(lambda: fh.read(block_size), b''):
+			digest.update(block)
+	return digest.hexdigest()
+
+
+
+def kgml_name(kgml_file_name):
+	## Name of map from KGML file name (e.g. "kgml/00010_Glycolysis.kgml" -> "00010_Glycolysis")
+	name = os.path.basename(kgml_file_name)
+	if name.endswith('.gz'):
+		name = name[:-3]
+	if name.endswith('.kgml'):
+		name = name[:-5]
+	return name
+
+
+if __name__ == '__main__':
+	main()
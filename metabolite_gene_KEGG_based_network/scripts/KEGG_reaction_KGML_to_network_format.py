@@ -6,16 +6,53 @@ NOTE:
 	- KEGG reaction maps have compounds as nodes and reactions as edges.
 	- Also adds 'gene' and 'ortholog' nodes.
 	- Nodes without edges will have self edges so Cytoscape will plot them
+	- Pages fetched from kegg.jp can be stored in an on-disk cache (--cache_dir) so
+	   rebuilds do not have to download every compound/reaction/map page again.
+	- With --threads > 1 all linked pages are downloaded concurrently (sharing one
+	   keep-alive session) before the entries are parsed in their original order.
+	- The info fetched for each KEGG ID can be stored in a database (--store) that is shared
+	   by all maps in a build, so each compound/reaction is only fetched and parsed once.
+	- --backend rest gets entry info from the KEGG REST API (flat files; up to 10 IDs per request)
+	   instead of scraping the kegg.jp web page of each entry.
+	- Failed downloads (connection errors, timeouts, HTTP 5xx/429) are retried up to --retries times
+	   with exponential backoff and jitter; the run fails if a page still can not be downloaded.
+	- --stream parses the KGML file incrementally and writes each node/edge as soon as it is
+	   parsed, so memory use does not grow with the size of the map (e.g. rn01100).
+	- --nnf also writes the edges in Cytoscape nested network format (NNF), as the network
+	   --nnf_name inside a "KEGG" parent network.
+	- --metrics writes a JSON summary of the pages fetched and parsed for each entry type
+	   (number of fetches, latency percentiles, bytes, cache hits, parse time and table
+	   structure fallbacks) and the time spent writing the output files.
+	- --enrich selects which entry types get their info fetched; the other types are written
+	   with '-' as their name/info.
+	- --deferred writes the network without fetching any info ('-' name/info) and lists the
+	   entries that need info in a pending file, which fill_KEGG_node_annotations.py uses
+	   to fill in their name/info later.
 '''
 import sys
 import os
 import argparse
 import logging
 import gzip
+import hashlib
+import time
+import socket
+import sqlite3
+import collections
+import threading
+import json
+import math
+import random
+import tempfile
 import requests
+from multiprocessing.pool import ThreadPool
 from bs4 import BeautifulSoup
 import xml.etree.ElementTree as ET
 
+ENTRY_TYPES = ['compound', 'reaction', 'map', 'gene', 'ortholog']
+NODES_HEADER = 'node_id\tkegg_id\tname\ttype\tinfo\tlink\tx\ty\twidth\theight\tshape\n'
+EDGES_HEADER = 'node_1\tnode_2\n'
+
 ## Pass arguments.
 def main():
 	## Pass command line arguments. 
@@ -32,6 +69,74 @@ def main():
 		required=True, default=sys.stdout, type=lambda x: File(x, 'w'),
 		help='Output [gzip] network node info file (required)'
 	)
+	parser.add_argument('--cache_dir', metavar='kegg_cache',
+		required=False, default=None, type=str,
+		help='Directory to cache KEGG web pages in (default: no caching)'
+	)
+	parser.add_argument('--cache_ttl',
+		required=False, default=30, type=float,
+		help='Number of days a cached page is valid for; 0 = never expire (default: %(default)s)'
+	)
+	parser.add_argument('--cache_max_size',
+		required=False, default=2048, type=float,
+		help='Max size (MB) of the cache; least recently used pages are removed once exceeded (default: %(default)s)'
+	)
+	parser.add_argument('--cache_only',
+		required=False, action='store_true',
+		help='Offline mode; only use pages in --cache_dir and never download (default: %(default)s)'
+	)
+	parser.add_argument('-s', '--store', metavar='KEGG_annotations.sqlite',
+		required=False, default=None, type=str,
+		help='SQLite database to share fetched entry info between runs/processes (default: no store)'
+	)
+	parser.add_argument('-b', '--backend',
+		required=False, default='html', choices=['html', 'rest'],
+		help='Get entry info from kegg.jp web pages (html) or KEGG REST flat files (rest) (default: %(default)s)'
+	)
+	parser.add_argument('--rest_url', metavar='http://rest.kegg.jp',
+		required=False, default='http://rest.kegg.jp', type=str,
+		help='Base URL of KEGG REST API (default: %(default)s)'
+	)
+	parser.add_argument('-t', '--threads',
+		required=False, default=1, type=int,
+		help='Number of KEGG pages to download at the same time (default: %(default)s)'
+	)
+	parser.add_argument('--retries',
+		required=False, default=5, type=int,
+		help='Number of times to retry a failed download (default: %(default)s)'
+	)
+	parser.add_argument('--backoff',
+		required=False, default=2, type=float,
+		help='Base delay (seconds) between retries; doubles after each retry (default: %(default)s)'
+	)
+	parser.add_argument('--max_backoff',
+		required=False, default=120, type=float,
+		help='Max delay (seconds) between retries (default: %(default)s)'
+	)
+	parser.add_argument('--nnf', metavar='network.edges.nnf',
+		required=False, default=None, type=lambda x: File(x, 'w'),
+		help='Output [gzip] network edges file in nested network format (default: not written)'
+	)
+	parser.add_argument('--nnf_name', metavar='rn00290',
+		required=False, default='network', type=str,
+		help='Name of the network in the --nnf file (default: %(default)s)'
+	)
+	parser.add_argument('--enrich', metavar='compound,reaction',
+		required=False, default=','.join(ENTRY_TYPES), type=enrich_types,
+		help='Comma separated list of entry types to fetch info for (default: %(default)s)'
+	)
+	parser.add_argument('--deferred', metavar='network.pending.txt',
+		required=False, default=None, type=lambda x: File(x, 'w'),
+		help='Dont fetch any info; write the entries (of --enrich types) that need info to this file for fill_KEGG_node_annotations.py (default: fetch info now)'
+	)
+	parser.add_argument('--metrics', metavar='metrics.json',
+		required=False, default=None, type=str,
+		help='Output JSON file with fetch/parse/output metrics (default: not written)'
+	)
+	parser.add_argument('--stream',
+		required=False, action='store_true',
+		help='Parse KGML file incrementally and write nodes/edges as they are parsed (default: %(default)s)'
+	)
 	parser.add_argument('--debug', 
 		required=False, action='store_true', 
 		help='Print DEBUG info (default: %(default)s)'
@@ -47,12 +152,64 @@ def main():
 	logging.debug('%s', args) ## DEBUG
 	
 	
-	with args.kgml as kgml_file, args.edges as edge_file, args.nodes as nodes_file:
-		KEGG_KGML_2_Cytoscape_network(kgml_file, edge_file, nodes_file)
+	## Set up KEGG web page cache
+	cache = None
+	if args.cache_dir is not None:
+		cache = KEGG_page_cache(args.cache_dir, args.cache_ttl, args.cache_max_size, args.cache_only)
+	elif args.cache_only:
+		logging.error('--cache_only requires --cache_dir to be set')
+		sys.exit(1)
+	
+	metrics = KEGG_fetch_metrics() if args.metrics is not None else None
+	fetcher = KEGG_page_fetcher(cache, args.threads, args.backend, args.rest_url, metrics=metrics,
+		retries=args.retries, backoff=args.backoff, max_backoff=args.max_backoff)
+	
+	## Set up store of entry info shared between maps
+	store = None
+	if args.store is not None:
+		store = KEGG_annotation_store(args.store)
+	
+	def convert(nnf_file=None, pending_file=None):
+		with args.kgml as kgml_file, args.edges as edge_file, args.nodes as nodes_file:
+			if args.stream:
+				stream_KGML_2_Cytoscape_network(kgml_file, edge_file, nodes_file, fetcher, store, nnf_file, args.nnf_name, args.enrich, pending_file)
+			else:
+				KEGG_KGML_2_Cytoscape_network(kgml_file, edge_file, nodes_file, fetcher, store, nnf_file, args.nnf_name, args.enrich, pending_file)
+	def convert_nnf(pending_file=None):
+		if args.nnf is not None:
+			with args.nnf as nnf_file:
+				convert(nnf_file, pending_file)
+		else:
+			convert(None, pending_file)
+	start = time.time()
+	try:
+		if args.deferred is not None:
+			with args.deferred as pending_file:
+				convert_nnf(pending_file)
+		else:
+			convert_nnf()
+	except:
+		## Let other processes fetch the entries we claimed but did not fill
+		if store is not None:
+			store.release_claims()
+		raise
+	
+	if metrics is not None:
+		metrics.add_time('total', time.time() - start)
+		with open(args.metrics, 'w') as metrics_file:
+			json.dump(metrics.summary(), metrics_file, indent=1, sort_keys=True)
+	
+	if store is not None:
+		store.close()
+		logging.info('KEGG annotation store: %s from store, %s fetched', store.hits, store.fetched) ## INFO
+	
+	if cache is not None:
+		cache.evict()
+		logging.info('KEGG page cache: %s hits, %s misses', cache.hits, cache.misses) ## INFO
 
 
 
-def KEGG_KGML_2_Cytoscape_network(kgml_file, edge_file, nodes_file):
+def KEGG_KGML_2_Cytoscape_network(kgml_file, edge_file, nodes_file, fetcher=None, store=None, nnf_file=None, nnf_name='network', enrich=None, pending_file=None):
 	'''
 	entry: Info about a node or edge in the network
 		type="reaction": KEGG reaction info (e.g. a enzymatic reaction)
@@ -73,62 +230,259 @@ def KEGG_KGML_2_Cytoscape_network(kgml_file, edge_file, nodes_file):
 		"compound" OR "reaction" OR "map" type entries
 	edges:
 		"relation" and "reaction" type entries (Need both as some compounds arent covered by "relation" tags only "reaction" tags)
+	
+	fetcher: KEGG_page_fetcher used to get the pages linked to each entry.
+		If fetcher.threads > 1 (or fetcher.backend='rest') the info for all entries is downloaded before the entries are parsed.
+	store: KEGG_annotation_store with info already fetched for each KEGG ID (None = always fetch info)
+		Only the pages of entries claimed by this process are downloaded.
+	nnf_file: If given the edges are also written to this file in nested network format (see write_nnf()).
+	enrich: Entry types to fetch info for (None = all types); other types are written with '-' name/info.
+	pending_file: If given no info is fetched; entries (of 'enrich' types) that need info are written to
+		this file instead (see write_pending()).
 	'''
+	pending = [] if pending_file is not None else None
+	nodes, edges = parse_KGML(kgml_file, fetcher, store, enrich, pending)
+	start = time.time()
+	if pending_file is not None:
+		write_pending(pending_file, pending)
+	
+	## Write nodes to file
+	nodes_file.write(NODES_HEADER)
+	write_nodes(nodes_file, nodes)
+	
+	## Write edges to file
+	edge_file.write(EDGES_HEADER)
+	write_edges(edge_file, edges)
+	if nnf_file is not None:
+		write_nnf(nnf_file, edges, nnf_name)
+	
+	if fetcher is not None and fetcher.metrics is not None:
+		fetcher.metrics.add_time('output', time.time() - start)
+
+
+
+def parse_KGML(kgml_file, fetcher=None, store=None, enrich=None, pending=None):
+	## Parse KGML file into nodes and edges (see KEGG_KGML_2_Cytoscape_network())
+	## enrich: entry types to fetch info for (None = all types)
+	## pending: list that the entries that need info are added to instead of fetching their info (None = fetch info now)
+	## RETURN: [nodes, edges]
+	##   nodes: list of [node_id, kegg_id, name, type, info, link, x, y, width, height, shape]
+	##   edges: Edge_index of (node_1, node_2) edges
+	if fetcher is None:
+		fetcher = KEGG_page_fetcher()
+	
 	tree = ET.parse(kgml_file)
 	root = tree.getroot()
 	title = root.attrib['title']
 	
+	## Download info for all entries at once (entries are still parsed in order below)
+	prefetch_entries([child for child in root if child.tag == 'entry' and enrich_status(child, enrich, pending) == 'fetch'], fetcher, store)
+	
 	nodes = [] # all 'entry' tags
-	edges = [] # build from 'relation' and 'reaction' tags
+	edges = Edge_index() # build from 'relation' and 'reaction' tags
 	
 	for child in root:
 		logging.debug('%s %s', child.tag, child.attrib) ## DEBUG
 		if child.tag == 'entry':
-			nodes.append(parse_entry(child))
+			status = enrich_status(child, enrich, pending)
+			if status == 'defer':
+				pending.append(child)
+			nodes.append(parse_entry(child, fetcher, store, status == 'fetch'))
 			logging.debug("Entry parsed: %s", nodes[-1])
 		elif child.tag == 'relation':
 			for edge in parse_relation(child):
 				## Add edge from 'relation' if not in list
 				## [multiple 'relation' edges can pass through the same compound so we can end up with duplicate edges]
-				if edge not in edges:
-					edges.append(edge)
+				if edges.add(edge):
 					logging.debug("Relation parsed and new edge added: %s", edge)
 		elif child.tag == 'reaction':
 			for edge in parse_reaction(child):
 				## Add edge from 'reaction' if not in list (i.e. compound enters or exits the network)
 				## [will not be in 'relation' tags becuase it is not between two reactions]
-				if edge not in edges:
-					edges.append(edge)
+				if edges.add(edge):
 					logging.debug("Reaction parsed and new edge added: %s", edge)
 		else:
 			logging.info('Found tag in xml file that we havent accounted for: %s', child.attrib) ## INFO
 	
 	## Add edges for nodes without edges defined in KGML file.
-	all_edges = []
-	for x in edges:
-		all_edges.extend(x)
-	all_edges = set(all_edges)
-	
 	for n in nodes:
 		n_id = n[0]
-		if n_id not in all_edges:
-			edges.append([n_id, n_id]) # Add edge to self
+		if edges.degree[n_id] == 0:
+			edges.add([n_id, n_id]) # Add edge to self
 	
-	## Write nodes to file
-	nodes_file.write('node_id\tkegg_id\tname\ttype\tinfo\tlink\tx\ty\twidth\theight\tshape\n')
-	for x in nodes:
-		nodes_file.write('\t'.join([str(y) for y in x])+'\n')
+	return [nodes, edges]
+
+
+
+def stream_KGML_2_Cytoscape_network(kgml_file, edge_file, nodes_file, fetcher=None, store=None, nnf_file=None, nnf_name='network', enrich=None, pending_file=None, window=100):
+	'''
+	Same output as KEGG_KGML_2_Cytoscape_network() but parses the KGML file incrementally.
 	
-	## Write edges to file
-	edge_file.write('node_1\tnode_2\n')
+	 - Each 'entry' is written to nodes_file (and each 'relation'/'reaction' edge to edge_file) 
+	    once it has been parsed, and is then removed from the tree.
+	 - Only the seen edges (for removing duplicates) and the IDs of the nodes (for adding self
+	    edges at the end) are kept in memory.
+	 - If the info for entries is prefetched (fetcher.threads > 1 or fetcher.backend='rest'),
+	    up to 'window' entries are buffered so their info can be downloaded together.
+	'''
+	if fetcher is None:
+		fetcher = KEGG_page_fetcher()
+	if fetcher.threads == 1 and fetcher.backend != 'rest':
+		window = 1
+	
+	node_ids = [] # IDs of all nodes written
+	output_time = [0.0] # Seconds spent writing output (for --metrics)
+	edges = Edge_index(ordered=False)
+	entries = [] # 'entry' elements waiting to be written
+	
+	deferred = [] if pending_file is not None else None
+	def write_entries():
+		prefetch_entries([x for x in entries if enrich_status(x, enrich, deferred) == 'fetch'], fetcher, store)
+		for entry in entries:
+			status = enrich_status(entry, enrich, deferred)
+			if status == 'defer':
+				write_pending(pending_file, [entry])
+			node = parse_entry(entry, fetcher, store, status == 'fetch')
+			logging.debug("Entry parsed: %s", node)
+			start = time.time()
+			write_nodes(nodes_file, [node])
+			output_time[0] += time.time() - start
+			node_ids.append(node[0])
+		del entries[:]
+		fetcher.pages.clear()
+	
+	def write_edge(edge):
+		start = time.time()
+		write_edges(edge_file, [edge])
+		if nnf_file is not None:
+			write_nnf(nnf_file, [edge], nnf_name, parent=False)
+		output_time[0] += time.time() - start
+	
+	nodes_file.write(NODES_HEADER)
+	edge_file.write(EDGES_HEADER)
+	if nnf_file is not None:
+		write_nnf(nnf_file, [], nnf_name)
+	
+	root = None
+	depth = 0
+	for event, elem in ET.iterparse(kgml_file, events=('start', 'end')):
+		if event == 'start':
+			if root is None:
+				root = elem
+			depth += 1
+			continue
+		depth -= 1
+		if depth != 1:
+			continue # Only process children of root ('entry', 'relation', 'reaction' tags) once they are complete
+		
+		logging.debug('%s %s', elem.tag, elem.attrib) ## DEBUG
+		if elem.tag == 'entry':
+			entries.append(elem)
+			if len(entries) >= window:
+				write_entries()
+		elif elem.tag == 'relation' or elem.tag == 'reaction':
+			parse_func = parse_relation if elem.tag == 'relation' else parse_reaction
+			for edge in parse_func(elem):
+				if edges.add(edge):
+					write_edge(edge)
+					logging.debug("%s parsed and new edge added: %s", elem.tag, edge)
+		else:
+			logging.info('Found tag in xml file that we havent accounted for: %s', elem.attrib) ## INFO
+		root.clear() # Remove processed elements from tree (buffered entries are kept in 'entries')
+	write_entries()
+	
+	## Add edges for nodes without edges defined in KGML file.
+	for n_id in node_ids:
+		if edges.degree[n_id] == 0:
+			edges.add([n_id, n_id])
+			write_edge([n_id, n_id]) # Add edge to self
+	
+	if fetcher.metrics is not None:
+		fetcher.metrics.add_time('output', output_time[0])
+
+
+
+def enrich_status(entry, enrich=None, pending=None):
+	## What to do with the info of an 'entry' element:
+	##   'fetch': fetch info now
+	##   'defer': info is needed but will be fetched later (pending is not None)
+	##   'skip':  no info needed (no link, or type not in enrich)
+	if 'link' not in entry.attrib or (enrich is not None and entry.attrib['type'] not in enrich):
+		return 'skip'
+	if pending is not None:
+		return 'defer'
+	return 'fetch'
+
+
+def enrich_types(types):
+	## Parse --enrich list (e.g. "compound,reaction")
+	types = [x.strip() for x in types.split(',') if x.strip()]
+	for x in types:
+		if x not in ENTRY_TYPES:
+			raise argparse.ArgumentTypeError('Unknown entry type "%s" (must be one of: %s)' % (x, ', '.join(ENTRY_TYPES)))
+	return set(types)
+
+
+
+def prefetch_entries(entries, fetcher, store=None):
+	## Download the info for a list of 'entry' elements at once if the fetcher can do it in parallel/batches.
+	## Only entries that are not in the store (and not being fetched by another process) are downloaded.
+	## If the download fails the claims on the entries are released (so other processes can fetch them).
+	if fetcher.threads > 1 or fetcher.backend == 'rest':
+		try:
+			to_fetch = []
+			for entry in entries:
+				if 'link' in entry.attrib:
+					if store is None or store.claim(entry.attrib['type'], entry.attrib['name'])[0] == 'claimed':
+						to_fetch.append(entry)
+			fetcher.prefetch_entries(to_fetch)
+		except:
+			if store is not None:
+				store.release_claims()
+			raise
+
+
+
+def write_nodes(nodes_file, nodes, prefix=''):
+	## Write node rows to file (prefix is added to the start of each row, e.g. "00010_Glycolysis__")
+	for x in nodes:
+		nodes_file.write(prefix+'\t'.join([str(y) for y in x])+'\n')
+
+
+def write_edges(edge_file, edges, prefix=''):
+	## Write edges to file (prefix is added to both node ids, e.g. "00010_Glycolysis__")
 	for x in edges:
-		edge_file.write('\t'.join([str(y) for y in x])+'\n')
+		edge_file.write('\t'.join([prefix+str(y) for y in x])+'\n')
 
 
+def write_pending(pending_file, entries, prefix=''):
+	## Write 'entry' elements whose info will be fetched later: node_id<tab>entry XML (prefix is added to node_id)
+	for entry in entries:
+		entry.tail = None
+		pending_file.write(prefix+entry.attrib['id']+'\t'+ET.tostring(entry).replace('\n', ' ')+'\n')
 
 
-def parse_entry(entry):
+def write_nnf(nnf_file, edges, name, prefix='', parent=True):
+	## Write edges to file in nested network format (NNF) as the network 'name' (prefix is added to both node ids).
+	##   "KEGG\tNAME"                      network NAME is in the parent network "KEGG" (only if parent=True)
+	##   "NAME\tnode_1\tflow\tnode_2"       edge in network NAME
+	##   "NAME\tnode_1"                    node without edges (self edge)
+	if parent:
+		nnf_file.write('KEGG\t'+name+'\n')
+	for x in edges:
+		if x[0] == x[1]:
+			nnf_file.write(name+'\t'+prefix+str(x[0])+'\n')
+		else:
+			nnf_file.write(name+'\t'+prefix+str(x[0])+'\tflow\t'+prefix+str(x[1])+'\n')
+
+
+
+
+def parse_entry(entry, fetcher=None, store=None, fetch_info=True):
 	## Get node (compound, reaction or map) info
+	## fetcher: KEGG_page_fetcher used to get the entry info (None = download linked page using requests)
+	## store: KEGG_annotation_store to get/save the info fetched for this KEGG ID (None = always fetch)
+	## fetch_info: False = dont fetch the info of the entry (name and info are '-')
 	# RETURN: [node_id, kegg_id, name, type, info, link, x, y, width, height, shape]
 	
 	####
@@ -172,18 +526,84 @@ def parse_entry(entry):
 	if 'link' not in entry.attrib.keys():
 		return [entry.attrib['id'], entry.attrib['name'], name, entry.attrib['type'], info, '-', x_loc, y_loc, width, height, shape]
 	
-	## Get info from link provided. 
+	## Get info from link provided (or from the annotation store if another map already fetched it).
 	url = entry.attrib['link']
-	html_text = requests.get(url).text
+	if not fetch_info:
+		annotation = [name, info]
+	else:
+		if fetcher is not None and fetcher.metrics is not None:
+			fetcher.metrics.add(entry.attrib['type'], entries=1)
+		if fetcher is None:
+			fetch = lambda: fetch_entry_annotation(entry.attrib['type'], entry.attrib['name'], url)
+		else:
+			fetch = lambda: fetcher.annotation(entry.attrib['type'], entry.attrib['name'], url)
+		if store is None:
+			annotation = fetch()
+		elif fetcher is None:
+			annotation = store.get(entry.attrib['type'], entry.attrib['name'], fetch)
+		else:
+			## Entries without info are only saved if their page was downloaded (not a HTTP 404 or missing from the cache)
+			keep = lambda x: x is not None or fetcher.downloaded(entry.attrib['type'], entry.attrib['name'], url)
+			annotation = store.get(entry.attrib['type'], entry.attrib['name'], fetch, keep)
+	## No info found on KEGG website for this entry
+	if annotation is None:
+		return [entry.attrib['id'], entry.attrib['name'], '-', entry.attrib['type'], '-', '-', x_loc, y_loc, width, height, shape]
+	name, info = annotation
+	
+	## KEGG compound ID examples: cpd:C02226 (need to lstrip "cpd:")
+	if entry.attrib['type'] == 'compound':
+		return [entry.attrib['id'], entry.attrib['name'].lstrip("cpd:"), name, entry.attrib['type'], info, entry.attrib['link'], x_loc, y_loc, width, height, shape]
+	
+	## KEGG reaction ID examples: rn:R05071 rc:RC00837 (split by space and need to lstrip "rn:")
+	elif entry.attrib['type'] == 'reaction':
+		return [entry.attrib['id'], entry.attrib['name'].split(' ')[0].lstrip("rn:"), name, entry.attrib['type'], info, entry.attrib['link'], x_loc, y_loc, width, height, shape]
+	
+	## KEGG pathway ID example: path:rn00290 (need to lstrip "path:")
+	elif entry.attrib['type'] == 'map':
+		return [entry.attrib['id'], entry.attrib['name'].lstrip('path:'), name, entry.attrib['type'], info, entry.attrib['link'], x_loc, y_loc, width, height, shape]
+	
+	## Genes keep the name given in the 'graphics' tag
+	elif entry.attrib['type'] == 'gene':
+		return [entry.attrib['id'], entry.attrib['name'], graphics_name, entry.attrib['type'], info, entry.attrib['link'], x_loc, y_loc, width, height, shape]
+	
+	## KEGG ortholog ID example: ko:K00001 ko:K00002 (need to lstrip "ko:" and join by ';')
+	elif entry.attrib['type'] == 'ortholog':
+		kegg_id = ';'.join([x.lstrip('ko:') for x in entry.attrib['name'].split(' ')])
+		return [entry.attrib['id'], kegg_id, name, entry.attrib['type'], info, entry.attrib['link'], x_loc, y_loc, width, height, shape]
+	
+	## If we didnt account for something
+	else:
+		logging.info('Found entry "type" that we havent accounted for: %s', entry.attrib) ## INFO
+
+
+
+def fetch_entry_annotation(entry_type, kegg_id, url, fetcher=None):
+	## Download the page linked to an entry and get the info we want from it.
+	## RETURN: [name, info] or None if no table was found on the page
+	##   type="compound": "Name" (first if multiple) and "Exact mass"
+	##   type="reaction": "Enzyme" and "Orthology" IDs
+	##   type="map":      "Name" (first if multiple)
+	##   type="gene":     "KO" IDs (name is taken from the KGML file)
+	##   type="ortholog": "Definition"
+	name = '-'
+	info = '-'
+	if fetcher is None:
+		html_text = requests.get(url).text
+	else:
+		html_text = fetcher.get(url)
+	start = time.time()
+	metrics = None if fetcher is None else fetcher.metrics
 	soup = BeautifulSoup(html_text, 'html.parser')
 	
 	## Get table(s) from html
 	tables = soup.findAll(lambda tag: tag.name=='table')
 	## Check that we actually found some tables. If we didnt then we probabily have an incorrect URL or the entry doesn't have the info we are after.
 	if not tables: # True if empty
-		logging.info('No table found on KEGG website for entry "%s"', entry.attrib['name']) ## INFO
+		logging.info('No table found on KEGG website for entry "%s"', kegg_id) ## INFO
 		logging.info('URL: "%s"', url) ## INFO
-		return [entry.attrib['id'], entry.attrib['name'], '-', entry.attrib['type'], '-', '-', x_loc, y_loc, width, height, shape]
+		if metrics is not None:
+			metrics.add(entry_type, parsed=1, parse_seconds=time.time() - start, no_table=1)
+		return None
 	table = tables[0]
 	
 	## Split master table into rows (whole webpage is a table so we have to access table within a cell of a table)
@@ -191,7 +611,7 @@ def parse_entry(entry):
 	rows = master_rows[0].findAll('td')[0].findAll('tr')[1].findAll('td')[0].findAll('tr')
 	
 	## type="compound": Get "Name" (first if multiple) and "Exact mass" from KEGG database.
-	if entry.attrib['type'] == 'compound':
+	if entry_type == 'compound':
 		# Iterate over rows and check if we have found the correct rows.
 		for row in rows:
 			# Get value from 1st and second columns (or return blank values if split failed)
@@ -201,11 +621,9 @@ def parse_entry(entry):
 				name = row_value.split(';')[0]
 			elif row_name == 'Exact mass':
 				info = row_value
-		## KEGG compound ID examples: cpd:C02226 (need to lstrip "cpd:")
-		return [entry.attrib['id'], entry.attrib['name'].lstrip("cpd:"), name, entry.attrib['type'], info, entry.attrib['link'], x_loc, y_loc, width, height, shape]
 	
 	## type="reaction": Get "Enzyme" from KEGG database.
-	elif entry.attrib['type'] == 'reaction':
+	elif entry_type == 'reaction':
 		name_list = []
 		info_list = []
 		for table in tables:
@@ -213,6 +631,8 @@ def parse_entry(entry):
 			try:
 				rows = master_rows[0].findAll('td')[0].findAll('tr')[1].findAll('td')[0].findAll('tr')
 			except IndexError:
+				if metrics is not None:
+					metrics.add(entry_type, fallbacks=1)
 				continue
 			# Iterate over rows and check if we have found the correct rows (have to also strip \n and \xa0 characters from string).
 			for row in rows:
@@ -225,13 +645,11 @@ def parse_entry(entry):
 				if row_name == 'Orthology':
 					tmp_value = "" if len(row.findAll('td')) == 0 else row.findAll('tr') # Get Orthology rows
 					info_list.extend([x.get_text().strip().replace(u'\xa0', u' ').split(' ')[0] for x in tmp_value]) # Get row text, clean it, then split and take first work (which is 'K' ID)
-		## KEGG reaction ID examples: rn:R05071 rc:RC00837 (split by space and need to lstrip "rn:")
 		name = ';'.join(set(name_list))
 		info = ';'.join(set(info_list))
-		return [entry.attrib['id'], entry.attrib['name'].split(' ')[0].lstrip("rn:"), name, entry.attrib['type'], info, entry.attrib['link'], x_loc, y_loc, width, height, shape]
 	
 	## type="map": Get "Name" (first if multiple) from KEGG database.
-	elif entry.attrib['type'] == 'map':
+	elif entry_type == 'map':
 		# Iterate over rows and check if we have found the correct rows.
 		for row in rows:
 			# Get value from 1st and second columns (or return blank values if split failed)
@@ -239,17 +657,17 @@ def parse_entry(entry):
 			row_value = "" if len(row.findAll('td')) == 0 else row.findAll('td')[0].get_text().strip().replace(u'\xa0', u' ')
 			if row_name == 'Name':
 				name = row_value.split(';')[0]
-		## KEGG pathway ID example: path:rn00290 (need to lstrip "path:")
-		return [entry.attrib['id'], entry.attrib['name'].lstrip('path:'), name, entry.attrib['type'], info, entry.attrib['link'], x_loc, y_loc, width, height, shape]
 	
-	## type="gene": Get "Name" (first if multiple) from KEGG database.
-	elif entry.attrib['type'] == 'gene':
+	## type="gene": Get "KO" IDs from KEGG database.
+	elif entry_type == 'gene':
 		ids4info = []
 		for table in tables:
 			master_rows = table.findAll(lambda tag: tag.name=='tr')
 			try:
 				rows = master_rows[0].findAll('td')[0].findAll('tr')[1].findAll('td')[0].findAll('tr')
 			except IndexError:
+				if metrics is not None:
+					metrics.add(entry_type, fallbacks=1)
 				continue
 			for row in rows:
 				row_name = "" if len(row.findAll('th')) == 0 else row.findAll('th')[0].get_text().strip().replace(u'\xa0', u' ')
@@ -257,10 +675,9 @@ def parse_entry(entry):
 					row_value = "" if len(row.findAll('td')) == 0 else row.findAll('td')[0].get_text().strip().replace(u'\xa0', u' ')
 					ids4info.append(row_value.split(' ')[0])
 		info = ';'.join(set(ids4info))
-		return [entry.attrib['id'], entry.attrib['name'], graphics_name, entry.attrib['type'], info, entry.attrib['link'], x_loc, y_loc, width, height, shape]
 	
-	## type="ortholog": Get "Name" (first if multiple) from KEGG database.
-	elif entry.attrib['type'] == 'ortholog':
+	## type="ortholog": Get "Definition" from KEGG database.
+	elif entry_type == 'ortholog':
 		# Iterate over rows and check if we have found the correct rows.
 		for row in rows:
 			# Get value from 1st and second columns (or return blank values if split failed)
@@ -268,13 +685,11 @@ def parse_entry(entry):
 			if row_name == 'Definition':
 				row_value = "" if len(row.findAll('td')) == 0 else row.findAll('td')[0].get_text().strip().replace(u'\xa0', u' ')
 				name = row_value
-		kegg_id = ';'.join([x.lstrip('ko:') for x in entry.attrib['name'].split(' ')])
-		return [entry.attrib['id'], kegg_id, name, entry.attrib['type'], info, entry.attrib['link'], x_loc, y_loc, width, height, shape]
-	
-	## If we didnt account for something
-	else:
-		logging.info('Found entry "type" that we havent accounted for: %s', entry.attrib) ## INFO
 	
+	if metrics is not None:
+		metrics.add(entry_type, parsed=1, parse_seconds=time.time() - start)
+	return [name, info]
+
 
 
 def parse_relation(relation):
@@ -305,6 +720,638 @@ def parse_reaction(reaction):
 
 
 
+class Edge_index(object):
+	'''
+	Edges of the network in the order they were first added (duplicate edges are ignored).
+	
+	 - Uses a dict for lookups so adding an edge does not get slower as the network grows
+	    (important for the big overview maps, e.g. rn01100).
+	 - degree counts the number of edges each node is in, so nodes without edges can be found 
+	    without going over all the edges again.
+	 - ordered=False keeps the edges in a plain dict (no insertion order; for when edges are written
+	    as they are added and dont need to be iterated over again).
+	'''
+	def __init__(self, ordered=True):
+		self.edges = collections.OrderedDict() if ordered else {} # {(node_1, node_2):None}
+		self.degree = collections.Counter() # {node_id:number of edges}
+	def add(self, edge):
+		## Add edge [node_1, node_2]; returns True if it is a new edge.
+		edge = tuple(edge)
+		if edge in self.edges:
+			return False
+		self.edges[edge] = None
+		self.degree[edge[0]] += 1
+		self.degree[edge[1]] += 1
+		return True
+	def __iter__(self):
+		return iter(self.edges)
+	def __len__(self):
+		return len(self.edges)
+
+
+
+class KEGG_page_fetcher(object):
+	'''
+	Downloads KEGG web pages using a single keep-alive session (and a KEGG_page_cache if given).
+	
+	 - prefetch() downloads a list of pages using a pool of 'threads' workers. The pages are kept 
+	    in memory and returned by get() so the caller can parse them in whatever order it likes.
+	 - get() downloads pages that were not prefetched.
+	 - annotation() gets the info for an entry using either the kegg.jp web page linked to the 
+	    entry (backend='html') or KEGG REST flat files (backend='rest'; see KEGG_REST_client).
+	 - A session can be passed in to share its connections between fetchers (see new_session()).
+	 - If metrics (KEGG_fetch_metrics) is given each request/cache hit is recorded under the
+	    type of the entry it was for (url_types).
+	 - Failed requests (connection errors, timeouts, HTTP 5xx/429) are retried up to 'retries' times
+	    with exponential backoff (+ jitter), like download_KEGG_KGML_files.py does. The error is
+	    raised if the last retry also fails, so a failed page is never parsed as a missing entry.
+	 - Pages that were not downloaded (HTTP 404, or not in the cache with cache_only) are kept in
+	    'unavailable' (see downloaded()).
+	'''
+	def __init__(self, cache=None, threads=1, backend='html', rest_url='http://rest.kegg.jp', session=None, metrics=None, retries=5, backoff=2, max_backoff=120):
+		self.cache = cache
+		self.threads = max(1, threads)
+		self.backend = backend
+		self.pages = {}
+		self.session = new_session(self.threads) if session is None else session
+		self.rest = KEGG_REST_client(self, rest_url) if backend == 'rest' else None
+		self.metrics = metrics
+		self.url_types = {} # {url:entry type} (only kept if we are recording metrics)
+		self.retries = max(0, retries)
+		self.backoff = backoff
+		self.max_backoff = max_backoff
+		self.unavailable = set() # URLs (or KEGG REST IDs) that did not return a page with HTTP 200
+	def request(self, url):
+		## GET url using the session (and record how long each attempt took)
+		## Retries failed requests with exponential backoff (+ jitter); 200 and 404 (not found) responses are
+		## returned, other errors are raised (requests.exceptions.RequestException) once we run out of retries.
+		error = None
+		for attempt in range(self.retries + 1):
+			if attempt > 0:
+				delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+				logging.debug('Retrying %s in %.2f seconds (%s)', url, delay, error) ## DEBUG
+				time.sleep(delay)
+			start = time.time()
+			try:
+				response = self.session.get(url)
+			except requests.exceptions.RequestException as e:
+				if self.metrics is not None:
+					self.metrics.add(self.url_types.get(url, 'other'), fetches=1, errors=1, latency=time.time() - start)
+				if attempt == self.retries:
+					raise
+				error = str(e)
+				continue
+			if self.metrics is not None:
+				self.metrics.add(self.url_types.get(url, 'other'), fetches=1, bytes=len(response.content),
+					errors=int(response.status_code != 200), latency=time.time() - start)
+			if response.status_code == 429 or response.status_code >= 500:
+				error = 'HTTP %s' % response.status_code
+				if attempt < self.retries:
+					continue
+			if response.status_code not in (200, 404):
+				raise requests.exceptions.HTTPError('HTTP %s for url %s (after %s attempts)' % (response.status_code, url, attempt + 1), response=response)
+			if response.status_code != 200:
+				self.unavailable.add(url)
+			return response
+	def download(self, url):
+		## Download page (never uses the cache)
+		return self.request(url).text
+	def fetch(self, url):
+		## Download page (through the cache if we have one)
+		if self.cache is not None:
+			text = self.cache.lookup(url)
+			if text is not None:
+				if self.metrics is not None:
+					self.metrics.add(self.url_types.get(url, 'other'), cache_hits=1)
+				return text
+			if self.cache.cache_only:
+				self.unavailable.add(url)
+			return self.cache.download(url, self.request)
+		return self.download(url)
+	def fetch_all(self, urls, use_cache=True):
+		## Download list of pages in parallel; returns text of pages in the same order as urls.
+		func = self.fetch if use_cache else self.download
+		if self.threads == 1 or len(urls) < 2:
+			return [func(url) for url in urls]
+		pool = ThreadPool(min(self.threads, len(urls)))
+		try:
+			return pool.map(func, urls)
+		finally:
+			pool.close()
+			pool.join()
+	def get(self, url):
+		if url in self.pages:
+			return self.pages[url]
+		return self.fetch(url)
+	def prefetch(self, urls):
+		## Download pages in parallel; the same URL is only downloaded once.
+		urls_unique = []
+		for url in urls:
+			if url not in self.pages and url not in urls_unique:
+				urls_unique.append(url)
+		logging.debug('Downloading %s pages using %s threads', len(urls_unique), self.threads) ## DEBUG
+		for url, text in zip(urls_unique, self.fetch_all(urls_unique)):
+			self.pages[url] = text
+	def prefetch_entries(self, entries):
+		## Download info for a list of KGML 'entry' elements.
+		if self.metrics is not None:
+			for entry in entries:
+				self.set_type(entry.attrib['type'], entry.attrib['name'], entry.attrib['link'])
+		if self.backend == 'rest':
+			self.rest.prefetch([x for entry in entries for x in rest_IDs(entry.attrib['type'], entry.attrib['name'])])
+		else:
+			self.prefetch([entry.attrib['link'] for entry in entries])
+	def set_type(self, entry_type, kegg_id, url):
+		## Remember the entry type of the url (or the KEGG REST IDs) of an entry (for metrics)
+		if self.backend == 'rest':
+			for x in rest_IDs(entry_type, kegg_id):
+				self.rest.id_types[x] = entry_type
+		else:
+			self.url_types[url] = entry_type
+	def downloaded(self, entry_type, kegg_id, url):
+		## False if the page (or any of the KEGG REST flat files) of an entry was not downloaded, i.e. the entry
+		## may only be missing its info for now, so 'no info' should not be saved to the annotation store.
+		if self.backend == 'rest':
+			return not any([x in self.unavailable for x in rest_IDs(entry_type, kegg_id)])
+		return url not in self.unavailable
+	def annotation(self, entry_type, kegg_id, url):
+		## Get [name, info] for an entry (or None if no info was found).
+		if self.metrics is not None:
+			self.set_type(entry_type, kegg_id, url)
+		if self.backend == 'rest':
+			return self.rest.annotation(entry_type, kegg_id)
+		return fetch_entry_annotation(entry_type, kegg_id, url, self)
+
+
+
+def new_session(pool_size=1):
+	## requests session that keeps up to pool_size connections to each host alive
+	session = requests.Session()
+	adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_size)
+	session.mount('http://', adapter)
+	session.mount('https://', adapter)
+	return session
+
+
+
+class KEGG_REST_client(object):
+	'''
+	Gets entry info from KEGG REST flat files (e.g. http://rest.kegg.jp/get/cpd:C00001+cpd:C00002).
+	
+	 - prefetch() downloads the entries for a list of KEGG IDs, 'batch_size' (max 10) IDs per request.
+	    IDs are grouped by database (cpd, rn, hsa, ...) so the ENTRY line of each record can be
+	    matched back to the ID that was requested.
+	 - Each record is stored in the page cache (if we have one) under its single ID URL
+	    (REST_URL/get/cpd:C00001), so IDs can be batched differently in later runs.
+	 - annotation() returns the same [name, info] as fetch_entry_annotation() does for the web pages.
+	'''
+	def __init__(self, fetcher, rest_url='http://rest.kegg.jp', batch_size=10):
+		self.fetcher = fetcher
+		self.rest_url = rest_url.rstrip('/')
+		self.batch_size = batch_size
+		self.records = {} # {KEGG ID:flat file text of entry ('' if not found)}
+		self.id_types = {} # {KEGG ID:entry type} (for metrics)
+	def url(self, kegg_ids):
+		return self.rest_url + '/get/' + '+'.join(kegg_ids)
+	def prefetch(self, kegg_ids):
+		## Download flat files for all KEGG IDs we dont already have.
+		cache = self.fetcher.cache
+		batches = collections.OrderedDict() # {database:[KEGG ID, ...]}
+		for kegg_id in kegg_ids:
+			if kegg_id in self.records or ':' not in kegg_id or kegg_id in batches.get(kegg_id.split(':')[0], []):
+				continue
+			if cache is not None:
+				text = cache.lookup(self.url([kegg_id]))
+				if text is not None:
+					self.records[kegg_id] = text
+					if self.fetcher.metrics is not None:
+						self.fetcher.metrics.add(self.id_types.get(kegg_id, 'other'), cache_hits=1)
+					continue
+				if cache.cache_only:
+					logging.info('Entry not in cache and --cache_only given: %s', kegg_id) ## INFO
+					self.records[kegg_id] = u''
+					self.fetcher.unavailable.add(kegg_id)
+					continue
+			batches.setdefault(kegg_id.split(':')[0], []).append(kegg_id)
+		
+		## Split IDs into requests of batch_size IDs from the same database
+		requested = []
+		for database, batch in batches.iteritems():
+			for i in range(0, len(batch), self.batch_size):
+				requested.append(batch[i:i+self.batch_size])
+		logging.debug('Downloading %s KEGG entries using %s requests', sum([len(x) for x in requested]), len(requested)) ## DEBUG
+		if self.fetcher.metrics is not None:
+			for batch in requested:
+				self.fetcher.url_types[self.url(batch)] = self.id_types.get(batch[0], 'other')
+		
+		for batch, text in zip(requested, self.fetcher.fetch_all([self.url(x) for x in requested], use_cache=False)):
+			database = batch[0].split(':')[0]
+			for record in split_flat_file(text):
+				kegg_id = database + ':' + record_entry_id(record)
+				if kegg_id in batch:
+					self.records[kegg_id] = record
+					if cache is not None:
+						cache.put(self.url([kegg_id]), record)
+			for kegg_id in batch:
+				if kegg_id not in self.records:
+					self.records[kegg_id] = u''
+					if self.url(batch) in self.fetcher.unavailable:
+						self.fetcher.unavailable.add(kegg_id)
+	def get(self, kegg_id):
+		## Return the parsed flat file fields of an entry ({} if not found).
+		if kegg_id not in self.records:
+			self.prefetch([kegg_id])
+		return parse_flat_file_record(self.records.get(kegg_id, u''))
+	def annotation(self, entry_type, kegg_id):
+		## Get [name, info] for an entry from its flat file(s), or None if none of its IDs were found.
+		## KEGG ID examples: "cpd:C00188", "rn:R05071 rc:RC00837", "hsa:10 hsa:20", "ko:K00001 ko:K00002"
+		name = '-'
+		info = '-'
+		metrics = self.fetcher.metrics
+		for x in rest_IDs(entry_type, kegg_id):
+			if x not in self.records:
+				self.prefetch([x])
+		start = time.time()
+		records = [self.get(x) for x in rest_IDs(entry_type, kegg_id)]
+		records = [x for x in records if x] # Ignore IDs without an entry
+		if not records:
+			logging.info('No KEGG REST entry found for "%s"', kegg_id) ## INFO
+			if metrics is not None:
+				metrics.add(entry_type, parsed=1, parse_seconds=time.time() - start, no_table=1)
+			return None
+		
+		## type="compound": Get "NAME" (first if multiple) and "EXACT_MASS"
+		if entry_type == 'compound':
+			record = records[0]
+			if 'NAME' in record:
+				name = record['NAME'][0].split(';')[0]
+			if 'EXACT_MASS' in record:
+				info = record['EXACT_MASS'][0]
+		
+		## type="reaction": Get "ENZYME" and "ORTHOLOGY" (K IDs) of each reaction
+		elif entry_type == 'reaction':
+			name_list = []
+			info_list = []
+			for record in records:
+				for line in record.get('ENZYME', []):
+					name_list.extend(line.split())
+				info_list.extend([line.split(' ')[0] for line in record.get('ORTHOLOGY', [])])
+			name = ';'.join(set(name_list))
+			info = ';'.join(set(info_list))
+		
+		## type="map": Get "NAME" (first if multiple)
+		elif entry_type == 'map':
+			record = records[0]
+			if 'NAME' in record:
+				name = record['NAME'][0].split(';')[0]
+		
+		## type="gene": Get first "ORTHOLOGY" (K ID) of each gene
+		elif entry_type == 'gene':
+			ids4info = []
+			for record in records:
+				if 'ORTHOLOGY' in record:
+					ids4info.append(record['ORTHOLOGY'][0].split(' ')[0])
+			info = ';'.join(set(ids4info))
+		
+		## type="ortholog": Get "DEFINITION" of first ortholog
+		elif entry_type == 'ortholog':
+			record = records[0]
+			if 'DEFINITION' in record:
+				name = ' '.join(record['DEFINITION'])
+		
+		if metrics is not None:
+			metrics.add(entry_type, parsed=1, parse_seconds=time.time() - start)
+		return [name, info]
+
+
+
+def rest_IDs(entry_type, kegg_id):
+	## KEGG IDs of an entry to get flat files for (reaction entries also list RClass IDs which we dont need)
+	kegg_ids = kegg_id.split(' ')
+	if entry_type == 'reaction':
+		kegg_ids = [x for x in kegg_ids if x.startswith('rn:')]
+	return kegg_ids
+
+
+def split_flat_file(text):
+	## Split KEGG flat file text with multiple entries into a list of records (each ending with "///").
+	records = []
+	lines = []
+	for line in text.splitlines(True):
+		lines.append(line)
+		if line.startswith('///'):
+			records.append(''.join(lines))
+			lines = []
+	return records
+
+
+def record_entry_id(record):
+	## Get ID from "ENTRY" line of flat file record, e.g. "ENTRY       C00188                      Compound"
+	for line in record.splitlines():
+		if line.startswith('ENTRY'):
+			return line[12:].split()[0]
+	return ''
+
+
+def parse_flat_file_record(record):
+	## Parse a KEGG flat file record into {FIELD:[line value, ...]}
+	## Field names are in the first 12 columns; lines with blank first 12 columns continue the previous field.
+	fields = {}
+	field = None
+	for line in record.splitlines():
+		if line.startswith('///'):
+			break
+		key = line[:12].strip()
+		value = line[12:].strip()
+		if key:
+			field = key
+			fields.setdefault(field, []).append(value)
+		elif field is not None and value:
+			fields[field].append(value)
+	return fields
+
+
+
+class KEGG_annotation_store(object):
+	'''
+	SQLite database with the info fetched for each KEGG entry (see fetch_entry_annotation()).
+	
+	 - Keyed by entry type and KEGG ID (e.g. "compound", "cpd:C00002") not by map, so the info
+	    for an entry only has to be fetched once no matter how many maps it is in.
+	 - Several processes can share the same database. A process claims a KEGG ID before fetching 
+	    it; other processes wait for the claim to be filled instead of fetching the same page.
+	 - Claims older than 'stale' seconds are assumed to be from a process that died and are taken over.
+	 - Each thread gets its own database connection (and claims IDs as a different owner), so the
+	    store can also be shared by the threads of a batch run.
+	 - release_claims() removes all unfilled claims of the current owner, e.g. when a map fails to
+	    convert after its entries were claimed for prefetching.
+	'''
+	def __init__(self, db_file, stale=600, wait=0.5):
+		self.db_file = db_file
+		self.stale = stale
+		self.wait = wait
+		self.hits = 0
+		self.fetched = 0
+		self.lock = threading.Lock()
+		self.local = threading.local()
+		self.connections = []
+		self.db.execute('CREATE TABLE IF NOT EXISTS annotations (kegg_type TEXT NOT NULL, kegg_id TEXT NOT NULL, '
+			'found INTEGER, name TEXT, info TEXT, owner TEXT, claimed REAL, PRIMARY KEY (kegg_type, kegg_id))')
+	@property
+	def db(self):
+		## Database connection of the current thread
+		if not hasattr(self.local, 'db'):
+			self.local.db = sqlite3.connect(self.db_file, timeout=600, isolation_level=None, check_same_thread=False)
+			self.local.db.execute('PRAGMA journal_mode=WAL')
+			with self.lock:
+				self.connections.append(self.local.db)
+		return self.local.db
+	@property
+	def owner(self):
+		return '%s:%s:%s' % (socket.gethostname(), os.getpid(), threading.current_thread().ident)
+	def claim(self, kegg_type, kegg_id):
+		## Claim KEGG ID so that this process fetches it.
+		## RETURN: ['done', annotation] if already fetched, ['claimed', None] if this process should fetch it,
+		##         or ['wait', None] if another process is fetching it.
+		self.db.execute('BEGIN IMMEDIATE')
+		try:
+			row = self.db.execute('SELECT found, name, info, owner, claimed FROM annotations WHERE kegg_type=? AND kegg_id=?',
+				(kegg_type, kegg_id)).fetchone()
+			if row is not None and row[0] is not None:
+				ret = ['done', [row[1], row[2]] if row[0] else None]
+			elif row is not None and row[3] != self.owner and time.time() - row[4] < self.stale:
+				ret = ['wait', None]
+			else:
+				self.db.execute('INSERT OR REPLACE INTO annotations VALUES (?, ?, NULL, NULL, NULL, ?, ?)',
+					(kegg_type, kegg_id, self.owner, time.time()))
+				ret = ['claimed', None]
+			self.db.execute('COMMIT')
+		except:
+			self.db.execute('ROLLBACK')
+			raise
+		return ret
+	def put(self, kegg_type, kegg_id, annotation):
+		## Save annotation ([name, info] or None) for KEGG ID.
+		if annotation is None:
+			self.db.execute('INSERT OR REPLACE INTO annotations VALUES (?, ?, 0, NULL, NULL, ?, ?)',
+				(kegg_type, kegg_id, self.owner, time.time()))
+		else:
+			self.db.execute('INSERT OR REPLACE INTO annotations VALUES (?, ?, 1, ?, ?, ?, ?)',
+				(kegg_type, kegg_id, annotation[0], annotation[1], self.owner, time.time()))
+	def release(self, kegg_type, kegg_id):
+		## Remove our (unfilled) claim on KEGG ID.
+		self.db.execute('DELETE FROM annotations WHERE kegg_type=? AND kegg_id=? AND found IS NULL AND owner=?',
+			(kegg_type, kegg_id, self.owner))
+	def release_claims(self):
+		## Remove all of our (unfilled) claims.
+		self.db.execute('DELETE FROM annotations WHERE found IS NULL AND owner=?', (self.owner,))
+	def get(self, kegg_type, kegg_id, fetch, keep=None):
+		## Return annotation for KEGG ID from the store, or call fetch() to get it (and save it to the store).
+		## keep: if keep(annotation) is False the fetched annotation is returned but not saved (the claim is released).
+		while True:
+			status, annotation = self.claim(kegg_type, kegg_id)
+			if status == 'done':
+				with self.lock:
+					self.hits += 1
+				return annotation
+			elif status == 'claimed':
+				try:
+					annotation = fetch()
+				except:
+					self.release(kegg_type, kegg_id)
+					raise
+				if keep is not None and not keep(annotation):
+					self.release(kegg_type, kegg_id)
+					return annotation
+				self.put(kegg_type, kegg_id, annotation)
+				with self.lock:
+					self.fetched += 1
+				return annotation
+			logging.debug('Waiting for another process to fetch %s %s', kegg_type, kegg_id) ## DEBUG
+			time.sleep(self.wait)
+	def close(self):
+		for db in self.connections:
+			db.close()
+
+
+
+class KEGG_fetch_metrics(object):
+	'''
+	Counts and timings of the KEGG pages fetched and parsed for each entry type (--metrics).
+	
+	 - entries:     number of entries with a link (that were not skipped)
+	 - fetches:     number of HTTP requests (errors: requests that did not return HTTP 200)
+	 - bytes:       bytes downloaded
+	 - latency:     seconds each request took (summarized as percentiles)
+	 - cache_hits:  pages/flat files found in the page cache
+	 - parsed:      pages parsed (parse_seconds: total time spent parsing)
+	 - no_table:    pages without any info (no tables/no flat file entry)
+	 - fallbacks:   tables skipped because they didnt have the expected structure (IndexError)
+	 - Entries found in the annotation store (--store) are counted in 'entries' only.
+	 - Metrics from several runs (e.g. each map of a batch run) can be combined with merge().
+	'''
+	COUNTS = ['entries', 'fetches', 'errors', 'bytes', 'cache_hits', 'parsed', 'parse_seconds', 'no_table', 'fallbacks']
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.types = {} # {entry type:{count:value, 'latency':[seconds, ...]}}
+		self.times = collections.Counter() # {'total':seconds, 'output':seconds}
+	def type_metrics(self, entry_type):
+		if entry_type not in self.types:
+			self.types[entry_type] = dict([(x, 0) for x in self.COUNTS])
+			self.types[entry_type]['latency'] = []
+		return self.types[entry_type]
+	def add(self, entry_type, latency=None, **counts):
+		with self.lock:
+			metrics = self.type_metrics(entry_type)
+			for key, value in counts.iteritems():
+				metrics[key] += value
+			if latency is not None:
+				metrics['latency'].append(latency)
+	def add_time(self, name, seconds):
+		with self.lock:
+			self.times[name] += seconds
+	def merge(self, other):
+		with self.lock:
+			for entry_type, other_metrics in other.types.iteritems():
+				metrics = self.type_metrics(entry_type)
+				for key in self.COUNTS:
+					metrics[key] += other_metrics[key]
+				metrics['latency'].extend(other_metrics['latency'])
+			self.times.update(other.times)
+	def summary(self):
+		## JSON-able summary: {'types':{entry type:{counts, 'latency':{n, mean, p50, p90, p99, max}}}, 'seconds':{...}}
+		with self.lock:
+			types = {}
+			for entry_type, metrics in self.types.iteritems():
+				types[entry_type] = dict([(x, metrics[x]) for x in self.COUNTS])
+				types[entry_type]['latency'] = latency_summary(metrics['latency'])
+			seconds = dict(self.times)
+			seconds['fetch'] = sum([sum(x['latency']) for x in self.types.values()])
+			seconds['parse'] = sum([x['parse_seconds'] for x in self.types.values()])
+		return {'types':types, 'seconds':seconds}
+
+
+def latency_summary(latencies):
+	## Number, mean and percentiles (nearest rank) of a list of latencies (seconds)
+	latencies = sorted(latencies)
+	n = len(latencies)
+	if n == 0:
+		return {'n':0}
+	percentile = lambda p: latencies[min(n - 1, int(math.ceil(p / 100.0 * n)) - 1)]
+	return {'n':n, 'mean':sum(latencies) / n, 'p50':percentile(50), 'p90':percentile(90), 'p99':percentile(99), 'max':latencies[-1]}
+
+
+
+class KEGG_page_cache(object):
+	'''
+	On-disk cache of web pages keyed by URL.
+	
+	 - Each page is stored in a file named after the sha1 hash of its URL (cache_dir/ab/abcdef...).
+	 - A page is re-downloaded if its file is older than 'ttl' days (ttl=0: pages never expire).
+	 - The access time of a file is updated each time the page is used. evict() removes the least
+	    recently used pages until the cache is smaller than 'max_size' MB.
+	 - cache_only=True will never download pages; pages missing from the cache are returned as
+	    empty strings (i.e. treated like a page without any tables).
+	 - Files are written to a (uniquely named) temp file and then renamed, so multiple processes and
+	    threads can share the same cache directory; evict() leaves temp files alone.
+	'''
+	def __init__(self, cache_dir, ttl=30, max_size=2048, cache_only=False):
+		self.cache_dir = cache_dir
+		self.ttl = ttl * 24 * 60 * 60 # days -> seconds
+		self.max_size = int(max_size * 1024 * 1024) # MB -> bytes
+		self.cache_only = cache_only
+		self.hits = 0
+		self.misses = 0
+		self.lock = threading.Lock() # Pages can be requested from multiple threads
+		if not os.path.exists(self.cache_dir):
+			try:
+				os.makedirs(self.cache_dir)
+			except OSError:
+				pass # Created by another process in the mean time
+	def path(self, url):
+		## File that the page for url is stored in.
+		key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+		return os.path.join(self.cache_dir, key[:2], key)
+	def lookup(self, url):
+		## Return page text from cache if we have a valid copy (else None)
+		file_name = self.path(url)
+		try:
+			stat = os.stat(file_name)
+			if self.cache_only or self.ttl <= 0 or time.time() - stat.st_mtime < self.ttl:
+				with open(file_name, 'rb') as fh:
+					text = fh.read().decode('utf-8')
+				os.utime(file_name, (time.time(), stat.st_mtime)) # Update access time (LRU) but keep modification time (TTL)
+				with self.lock:
+					self.hits += 1
+				logging.debug('Cache hit: %s', url) ## DEBUG
+				return text
+		except (OSError, IOError):
+			pass # Not in cache (or removed by another process)
+		with self.lock:
+			self.misses += 1
+		return None
+	def get(self, url, session=requests):
+		## Return page text from cache if we have a valid copy, else download it (unless cache_only=True)
+		text = self.lookup(url)
+		if text is not None:
+			return text
+		return self.download(url, session.get)
+	def download(self, url, request=requests.get):
+		## Download page with request(url) and add it to the cache (returns u'' if cache_only=True)
+		if self.cache_only:
+			logging.info('Page not in cache and --cache_only given: %s', url) ## INFO
+			return u''
+		logging.debug('Cache miss: %s', url) ## DEBUG
+		response = request(url)
+		if response.status_code == 200:
+			self.put(url, response.text)
+		return response.text
+	def put(self, url, text):
+		## Write page text to cache.
+		file_name = self.path(url)
+		dir_name = os.path.dirname(file_name)
+		try:
+			if not os.path.exists(dir_name):
+				os.makedirs(dir_name)
+		except OSError:
+			pass # Created by another process in the mean time
+		## Unique temp file, as other threads/processes may be writing the same page
+		fd, tmp_name = tempfile.mkstemp(prefix=os.path.basename(file_name)+'.', suffix='.tmp', dir=dir_name)
+		with os.fdopen(fd, 'wb') as fh:
+			fh.write(text.encode('utf-8'))
+		os.rename(tmp_name, file_name)
+	def evict(self):
+		## Remove least recently used pages until the cache is below max_size.
+		files = []
+		total_size = 0
+		for dir_path, dir_names, file_names in os.walk(self.cache_dir):
+			for file_name in file_names:
+				if file_name.endswith('.tmp'):
+					continue # Page being written by put()
+				file_name = os.path.join(dir_path, file_name)
+				try:
+					stat = os.stat(file_name)
+				except OSError:
+					continue
+				files.append((stat.st_atime, stat.st_size, file_name))
+				total_size += stat.st_size
+		if total_size <= self.max_size:
+			return
+		files.sort()
+		removed = 0
+		for atime, size, file_name in files:
+			if total_size <= self.max_size:
+				break
+			try:
+				os.remove(file_name)
+			except OSError:
+				pass # Removed by another process
+			total_size -= size
+			removed += 1
+		logging.info('Removed %s least recently used pages from cache %s', removed, self.cache_dir) ## INFO
+
+
+
 class File(object):
 	'''
 	Context Manager class for opening stdin/stdout/normal/gzip files.
@@ -0,0 +1,278 @@
+#!/usr/bin/env python2
+DESCRIPTION = '''
+Compiles the ID mapping files from step 0 (RHEA_2_KEGG_Reaction_mapping.txt.gz,
+MetaCyc_2_KEGG_Reaction_mapping.txt.gz and InChIKey_2_KEGG_Compound_mapping.txt.gz) into one indexed
+SQLite crosswalk that can translate IDs between any two ID types (in both directions) without
+loading the mapping files.
+
+ID types:
+	rhea            RHEA reaction IDs (e.g. "RHEA:11540")
+	kegg_reaction   KEGG reaction IDs (e.g. "R02651")
+	metacyc         MetaCyc reaction IDs (e.g. "PEPDEPHOS-RXN")
+	ec              EC numbers (e.g. "1.1.1.233")
+	inchikey        InChIKeys (e.g. "ISWSIDIOOBJBQZ-UHFFFAOYSA-N")
+	kegg_compound   KEGG compound IDs (e.g. "C00146")
+
+NOTE:
+	- All IDs on the same line of a mapping file are linked to each other (e.g. the KEGG reaction and
+	   EC numbers of a RHEA ID are also linked to each other).
+	- IDs are normalized (see normalize_ID()) when building and when querying: RHEA IDs always have the
+	   "RHEA:" prefix, and the "EC-" (MetaCyc), "rn:" and "cpd:" prefixes are removed.
+	- Lines of the InChIKey mapping file that do not start with an InChIKey are skipped.
+	- The crosswalk is written to a tmp file and renamed once complete.
+
+Querying in python:
+	import build_ID_crosswalk as X
+	crosswalk = X.ID_crosswalk('ID_crosswalk.sqlite')
+	crosswalk.lookup('rhea', 'RHEA:11540', 'kegg_reaction')                  # ['R02651']
+	crosswalk.translate('kegg_reaction', ['R02651', 'R00200'], 'metacyc')    # {'R02651':[...], 'R00200':[...]}
+Or use translate_IDs.py to translate a file of IDs.
+'''
+import sys
+import os
+import argparse
+import logging
+import gzip
+import re
+import itertools
+import sqlite3
+
+ID_TYPES = ['rhea', 'kegg_reaction', 'metacyc', 'ec', 'inchikey', 'kegg_compound']
+## ID type of each column of the mapping files
+MAPPING_COLUMNS = {
+	'rhea':['rhea', 'kegg_reaction', 'metacyc', 'ec'],
+	'metacyc':['metacyc', 'kegg_reaction', 'rhea', 'ec'],
+	'inchikey':['inchikey', 'kegg_compound'],
+}
+INCHIKEY_RE = re.compile(r'^[A-Z]{14}-[A-Z]{10}-[A-Z]$')
+## Max IDs per translate() query: SQLite before 3.32 allows at most 999 bound variables (2 are used by the ID types)
+SQL_MAX_IDS = 997
+
+## Pass arguments.
+def main():
+	## Pass command line arguments.
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=DESCRIPTION)
+	parser.add_argument('-r', '--rhea', metavar='RHEA_2_KEGG_Reaction_mapping.txt.gz',
+		required=False, default=None, type=lambda x: File(x, 'r'),
+		help='Input [gzip] RHEA to KEGG Reaction mapping file (default: not used)'
+	)
+	parser.add_argument('-m', '--metacyc', metavar='MetaCyc_2_KEGG_Reaction_mapping.txt.gz',
+		required=False, default=None, type=lambda x: File(x, 'r'),
+		help='Input [gzip] MetaCyc to KEGG Reaction mapping file (default: not used)'
+	)
+	parser.add_argument('-i', '--inchikey', metavar='InChIKey_2_KEGG_Compound_mapping.txt.gz',
+		required=False, default=None, type=lambda x: File(x, 'r'),
+		help='Input [gzip] InChIKey to KEGG Compound mapping file (default: not used)'
+	)
+	parser.add_argument('-o', '--out', metavar='ID_crosswalk.sqlite',
+		required=True, type=str,
+		help='Output SQLite crosswalk (required)'
+	)
+	parser.add_argument('--debug',
+		required=False, action='store_true',
+		help='Print DEBUG info (default: %(default)s)'
+	)
+	args = parser.parse_args()
+	
+	## Set up basic debugger
+	logFormat = "[%(levelname)s]: %(message)s"
+	logging.basicConfig(format=logFormat, stream=sys.stderr, level=logging.INFO)
+	if args.debug:
+		logging.getLogger().setLevel(logging.DEBUG)
+	
+	logging.debug('%s', args) ## DEBUG
+	
+	mapping_files = [[source, mapping_file] for source, mapping_file in [['rhea', args.rhea], ['metacyc', args.metacyc], ['inchikey', args.inchikey]] if mapping_file is not None]
+	if not mapping_files:
+		logging.error('At least one of --rhea, --metacyc or --inchikey is required') ## ERROR
+		sys.exit(1)
+	
+	build_ID_crosswalk(mapping_files, args.out)
+
+
+
+def build_ID_crosswalk(mapping_files, db_file):
+	'''
+	mapping_files: [[source, mapping file], ...]; source is 'rhea', 'metacyc' or 'inchikey' (see MAPPING_COLUMNS)
+	
+	db_file: SQLite crosswalk to write (replaced if it exists)
+	'''
+	tmp_file = db_file + '.tmp'
+	if os.path.exists(tmp_file):
+		os.remove(tmp_file)
+	db = sqlite3.connect(tmp_file)
+	db.execute('PRAGMA journal_mode=OFF')
+	db.execute('PRAGMA synchronous=OFF')
+	db.execute('CREATE TABLE xref (from_type TEXT NOT NULL, from_id TEXT NOT NULL, to_type TEXT NOT NULL, to_id TEXT NOT NULL, '
+		'source TEXT NOT NULL, UNIQUE (from_type, from_id, to_type, to_id))')
+	db.execute('CREATE TABLE sources (source TEXT PRIMARY KEY, file TEXT, lines INTEGER, skipped INTEGER)')
+	for source, mapping_file in mapping_files:
+		with mapping_file as in_file:
+			n_lines, n_skipped = load_mapping_file(db, in_file, source)
+		db.execute('INSERT INTO sources VALUES (?, ?, ?, ?)', (source, getattr(in_file, 'name', None), n_lines, n_skipped))
+		logging.info('Added %s lines from %s mapping file (%s skipped)', n_lines, source, n_skipped) ## INFO
+	db.commit()
+	n_links = db.execute('SELECT COUNT(*) FROM xref').fetchone()[0]
+	db.execute('ANALYZE')
+	db.close()
+	os.rename(tmp_file, db_file)
+	logging.info('Wrote %s links to %s', n_links, db_file) ## INFO
+
+
+
+def load_mapping_file(db, in_file, source):
+	## Add the links between the IDs on each line of in_file to db.
+	## RETURN: [number of lines added, number of lines skipped]
+	columns = MAPPING_COLUMNS[source]
+	n_lines = 0
+	n_skipped = 0
+	for line in in_file:
+		line = line.rstrip('\n')
+		if not line or line.startswith('#'):
+			continue
+		cells = line.split('\t')
+		if source == 'inchikey' and not INCHIKEY_RE.match(cells[0]):
+			logging.debug('Skipping line without InChIKey: %s', line) ## DEBUG
+			n_skipped += 1
+			continue
+		IDs = []
+		for id_type, cell in zip(columns, cells):
+			IDs.append([id_type, [normalize_ID(id_type, x) for x in cell.split(',') if x.strip()]])
+		links = []
+		for [type_1, IDs_1], [type_2, IDs_2] in itertools.combinations(IDs, 2):
+			for ID_1 in IDs_1:
+				for ID_2 in IDs_2:
+					links.append((type_1, ID_1, type_2, ID_2, source))
+					links.append((type_2, ID_2, type_1, ID_1, source))
+		db.executemany('INSERT OR IGNORE INTO xref VALUES (?, ?, ?, ?, ?)', links)
+		n_lines += 1
+	return [n_lines, n_skipped]
+
+
+
+def normalize_ID(id_type, ID):
+	## Same form of ID for all mapping files and queries (e.g. 'EC-1.1.1.1' -> '1.1.1.1', '11540' -> 'RHEA:11540')
+	ID = ID.strip()
+	if id_type == 'rhea':
+		if ID.isdigit():
+			ID = 'RHEA:' + ID
+	elif id_type == 'ec':
+		for prefix in ['EC-', 'EC:', 'ec:']:
+			if ID.startswith(prefix):
+				ID = ID[len(prefix):]
+	elif id_type == 'kegg_reaction':
+		if ID.startswith('rn:'):
+			ID = ID[3:]
+	elif id_type == 'kegg_compound':
+		if ID.startswith('cpd:'):
+			ID = ID[4:]
+	return ID
+
+
+
+class ID_crosswalk(object):
+	'''
+	Query API of a crosswalk built by build_ID_crosswalk().
+	
+	 - lookup() translates a single ID and translate() a list of IDs (in chunks of at most 'chunk_size'
+	    distinct IDs per query; never more than SQL_MAX_IDS, whatever the number of IDs given).
+	 - Translations are returned in the order they were added to the crosswalk (i.e. mapping file order).
+	 - IDs are normalized (see normalize_ID()) before they are looked up, but are returned as given.
+	'''
+	def __init__(self, db_file, chunk_size=SQL_MAX_IDS):
+		if not os.path.exists(db_file):
+			raise IOError('Crosswalk %s does not exist' % db_file)
+		self.db = sqlite3.connect(db_file)
+		self.chunk_size = max(1, min(chunk_size, SQL_MAX_IDS))
+	def types(self):
+		## ID types in the crosswalk
+		return [row[0] for row in self.db.execute('SELECT DISTINCT from_type FROM xref')]
+	def lookup(self, from_type, ID, to_type):
+		## RETURN: [to_type IDs linked to ID]
+		return [row[0] for row in self.db.execute('SELECT to_id FROM xref WHERE from_type=? AND from_id=? AND to_type=? ORDER BY rowid',
+			(from_type, normalize_ID(from_type, ID), to_type))]
+	def translate(self, from_type, IDs, to_type):
+		## RETURN: {ID:[to_type IDs linked to ID]} of all IDs (IDs without links have an empty list)
+		translations = {}
+		normalized = {} # {normalized ID:[IDs]}
+		for ID in IDs:
+			if ID not in translations:
+				normalized.setdefault(normalize_ID(from_type, ID), []).append(ID)
+				translations[ID] = []
+		from_ids = normalized.keys()
+		for i in range(0, len(from_ids), self.chunk_size):
+			chunk = from_ids[i:i+self.chunk_size]
+			rows = self.db.execute('SELECT from_id, to_id FROM xref WHERE from_type=? AND to_type=? AND from_id IN (%s) ORDER BY rowid' % ','.join(['?'] * len(chunk)),
+				[from_type, to_type] + chunk)
+			for from_id, to_id in rows:
+				for ID in normalized[from_id]:
+					translations[ID].append(to_id)
+		return translations
+	def close(self):
+		self.db.close()
+
+
+
+class File(object):
+	'''
+	Context Manager class for opening stdin/stdout/normal/gzip files.
+	
+	 - Will check that file exists if mode='r'
+	 - Will open using either normal open() or gzip.open() if *.gz extension detected.
+	 - Designed to be handled by a 'with' statement (other wise __enter__() method wont 
+	    be run and the file handle wont be returned)
+	
+	NOTE:
+		- Can't use .close() directly on this class unless you uncomment the close() method
+		- Can't use this class with a 'for' loop unless you uncomment the __iter__() method
+			- In this case you should also uncomment the close() method as a 'for'
+			   loop does not automatically cloase files, so you will have to do this 
+			   manually.
+		- __iter__() and close() are commented out by default as it is better to use a 'with' 
+		   statement instead as it will automatically close files when finished/an exception 
+		   occures. 
+		- Without __iter__() and close() this object will return an error when directly closed 
+		   or you attempt to use it with a 'for' loop. This is to force the use of a 'with' 
+		   statement instead. 
+	
+	Code based off of context manager tutorial from: https://book.pythontips.com/en/latest/context_managers.html
+	'''
+ 	def __init__(self, file_name, mode):
+		## Upon initializing class open file (using gzip if needed)
+		self.file_name = file_name
+		self.mode = mode
+		
+		## Check file exists if mode='r'
+		if not os.path.exists(self.file_name) and mode == 'r':
+			raise argparse.ArgumentTypeError("The file %s does not exist!" % self.file_name)
+	
+		## Open with gzip if it has the *.gz extension, else open normally (including stdin)
+		try:
+			if self.file_name.endswith(".gz"):
+				#print "Opening gzip compressed file (mode: %s): %s" % (self.mode, self.file_name) ## DEBUG
+				self.file_obj = gzip.open(self.file_name, self.mode+'b')
+			else:
+				#print "Opening normal file (mode: %s): %s" % (self.mode, self.file_name) ## DEBUG
+				self.file_obj = open(self.file_name, self.mode)
+		except IOError as e:
+			raise argparse.ArgumentTypeError('%s' % e)
+	def __enter__(self):
+		## Run When 'with' statement uses this class.
+		#print "__enter__: %s" % (self.file_name) ## DEBUG
+		return self.file_obj
+	def __exit__(self, type, value, traceback):
+		## Run when 'with' statement is done with object. Either because file has been exhausted, we are done writing, or an error has been encountered.
+		#print "__exit__: %s" % (self.file_name) ## DEBUG
+		self.file_obj.close()
+#	def __iter__(self):
+#		## iter method need for class to work with 'for' loops
+#		#print "__iter__: %s" % (self.file_name) ## DEBUG
+#		return self.file_obj
+#	def close(self):
+#		## method to call .close() directly on object.
+#		#print "close: %s" % (self.file_name) ## DEBUG
+#		self.file_obj.close()
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python2
+DESCRIPTION = '''
+Takes the merged KEGG network (KEGG_Pathway_Networks.nodes.txt.gz and KEGG_Pathway_Networks.edges.txt.gz)
+and builds a graph with integer vertex IDs and CSR (compressed sparse row) adjacency arrays that can be
+memory-mapped by KEGG_network_graph (see below) instead of re-reading the text files.
+
+Vertices:
+	0 .. n_nodes-1:             the nodes of each map (in nodes file order; e.g. "00010_Glycolysis__12")
+	n_nodes .. n_vertices-1:    one global vertex for each KEGG ID (e.g. "cpd:C00022"), linked to every
+	                             map node with that KEGG ID, so a compound is one vertex across all maps.
+
+Output directory:
+	graph.json          number of nodes/vertices/edges
+	graph.indptr        int32 array (n_vertices+1); neighbors of v are indices[indptr[v]:indptr[v+1]]
+	graph.indices       int32 array (sorted neighbors of each vertex)
+	graph.vertices.txt  name<tab>type of each vertex (type = node type or 'kegg' for global vertices)
+
+NOTE:
+	- Edges are undirected (stored in both directions) and duplicate edges are removed.
+	- Self edges (added for Cytoscape to nodes without edges) are not stored.
+	- KEGG IDs are split on spaces and ';' (e.g. genes "hsa:10327 hsa:124" and orthologs "K00001;K00002").
+	   IDs without a database prefix get one based on the node type (e.g. compound "C00022" -> "cpd:C00022").
+	- Arrays are little-endian int32.
+
+Loading in python:
+	import build_KEGG_network_graph as G
+	graph = G.KEGG_network_graph('KEGG_Pathway_Networks.graph')
+	for v in graph.neighbors(graph.vertex_id('cpd:C00022')):
+		print graph.vertex_name(v)
+'''
+import sys
+import os
+import argparse
+import logging
+import gzip
+import re
+import json
+import mmap
+import array
+import struct
+
+## Prefix added to KEGG IDs without one (based on node type)
+KEGG_ID_PREFIX = {'compound':'cpd', 'reaction':'rn', 'map':'path', 'ortholog':'ko'}
+
+## Pass arguments.
+def main():
+	## Pass command line arguments.
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=DESCRIPTION)
+	parser.add_argument('-n', '--nodes', metavar='KEGG_Pathway_Networks.nodes.txt.gz',
+		required=True, type=lambda x: File(x, 'r'),
+		help='Input [gzip] network node info file (required)'
+	)
+	parser.add_argument('-e', '--edges', metavar='KEGG_Pathway_Networks.edges.txt.gz',
+		required=True, type=lambda x: File(x, 'r'),
+		help='Input [gzip] network edges file (required)'
+	)
+	parser.add_argument('-o', '--out', metavar='KEGG_Pathway_Networks.graph',
+		required=True, type=str,
+		help='Output directory for graph files (required)'
+	)
+	parser.add_argument('--debug',
+		required=False, action='store_true',
+		help='Print DEBUG info (default: %(default)s)'
+	)
+	args = parser.parse_args()
+	
+	## Set up basic debugger
+	logFormat = "[%(levelname)s]: %(message)s"
+	logging.basicConfig(format=logFormat, stream=sys.stderr, level=logging.INFO)
+	if args.debug:
+		logging.getLogger().setLevel(logging.DEBUG)
+	
+	logging.debug('%s', args) ## DEBUG
+	
+	with args.nodes as nodes_file, args.edges as edge_file:
+		build_KEGG_network_graph(nodes_file, edge_file, args.out)
+
+
+
+def build_KEGG_network_graph(nodes_file, edge_file, out_dir):
+	'''
+	Read nodes/edges files and write graph files to out_dir (see DESCRIPTION).
+	'''
+	## Map nodes
+	names = [] # vertex ID -> name
+	types = [] # vertex ID -> type
+	node2vertex = {} # node_id -> vertex ID
+	node_kegg_ids = [] # [[vertex ID, [KEGG IDs]], ...]
+	headers = nodes_file.readline().rstrip('\n').split('\t')
+	node_id_index = headers.index('node_id')
+	kegg_id_index = headers.index('kegg_id')
+	type_index = headers.index('type')
+	for line in nodes_file:
+		line = line.rstrip('\n')
+		if not line or line.startswith('#'):
+			continue
+		line_split = line.split('\t')
+		node_id = line_split[node_id_index]
+		if node_id in node2vertex:
+			logging.debug('Node "%s" found more then once in nodes file', node_id) ## DEBUG
+			continue
+		node2vertex[node_id] = len(names)
+		names.append(node_id)
+		types.append(line_split[type_index])
+		node_kegg_ids.append([node2vertex[node_id], split_kegg_ids(line_split[kegg_id_index], line_split[type_index])])
+	n_nodes = len(names)
+	
+	## Global KEGG ID vertices (in the order they are first seen)
+	kegg2vertex = {}
+	edges = set()
+	for v, kegg_ids in node_kegg_ids:
+		for kegg_id in kegg_ids:
+			if kegg_id not in kegg2vertex:
+				kegg2vertex[kegg_id] = len(names)
+				names.append(kegg_id)
+				types.append('kegg')
+			edges.add((v, kegg2vertex[kegg_id]))
+	n_links = len(edges)
+	del node_kegg_ids
+	
+	## Map edges
+	missing = 0
+	edge_file.readline() # Header
+	for line in edge_file:
+		line = line.rstrip('\n')
+		if not line or line.startswith('#'):
+			continue
+		node_1, node_2 = line.split('\t')
+		if node_1 not in node2vertex or node_2 not in node2vertex:
+			missing += 1
+			continue
+		v1, v2 = node2vertex[node_1], node2vertex[node_2]
+		if v1 != v2:
+			edges.add((min(v1, v2), max(v1, v2)))
+	if missing > 0:
+		logging.warning('%s edges have nodes that are not in the nodes file (edges ignored)', missing) ## WARNING
+	del node2vertex
+	
+	indptr, indices = edges_to_CSR(edges, len(names))
+	
+	## Write graph files
+	if not os.path.exists(out_dir):
+		os.makedirs(out_dir)
+	write_int32_array(os.path.join(out_dir, 'graph.indptr'), indptr)
+	write_int32_array(os.path.join(out_dir, 'graph.indices'), indices)
+	with open(os.path.join(out_dir, 'graph.vertices.txt'), 'w') as vertices_file:
+		for name, vertex_type in zip(names, types):
+			vertices_file.write(name + '\t' + vertex_type + '\n')
+	info = {'n_vertices':len(names), 'n_nodes':n_nodes, 'n_global':len(names) - n_nodes,
+		'n_edges':len(edges) - n_links, 'n_links':n_links, 'dtype':'<i4'}
+	with open(os.path.join(out_dir, 'graph.json'), 'w') as info_file:
+		json.dump(info, info_file, indent=1, sort_keys=True)
+	logging.info('Graph: %s map nodes, %s KEGG IDs, %s edges, %s node-KEGG ID links',
+		info['n_nodes'], info['n_global'], info['n_edges'], info['n_links']) ## INFO
+
+
+
+def split_kegg_ids(kegg_id, node_type):
+	## Split 'kegg_id' column into KEGG IDs (with database prefix; e.g. "C00022" -> ["cpd:C00022"])
+	kegg_ids = []
+	for x in re.split('[ ;]+', kegg_id):
+		if not x or x == '-':
+			continue
+		if ':' not in x and node_type in KEGG_ID_PREFIX:
+			x = KEGG_ID_PREFIX[node_type] + ':' + x
+		kegg_ids.append(x)
+	return kegg_ids
+
+
+
+def edges_to_CSR(edges, n_vertices):
+	## Convert set of undirected (v1, v2) edges into CSR arrays [indptr, indices] (each edge stored in both directions; neighbors sorted)
+	degree = array.array('i', [0]) * n_vertices
+	for v1, v2 in edges:
+		degree[v1] += 1
+		degree[v2] += 1
+	indptr = array.array('i', [0]) * (n_vertices + 1)
+	for v in xrange(n_vertices):
+		indptr[v+1] = indptr[v] + degree[v]
+	indices = array.array('i', [0]) * indptr[n_vertices]
+	pos = array.array('i', indptr[:-1])
+	for v1, v2 in sorted(edges):
+		indices[pos[v1]] = v2
+		pos[v1] += 1
+		indices[pos[v2]] = v1
+		pos[v2] += 1
+	## Sort neighbors of each vertex
+	for v in xrange(n_vertices):
+		if degree[v] > 1:
+			indices[indptr[v]:indptr[v+1]] = array.array('i', sorted(indices[indptr[v]:indptr[v+1]]))
+	return [indptr, indices]
+
+
+
+def write_int32_array(file_name, values):
+	## Write array('i') as little-endian int32
+	assert values.itemsize == 4
+	if sys.byteorder != 'little':
+		values = array.array('i', values)
+		values.byteswap()
+	with open(file_name, 'wb') as out_file:
+		values.tofile(out_file)
+
+
+
+class KEGG_network_graph(object):
+	'''
+	Graph written by build_KEGG_network_graph() with the CSR arrays memory-mapped (so loading
+	is instant and only the parts of the arrays that are used are read from disk).
+	
+	 - Vertex names are only read (from graph.vertices.txt) the first time they are needed.
+	'''
+	def __init__(self, graph_dir):
+		self.graph_dir = graph_dir
+		with open(os.path.join(graph_dir, 'graph.json'), 'r') as info_file:
+			info = json.load(info_file)
+		self.n_vertices = info['n_vertices']
+		self.n_nodes = info['n_nodes']
+		self.n_global = info['n_global']
+		self.n_edges = info['n_edges']
+		self.indptr = self.mmap(os.path.join(graph_dir, 'graph.indptr'))
+		self.indices = self.mmap(os.path.join(graph_dir, 'graph.indices'))
+		self.names = None
+		self.types = None
+		self.name2vertex = None
+	def mmap(self, file_name):
+		with open(file_name, 'rb') as fh:
+			if os.fstat(fh.fileno()).st_size == 0:
+				return ''
+			return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+	def int32(self, array_mmap, start, n=1):
+		return struct.unpack_from('<%di' % n, array_mmap, start * 4)
+	def degree(self, v):
+		start, end = self.int32(self.indptr, v, 2)
+		return end - start
+	def neighbors(self, v):
+		## Vertex IDs of neighbors of vertex v (sorted)
+		start, end = self.int32(self.indptr, v, 2)
+		return self.int32(self.indices, start, end - start)
+	def is_global(self, v):
+		## True if v is a global KEGG ID vertex (False if it is a map node)
+		return v >= self.n_nodes
+	def load_names(self):
+		if self.names is None:
+			self.names = []
+			self.types = []
+			with open(os.path.join(self.graph_dir, 'graph.vertices.txt'), 'r') as vertices_file:
+				for line in vertices_file:
+					name, vertex_type = line.rstrip('\n').split('\t')
+					self.names.append(name)
+					self.types.append(vertex_type)
+			self.name2vertex = dict(zip(self.names, xrange(len(self.names))))
+	def vertex_name(self, v):
+		self.load_names()
+		return self.names[v]
+	def vertex_type(self, v):
+		self.load_names()
+		return self.types[v]
+	def vertex_id(self, name):
+		## Vertex ID of map node (e.g. "00010_Glycolysis__12") or KEGG ID (e.g. "cpd:C00022"); None if not in graph
+		self.load_names()
+		return self.name2vertex.get(name)
+	def map_nodes(self, kegg_id):
+		## Vertex IDs of the map nodes with KEGG ID
+		v = self.vertex_id(kegg_id)
+		if v is None or not self.is_global(v):
+			return ()
+		return self.neighbors(v)
+
+
+
+class File(object):
+	'''
+	Context Manager class for opening stdin/stdout/normal/gzip files.
+	
+	 - Will check that file exists if mode='r'
+	 - Will open using either normal open() or gzip.open() if *.gz extension detected.
+	 - Designed to be handled by a 'with' statement (other wise __enter__() method wont 
+	    be run and the file handle wont be returned)
+	
+	NOTE:
+		- Can't use .close() directly on this class unless you uncomment the close() method
+		- Can't use this class with a 'for' loop unless you uncomment the __iter__() method
+			- In this case you should also uncomment the close() method as a 'for'
+			   loop does not automatically cloase files, so you will have to do this 
+			   manually.
+		- __iter__() and close() are commented out by default as it is better to use a 'with' 
+		   statement instead as it will automatically close files when finished/an exception 
+		   occures. 
+		- Without __iter__() and close() this object will return an error when directly closed 
+		   or you attempt to use it with a 'for' loop. This is to force the use of a 'with' 
+		   statement instead. 
+	
+	Code based off of context manager tutorial from: https://book.pythontips.com/en/latest/context_managers.html
+	'''
+ 	def __init__(self, file_name, mode):
+		## Upon initializing class open file (using gzip if needed)
+		self.file_name = file_name
+		self.mode = mode
+		
+		## Check file exists if mode='r'
+		if not os.path.exists(self.file_name) and mode == 'r':
+			raise argparse.ArgumentTypeError("The file %s does not exist!" % self.file_name)
+	
+		## Open with gzip if it has the *.gz extension, else open normally (including stdin)
+		try:
+			if self.file_name.endswith(".gz"):
+				#print "Opening gzip compressed file (mode: %s): %s" % (self.mode, self.file_name) ## DEBUG
+				self.file_obj = gzip.open(self.file_name, self.mode+'b')
+			else:
+				#print "Opening normal file (mode: %s): %s" % (self.mode, self.file_name) ## DEBUG
+				self.file_obj = open(self.file_name, self.mode)
+		except IOError as e:
+			raise argparse.ArgumentTypeError('%s' % e)
+	def __enter__(self):
+		## Run When 'with' statement uses this class.
+		#print "__enter__: %s" % (self.file_name) ## DEBUG
+		return self.file_obj
+	def __exit__(self, type, value, traceback):
+		## Run when 'with' statement is done with object. Either because file has been exhausted, we are done writing, or an error has been encountered.
+		#print "__exit__: %s" % (self.file_name) ## DEBUG
+		self.file_obj.close()
+#	def __iter__(self):
+#		## iter method need for class to work with 'for' loops
+#		#print "__iter__: %s" % (self.file_name) ## DEBUG
+#		return self.file_obj
+#	def close(self):
+#		## method to call .close() directly on object.
+#		#print "close: %s" % (self.file_name) ## DEBUG
+#		self.file_obj.close()
+
+
+if __name__ == '__main__':
+	main()
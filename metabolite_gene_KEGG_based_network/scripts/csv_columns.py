@@ -0,0 +1,199 @@
+#!/usr/bin/env python2
+DESCRIPTION = '''
+Reads the columns of a CSV file (e.g. MAGI magi_gene_results.csv or magi_compound_results.csv) selected
+by header name and writes them tab seperated.
+
+NOTE:
+	- Rows are parsed by the csv module (C parser), so quoted fields with commas, quotes ("") or new
+	   lines in them (e.g. the MAGI note and neighbor columns) are read correctly. Lines before the first
+	   line with a quote in it are just split (same result, but faster for files without quoted fields).
+	- Only the selected columns are kept from each row and rows are read one at a time, so memory use
+	   does not depend on the size of the file.
+	- Blank rows and rows starting with "#" are ignored.
+'''
+import sys
+import os
+import argparse
+import logging
+import gzip
+import csv
+import operator
+import itertools
+
+## Pass arguments.
+def main():
+	## Pass command line arguments. 
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=DESCRIPTION)
+	parser.add_argument('-i', '--input', metavar='magi_compound_results.csv', 
+		required=False, default=sys.stdin, type=lambda x: File(x, 'r'), 
+		help='Input [gzip] CSV file with a header row (default: stdin)'
+	)
+	parser.add_argument('-o', '--out', metavar='columns.txt', 
+		required=False, default=sys.stdout, type=lambda x: File(x, 'w'), 
+		help='Output [gzip] tab seperated columns (default: stdout)'
+	)
+	parser.add_argument('-c', '--columns', metavar='feature,original_compound', 
+		required=True, type=str, 
+		help='Comma seperated names of the columns to write (required)'
+	)
+	parser.add_argument('-d', '--delim', 
+		required=False, default=',', type=str, 
+		help='Delimiter of the input file (default: %(default)s)'
+	)
+	parser.add_argument('--debug', 
+		required=False, action='store_true', 
+		help='Print DEBUG info (default: %(default)s)'
+	)
+	args = parser.parse_args()
+	
+	## Set up basic debugger
+	logFormat = "[%(levelname)s]: %(message)s"
+	logging.basicConfig(format=logFormat, stream=sys.stderr, level=logging.INFO)
+	if args.debug:
+		logging.getLogger().setLevel(logging.DEBUG)
+	
+	logging.debug('%s', args) ## DEBUG
+	
+	
+	with args.input as infile, args.out as outfile:
+		for columns in iter_columns_by_name(infile, args.columns.split(','), args.delim):
+			outfile.write('\t'.join(columns) + '\n')
+
+
+
+def iter_columns_by_name(infile, col_names, delim=','):
+	'''
+	Will yield each row of infile, parsing only the columns whose headers were provided in col_names
+	
+	NOTE:
+		- Assumes fist line contains column names
+		- Will return columns in the order they appear in col_names (as a tuple)
+		- Will return an error if not all column headers were found.
+		- Header names are case sensitive and must be complete word matches. 
+		- Fields can be quoted (see csv module); quoted fields can contain delim, quotes ("") and new lines.
+	'''
+	## Get first row from file. Assume it contains the column headers.
+	headers = csv.reader([infile.next()], delimiter=delim).next()
+	
+	## Get the index of column names in infile.
+	error_count = 0 # Keep track of errors
+	headers_index = []
+	for col_name in col_names:
+		try:
+			headers_index.append(headers.index(col_name))
+		except ValueError:
+			error_count += 1
+			logging.error('Column name "%s" not found in header row of input file', col_name)
+	## If we have encontered errors stop and print header row
+	if error_count > 0:
+		logging.error('Column names missing from infile. Stopping!')
+		logging.error('Problem header row: %s', delim.join(headers))
+		sys.exit(1)
+	
+	## Iterate over the file and return the columns of interest.
+	##	- Lines are split until the first line with a quote in it
+	##	- From then on all rows are parsed by the csv module (a quoted field can span lines)
+	get_columns = operator.itemgetter(*headers_index)
+	single = len(headers_index) == 1
+	rows = None
+	for line in infile:
+		if '"' in line:
+			rows = csv.reader(itertools.chain([line], infile), delimiter=delim)
+			break
+		line = line.rstrip('\r\n')
+		if not line or line.startswith('#'):
+			continue # Ignore blank or comment lines
+		
+		row = line.split(delim)
+		try:
+			columns = get_columns(row)
+		except IndexError:
+			missing_columns_error(row, headers_index, delim)
+		yield (columns,) if single else columns
+	if rows is None:
+		return
+	for row in rows:
+		if not row or row[0].startswith('#'):
+			continue # Ignore blank or comment rows
+		
+		try:
+			columns = get_columns(row)
+		except IndexError:
+			missing_columns_error(row, headers_index, delim)
+		yield (columns,) if single else columns
+
+
+
+def missing_columns_error(row, headers_index, delim=','):
+	## Stop with an error for a row that does not have all the columns in headers_index
+	logging.error('Row found that is missing some columns!')
+	logging.error('Problem row: %s', delim.join(row))
+	logging.error('Problem row split: %s', row)
+	logging.error('Column indexes used: %s', headers_index)
+	sys.exit(1)
+
+
+
+class File(object):
+	'''
+	Context Manager class for opening stdin/stdout/normal/gzip files.
+
+	 - Will check that file exists if mode='r'
+	 - Will open using either normal open() or gzip.open() if *.gz extension detected.
+	 - Designed to be handled by a 'with' statement (other wise __enter__() method wont 
+	    be run and the file handle wont be returned)
+	
+	NOTE:
+		- Can't use .close() directly on this class unless you uncomment the close() method
+		- Can't use this class with a 'for' loop unless you uncomment the __iter__() method
+			- In this case you should also uncomment the close() method as a 'for'
+			   loop does not automatically cloase files, so you will have to do this 
+			   manually.
+		- __iter__() and close() are commented out by default as it is better to use a 'with' 
+		   statement instead as it will automatically close files when finished/an exception 
+		   occures. 
+		- Without __iter__() and close() this object will return an error when directly closed 
+		   or you attempt to use it with a 'for' loop. This is to force the use of a 'with' 
+		   statement instead. 
+	
+	Code based off of context manager tutorial from: https://book.pythontips.com/en/latest/context_managers.html
+	'''
+ 	def __init__(self, file_name, mode):
+		## Upon initializing class open file (using gzip if needed)
+		self.file_name = file_name
+		self.mode = mode
+		
+		## Check file exists if mode='r'
+		if not os.path.exists(self.file_name) and mode == 'r':
+			raise argparse.ArgumentTypeError("The file %s does not exist!" % self.file_name)
+	
+		## Open with gzip if it has the *.gz extension, else open normally (including stdin)
+		try:
+			if self.file_name.endswith(".gz"):
+				#print "Opening gzip compressed file (mode: %s): %s" % (self.mode, self.file_name) ## DEBUG
+				self.file_obj = gzip.open(self.file_name, self.mode+'b')
+			else:
+				#print "Opening normal file (mode: %s): %s" % (self.mode, self.file_name) ## DEBUG
+				self.file_obj = open(self.file_name, self.mode)
+		except IOError as e:
+			raise argparse.ArgumentTypeError('%s' % e)
+	def __enter__(self):
+		## Run When 'with' statement uses this class.
+		#print "__enter__: %s" % (self.file_name) ## DEBUG
+		return self.file_obj
+	def __exit__(self, type, value, traceback):
+		## Run when 'with' statement is done with object. Either because file has been exhausted, we are done writing, or an error has been encountered.
+		#print "__exit__: %s" % (self.file_name) ## DEBUG
+		self.file_obj.close()
+#	def __iter__(self):
+#		## iter method need for class to work with 'for' loops
+#		#print "__iter__: %s" % (self.file_name) ## DEBUG
+#		return self.file_obj
+#	def close(self):
+#		## method to call .close() directly on object.
+#		#print "close: %s" % (self.file_name) ## DEBUG
+#		self.file_obj.close()
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python2
+DESCRIPTION = '''
+Downloads the KGML file of each KEGG Pathway map (from KEGG_Pathway_Maps_br08901_lvlC.txt) into --out_dir.
+
+Each map is downloaded as "ID_NAME.kgml" (spaces in the line replaced with '_'); the reaction (rn)
+network is downloaded if there is one, else the human gene (hsa) network.
+
+NOTE:
+	- Progress is kept in a job ledger (SQLite; --ledger) with the status (pending/done/missing/failed)
+	   and number of attempts of each map, so a run that is stopped part way resumes where it stopped.
+	- Maps downloaded more than --max_age days ago are downloaded again (0 = never).
+	- Failed downloads (connection errors, timeouts, HTTP 5xx/429) are retried up to --retries times
+	   with exponential backoff and jitter; maps that still fail are retried on the next run.
+	- A map is 'missing' if KEGG has neither a rn nor a hsa KGML file for it.
+	- KGML files are written to a tmp file and renamed once complete.
+	- --list writes the KGML files of the maps in the input (in input order) for
+	   KEGG_KGML_batch_to_network_format.py --list.
+'''
+import sys
+import os
+import argparse
+import logging
+import random
+import time
+import sqlite3
+import requests
+from multiprocessing.pool import ThreadPool
+import KEGG_reaction_KGML_to_network_format as KGML
+
+## Pass arguments.
+def main():
+	## Pass command line arguments.
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=DESCRIPTION)
+	parser.add_argument('-i', '--input', metavar='KEGG_Pathway_Maps_br08901_lvlC.txt',
+		required=True, type=lambda x: KGML.File(x, 'r'),
+		help='KEGG Pathway maps to download; "ID NAME" per line (required)'
+	)
+	parser.add_argument('-o', '--out_dir', metavar='kgml/',
+		required=False, default='.', type=str,
+		help='Directory to download KGML files to (default: %(default)s)'
+	)
+	parser.add_argument('-l', '--list', metavar='KEGG_Pathway_Maps.kgml_files.txt',
+		required=False, default=None, type=lambda x: KGML.File(x, 'w'),
+		help='Output file listing the KGML files of the input maps, in input order (default: not written)'
+	)
+	parser.add_argument('--ledger', metavar='KEGG_KGML_downloads.sqlite',
+		required=False, default=None, type=str,
+		help='SQLite job ledger (default: OUT_DIR/KEGG_KGML_downloads.sqlite)'
+	)
+	parser.add_argument('-w', '--workers',
+		required=False, default=12, type=int,
+		help='Number of maps to download at the same time (default: %(default)s)'
+	)
+	parser.add_argument('--retries',
+		required=False, default=5, type=int,
+		help='Number of times to retry a failed download in each run (default: %(default)s)'
+	)
+	parser.add_argument('--backoff',
+		required=False, default=2, type=float,
+		help='Base delay (seconds) between retries; doubles after each retry (default: %(default)s)'
+	)
+	parser.add_argument('--max_backoff',
+		required=False, default=120, type=float,
+		help='Max delay (seconds) between retries (default: %(default)s)'
+	)
+	parser.add_argument('--timeout',
+		required=False, default=60, type=float,
+		help='Seconds to wait for KEGG to respond (default: %(default)s)'
+	)
+	parser.add_argument('--max_age',
+		required=False, default=1, type=float,
+		help='Download maps again if they were downloaded more than this many days ago; 0 = never (default: %(default)s)'
+	)
+	parser.add_argument('--rest_url', metavar='http://rest.kegg.jp',
+		required=False, default='http://rest.kegg.jp', type=str,
+		help='Base URL of KEGG REST API (default: %(default)s)'
+	)
+	parser.add_argument('--debug',
+		required=False, action='store_true',
+		help='Print DEBUG info (default: %(default)s)'
+	)
+	args = parser.parse_args()
+	
+	## Set up basic debugger
+	logFormat = "[%(levelname)s]: %(message)s"
+	logging.basicConfig(format=logFormat, stream=sys.stderr, level=logging.INFO)
+	if args.debug:
+		logging.getLogger().setLevel(logging.DEBUG)
+	
+	logging.debug('%s', args) ## DEBUG
+	
+	if not os.path.exists(args.out_dir):
+		os.makedirs(args.out_dir)
+	if args.ledger is None:
+		args.ledger = os.path.join(args.out_dir, 'KEGG_KGML_downloads.sqlite')
+	
+	with args.input as input_file:
+		maps = parse_map_list(input_file)
+	
+	downloader = KEGG_KGML_downloader(args.out_dir, args.ledger, args.workers, args.retries,
+		args.backoff, args.max_backoff, args.timeout, args.rest_url)
+	downloader.run(maps, args.max_age)
+	
+	if args.list is not None:
+		with args.list as list_file:
+			for kgml_file in downloader.kgml_files(maps):
+				list_file.write(kgml_file + '\n')
+	
+	## Exit with error if any map could not be downloaded (so the build can be rerun to resume)
+	if downloader.counts['failed'] > 0:
+		sys.exit(1)
+
+
+
+def parse_map_list(input_file):
+	## Returns [[ID, NAME], ...] from lines "ID NAME" (e.g. "00010 Glycolysis  Gluconeogenesis" -> ["00010", "00010_Glycolysis__Gluconeogenesis"])
+	maps = []
+	for line in input_file:
+		line = line.strip()
+		if not line or line.startswith('#'):
+			continue
+		maps.append([line.split()[0], line.replace(' ', '_')])
+	return maps
+
+
+
+class KEGG_KGML_downloader(object):
+	'''
+	Downloads KGML files using a pool of threads and keeps track of each map in a SQLite job ledger.
+	
+	 - Only the main thread uses the ledger; the status of each map is saved as soon as its download
+	    finishes, so stopping the run only loses the downloads in progress.
+	 - counts/bytes/elapsed of the last run() are kept for reporting.
+	'''
+	def __init__(self, out_dir, ledger_file, workers=12, retries=5, backoff=2, max_backoff=120, timeout=60, rest_url='http://rest.kegg.jp', session=None):
+		self.out_dir = out_dir
+		self.workers = max(1, workers)
+		self.retries = retries
+		self.backoff = backoff
+		self.max_backoff = max_backoff
+		self.timeout = timeout
+		self.rest_url = rest_url.rstrip('/')
+		self.session = session if session is not None else KGML.new_session(self.workers)
+		self.ledger = sqlite3.connect(ledger_file, isolation_level=None)
+		self.ledger.execute('CREATE TABLE IF NOT EXISTS jobs (kegg_id TEXT PRIMARY KEY, name TEXT NOT NULL, '
+			'status TEXT NOT NULL, org TEXT, attempts INTEGER NOT NULL DEFAULT 0, error TEXT, updated REAL)')
+		self.counts = {'done':0, 'missing':0, 'failed':0, 'skipped':0}
+		self.bytes = 0
+		self.elapsed = 0
+	def add_jobs(self, maps, max_age=1):
+		## Add new maps to the ledger as 'pending' and set maps that need to be downloaded again back to 'pending'.
+		## RETURN: [[ID, NAME], ...] of the maps to download in this run
+		jobs = []
+		for kegg_id, name in maps:
+			row = self.ledger.execute('SELECT name, status, updated FROM jobs WHERE kegg_id=?', (kegg_id,)).fetchone()
+			if row is None:
+				self.ledger.execute('INSERT INTO jobs (kegg_id, name, status) VALUES (?, ?, ?)', (kegg_id, name, 'pending'))
+			elif row[0] != name or row[1] in ('pending', 'failed'):
+				self.ledger.execute('UPDATE jobs SET name=?, status=? WHERE kegg_id=?', (name, 'pending', kegg_id))
+			elif max_age > 0 and time.time() - row[2] > max_age * 24 * 60 * 60:
+				self.ledger.execute('UPDATE jobs SET status=? WHERE kegg_id=?', ('pending', kegg_id))
+			elif row[1] == 'done' and not os.path.exists(self.kgml_file(name)):
+				self.ledger.execute('UPDATE jobs SET status=? WHERE kegg_id=?', ('pending', kegg_id))
+			else:
+				self.counts['skipped'] += 1
+				continue
+			jobs.append([kegg_id, name])
+		return jobs
+	def run(self, maps, max_age=1):
+		## Download all maps that are not already done (see add_jobs()).
+		jobs = self.add_jobs(maps, max_age)
+		logging.info('%s maps to download (%s already done)', len(jobs), self.counts['skipped']) ## INFO
+		start = time.time()
+		pool = ThreadPool(self.workers)
+		try:
+			for kegg_id, status, org, attempts, n_bytes, error in pool.imap_unordered(self.download_map, jobs):
+				self.ledger.execute('UPDATE jobs SET status=?, org=?, attempts=attempts+?, error=?, updated=? WHERE kegg_id=?',
+					(status, org, attempts, error, time.time(), kegg_id))
+				self.counts[status] += 1
+				self.bytes += n_bytes
+				if status == 'failed':
+					logging.error('Failed to download %s after %s attempts: %s', kegg_id, attempts, error) ## ERROR
+				else:
+					logging.info('Done %s: %s%s (%s attempts)', kegg_id, org if org else 'no KGML file', kegg_id if org else '', attempts) ## INFO
+		finally:
+			pool.close()
+			pool.join()
+			self.elapsed = time.time() - start
+			self.report()
+	def report(self):
+		n_downloaded = self.counts['done'] + self.counts['missing'] + self.counts['failed']
+		logging.info('Processed %s maps in %.1f seconds (%.2f maps/sec, %.2f MB/sec): %s done, %s without KGML file, %s failed, %s skipped (already done)',
+			n_downloaded, self.elapsed, n_downloaded / max(self.elapsed, 1e-6), self.bytes / 1048576.0 / max(self.elapsed, 1e-6),
+			self.counts['done'], self.counts['missing'], self.counts['failed'], self.counts['skipped']) ## INFO
+	def kgml_file(self, name):
+		return os.path.join(self.out_dir, name + '.kgml')
+	def kgml_files(self, maps):
+		## KGML files of maps that have been downloaded (in the order of maps)
+		kgml_files = []
+		for kegg_id, name in maps:
+			row = self.ledger.execute('SELECT status FROM jobs WHERE kegg_id=?', (kegg_id,)).fetchone()
+			if row is not None and row[0] == 'done':
+				kgml_files.append(self.kgml_file(name))
+		return kgml_files
+	def download_map(self, job):
+		## Download the rn (or if not found, the hsa) KGML file of map.
+		## RETURN: [ID, status, org, number of attempts, bytes downloaded, error]
+		kegg_id, name = job
+		attempts = 0
+		n_bytes = 0
+		for org in ['rn', 'hsa']:
+			url = '%s/get/%s%s/kgml' % (self.rest_url, org, kegg_id)
+			text, n_attempts, error = self.download(url)
+			attempts += n_attempts
+			if error is not None:
+				return [kegg_id, 'failed', None, attempts, n_bytes, error]
+			if text:
+				n_bytes += len(text)
+				with open(self.kgml_file(name) + '.tmp', 'wb') as kgml_file:
+					kgml_file.write(text)
+				os.rename(self.kgml_file(name) + '.tmp', self.kgml_file(name))
+				return [kegg_id, 'done', org, attempts, n_bytes, None]
+			logging.debug('No %s KGML file for %s', org, kegg_id) ## DEBUG
+		if os.path.exists(self.kgml_file(name)):
+			os.remove(self.kgml_file(name))
+		return [kegg_id, 'missing', None, attempts, n_bytes, None]
+	def download(self, url):
+		## Download url, retrying failed downloads with exponential backoff (+ jitter).
+		## RETURN: [content ('' if not found), number of attempts, error (None if downloaded)]
+		error = None
+		for attempt in range(self.retries + 1):
+			if attempt > 0:
+				delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+				logging.debug('Retrying %s in %.2f seconds (%s)', url, delay, error) ## DEBUG
+				time.sleep(delay)
+			try:
+				r = self.session.get(url, timeout=self.timeout)
+			except requests.exceptions.RequestException as e:
+				error = str(e)
+				continue
+			if r.status_code == 404:
+				return ['', attempt + 1, None]
+			if r.status_code == 429 or r.status_code >= 500:
+				error = 'HTTP %s' % r.status_code
+				continue
+			if r.status_code != 200:
+				return ['', attempt + 1, 'HTTP %s' % r.status_code]
+			return [r.content, attempt + 1, None]
+		return ['', self.retries + 1, error]
+
+
+
+if __name__ == '__main__':
+	main()
@@ -3,61 +3,37 @@
 SCRIPT=$(readlink -f "$0")      # Absolute path to this script, e.g. /path/to/data/foo.sh
 SCRIPTPATH=$(dirname "$SCRIPT") # Absolute path this script is in, thus /path/to/data
 
+## Cache of KEGG web pages (kept between runs so rebuilds mostly run from local disk)
+CACHE_DIR="${KEGG_CACHE_DIR:-$PWD/kegg_cache}"
+
 ## Get all KEGG Reaction Networks
+## (kgml/ is kept between runs; only maps whose KGML file changed are converted again, see SHARD_DIR)
 DIR="kgml"
-rm -fr "$DIR"; mkdir -p "$DIR"; cd "$DIR"
+mkdir -p "$DIR"; cd "$DIR"
 
 ALL_NODES="KEGG_Pathway_Networks.nodes.txt"
 ALL_EDGES="KEGG_Pathway_Networks.edges.txt"
+ALL_NNF="KEGG_Pathway_Networks.edges.nnf"
+KGML_LIST="KEGG_Pathway_Maps.kgml_files.txt"
+
+## Info fetched for each compound/reaction/etc. (shared by all maps so each is only fetched once per build)
+STORE="$PWD/KEGG_annotations.sqlite"
 
-rm -f "$ALL_NODES" "$ALL_EDGES"
-echo -e "node_id\tkegg_id\tname\ttype\tinfo\tlink\tx\ty\twidth\theight\tshape" > "$ALL_NODES"
-echo -e "node_1\tnode_2" > "$ALL_EDGES"
+## Converted nodes/edges of each map + manifest of the KGML file each was made from
+SHARD_DIR="$PWD/shards"
+
+rm -f "$ALL_NODES" "$ALL_EDGES" "$ALL_NNF" "$KGML_LIST" "$STORE"
 
 ## Get 'br08901.keg' which lists all KEGG Pathways
 wget -O "KEGG_Pathway_Maps_br08901.keg" "https://www.genome.jp/kegg-bin/download_htext?htext=br08901.keg&format=htext&filedir="
 awk '$1~"^C"' "KEGG_Pathway_Maps_br08901.keg" | sed -e 's/^C[ ]*//' -e 's/,//' -e 's/(//g' -e 's/)//g' -e 's@/@@g' -e 's@\\@@g' > "KEGG_Pathway_Maps_br08901_lvlC.txt"
 
-## Get kgml reaction network file for each KEGG Pathway (if one exists)
-download_network() {
-	DIR="${1}"; shift
-	ALL_NODES="${1}"; shift
-	ALL_EDGES="${1}"; shift
-	SCRIPTPATH="${1}"; shift
-	line="${@}"
-        ID=$(echo "$line" | awk '{print $1}')
-        NAME=$(echo "$line" | sed -e 's/ /_/g')
-	
-	# Print all info to log file
-	echo "Started processing $ID   $NAME"
-	exec 1> "${NAME}.processing.log" 2>&1
-        echo "## Processing $ID   $NAME"
-	
-        wget "http://rest.kegg.jp/get/rn${ID}/kgml" -O "$NAME.kgml" -o "$NAME.wget.log"
-	if [ -s "$NAME.kgml" ]; then
-        	"$SCRIPTPATH/KEGG_reaction_KGML_to_network_format.py" -x "$NAME.kgml" --edges "$NAME.edges.txt" --nodes "$NAME.nodes.txt"
-		awk -F'\t' -vNAME="$NAME" 'NR>1{print NAME"__"$0}' "$NAME.nodes.txt" >> "$ALL_NODES"
-		awk -F'\t' -vNAME="$NAME" 'NR>1{print NAME"__"$1"\t"NAME"__"$2}' "$NAME.edges.txt" >> "$ALL_EDGES"
-	else
-		echo "##    - No reaction network found!"
-		echo "##        - Searching for gene network."
-        	rm -f "$NAME.kgml" "$NAME.wget.log"
-		
-		wget "http://rest.kegg.jp/get/hsa${ID}/kgml" -O "$NAME.kgml" -o "$NAME.wget.log"
-		if [ -s "$NAME.kgml" ]; then
-			"$SCRIPTPATH/KEGG_reaction_KGML_to_network_format.py" -x "$NAME.kgml" --edges "$NAME.edges.txt" --nodes "$NAME.nodes.txt"
-			awk -F'\t' -vNAME="$NAME" 'NR>1{print NAME"__"$0}' "$NAME.nodes.txt" >> "$ALL_NODES"
-			awk -F'\t' -vNAME="$NAME" 'NR>1{print NAME"__"$1"\t"NAME"__"$2}' "$NAME.edges.txt" >> "$ALL_EDGES"
-		else
-			echo "##    - No gene network found!"
-			echo "##        - Giving up :("
-			rm -f "$NAME.kgml" "$NAME.wget.log"
-		fi
-	fi
-	echo "## Done $ID   $NAME"
-}
-
-export -f download_network
-parallel -j 12 download_network "$DIR" "$ALL_NODES" "$ALL_EDGES" "$SCRIPTPATH" :::: "KEGG_Pathway_Maps_br08901_lvlC.txt"
+## Get kgml reaction network file for each KEGG Pathway (rn, or if there is none hsa; if one exists)
+## Progress is kept in KEGG_KGML_downloads.sqlite so rerunning the script resumes an unfinished download.
+"$SCRIPTPATH/download_KEGG_KGML_files.py" --input "KEGG_Pathway_Maps_br08901_lvlC.txt" --out_dir . --list "$KGML_LIST" --workers 12
+
+## Convert all downloaded networks (in br08901 order) in a single process which writes the merged nodes and edges (tsv + nnf) files.
+"$SCRIPTPATH/KEGG_KGML_batch_to_network_format.py" --list "$KGML_LIST" --edges "$ALL_EDGES" --nodes "$ALL_NODES" --nnf "$ALL_NNF" \
+	--workers 12 --cache_dir "$CACHE_DIR" --store "$STORE" --shard_dir "$SHARD_DIR"
 
 echo ""; echo "Done processing networks!"
@@ -0,0 +1,153 @@
+#!/usr/bin/env python2
+DESCRIPTION = '''
+Fills in the name/info of the nodes written by KEGG_reaction_KGML_to_network_format.py (or
+KEGG_KGML_batch_to_network_format.py) with --deferred, using the pending file written by that run.
+
+NOTE:
+	- Nodes in the pending file are replaced with the same row a normal (not deferred) run would
+	   have written; all other nodes are copied as is.
+	- Info is fetched the same way as KEGG_reaction_KGML_to_network_format.py (see its --cache_*,
+	   --store, --backend and --threads options), so running with --cache_only fills the nodes from
+	   the page cache alone.
+'''
+import sys
+import os
+import argparse
+import logging
+import collections
+import xml.etree.ElementTree as ET
+import KEGG_reaction_KGML_to_network_format as KGML
+
+## Pass arguments.
+def main():
+	## Pass command line arguments.
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=DESCRIPTION)
+	parser.add_argument('-n', '--nodes', metavar='network.nodes.txt',
+		required=True, type=lambda x: KGML.File(x, 'r'),
+		help='Input [gzip] network node info file written with --deferred (required)'
+	)
+	parser.add_argument('-p', '--pending', metavar='network.pending.txt',
+		required=True, type=lambda x: KGML.File(x, 'r'),
+		help='Input [gzip] pending file written with --deferred (required)'
+	)
+	parser.add_argument('-o', '--out', metavar='network.nodes.filled.txt',
+		required=True, type=lambda x: KGML.File(x, 'w'),
+		help='Output [gzip] network node info file (required)'
+	)
+	parser.add_argument('--cache_dir', metavar='kegg_cache',
+		required=False, default=None, type=str,
+		help='Directory to cache KEGG web pages in (default: no caching)'
+	)
+	parser.add_argument('--cache_ttl',
+		required=False, default=30, type=float,
+		help='Number of days a cached page is valid for; 0 = never expire (default: %(default)s)'
+	)
+	parser.add_argument('--cache_max_size',
+		required=False, default=2048, type=float,
+		help='Max size (MB) of the cache; least recently used pages are removed once exceeded (default: %(default)s)'
+	)
+	parser.add_argument('--cache_only',
+		required=False, action='store_true',
+		help='Offline mode; only use pages in --cache_dir and never download (default: %(default)s)'
+	)
+	parser.add_argument('-s', '--store', metavar='KEGG_annotations.sqlite',
+		required=False, default=None, type=str,
+		help='SQLite database to share fetched entry info between runs/processes (default: no store)'
+	)
+	parser.add_argument('-b', '--backend',
+		required=False, default='html', choices=['html', 'rest'],
+		help='Get entry info from kegg.jp web pages (html) or KEGG REST flat files (rest) (default: %(default)s)'
+	)
+	parser.add_argument('--rest_url', metavar='http://rest.kegg.jp',
+		required=False, default='http://rest.kegg.jp', type=str,
+		help='Base URL of KEGG REST API (default: %(default)s)'
+	)
+	parser.add_argument('-t', '--threads',
+		required=False, default=1, type=int,
+		help='Number of KEGG pages to download at the same time (default: %(default)s)'
+	)
+	parser.add_argument('--debug',
+		required=False, action='store_true',
+		help='Print DEBUG info (default: %(default)s)'
+	)
+	args = parser.parse_args()
+	
+	## Set up basic debugger
+	logFormat = "[%(levelname)s]: %(message)s"
+	logging.basicConfig(format=logFormat, stream=sys.stderr, level=logging.INFO)
+	if args.debug:
+		logging.getLogger().setLevel(logging.DEBUG)
+	
+	logging.debug('%s', args) ## DEBUG
+	
+	## Set up KEGG web page cache and store
+	cache = None
+	if args.cache_dir is not None:
+		cache = KGML.KEGG_page_cache(args.cache_dir, args.cache_ttl, args.cache_max_size, args.cache_only)
+	elif args.cache_only:
+		logging.error('--cache_only requires --cache_dir to be set')
+		sys.exit(1)
+	store = None
+	if args.store is not None:
+		store = KGML.KEGG_annotation_store(args.store)
+	fetcher = KGML.KEGG_page_fetcher(cache, args.threads, args.backend, args.rest_url)
+	
+	with args.pending as pending_file:
+		pending = load_pending(pending_file)
+	try:
+		with args.nodes as nodes_file, args.out as out_file:
+			fill_KEGG_node_annotations(nodes_file, out_file, pending, fetcher, store)
+	except:
+		## Let other processes fetch the entries we claimed but did not fill
+		if store is not None:
+			store.release_claims()
+		raise
+	
+	if store is not None:
+		store.close()
+		logging.info('KEGG annotation store: %s from store, %s fetched', store.hits, store.fetched) ## INFO
+	
+	if cache is not None:
+		cache.evict()
+		logging.info('KEGG page cache: %s hits, %s misses', cache.hits, cache.misses) ## INFO
+
+
+
+def load_pending(pending_file):
+	## Read pending file (node_id<tab>entry XML; see KGML.write_pending())
+	## RETURN: OrderedDict {node_id:'entry' element}
+	pending = collections.OrderedDict()
+	for line in pending_file:
+		line = line.rstrip('\n')
+		if not line or line.startswith('#'):
+			continue
+		node_id, entry_xml = line.split('\t', 1)
+		pending[node_id] = ET.fromstring(entry_xml)
+	return pending
+
+
+
+def fill_KEGG_node_annotations(nodes_file, out_file, pending, fetcher, store=None):
+	'''
+	Copy nodes_file to out_file, replacing the nodes in pending with their row after fetching
+	their info (the info of all pending entries is downloaded at once if the fetcher can).
+	'''
+	KGML.prefetch_entries(pending.values(), fetcher, store)
+	
+	out_file.write(nodes_file.readline()) # Header
+	n_filled = 0
+	for line in nodes_file:
+		node_id = line.split('\t', 1)[0]
+		if node_id not in pending:
+			out_file.write(line)
+			continue
+		entry = pending[node_id]
+		node = KGML.parse_entry(entry, fetcher, store)
+		KGML.write_nodes(out_file, [node], node_id[:len(node_id)-len(entry.attrib['id'])])
+		n_filled += 1
+	logging.info('Filled in info for %s of %s pending nodes', n_filled, len(pending)) ## INFO
+
+
+
+if __name__ == '__main__':
+	main()
@@ -17,6 +17,7 @@ import os
 import argparse
 import logging
 import gzip
+import csv_columns as CSV
 
 ## Pass arguments.
 def main():
@@ -94,7 +95,7 @@ def filter_magi_compound_results(infile, outfile, threshold_compound_score, thre
 	# 20 adj
 	'''
 	col_names = ["feature", "original_compound", "neighbor", "original_mz", "database_id_r2g", "compound_score", "reciprocal_score", "e_score_r2g", "e_score_g2r"]
-	for feature, original_compound, neighbor, original_mz, database_id_r2g, compound_score, reciprocal_score, e_score_r2g, e_score_g2r in iter_columns_by_name(infile, col_names):
+	for feature, original_compound, neighbor, original_mz, database_id_r2g, compound_score, reciprocal_score, e_score_r2g, e_score_g2r in CSV.iter_columns_by_name(infile, col_names):
 		try:
 			reciprocal_score = float(reciprocal_score)
 			
@@ -127,53 +128,6 @@ def filter_magi_compound_results(infile, outfile, threshold_compound_score, thre
 				outfile.write('\t'.join([feature, original_compound, original_mz, database_id_r2g]) + '\n')
 
 
-def iter_columns_by_name(infile, col_names, delim=','):
-	'''
-	Will yield each line of infile, parsing only the columns whose headers were provided in col_names
-	
-	NOTE:
-		- Assumes fist line contains column names
-		- Will return lines in the order they appear in col_names
-		- Will return an error if not all column headers were found.
-		- Header names are case sensitive and must be complete word matches. 
-	'''
-	
-	## Get first line from file. Assume it contains the column headers.
-	header_line = infile.next().strip('\n')
-	headers = header_line.strip('\n').split(delim)
-	
-	## Get the index of column names in infile.
-	error_count = 0 # Keep track of errors
-	headers_index = []
-	for col_name in col_names:
-		try:
-			headers_index.append(headers.index(col_name))
-		except ValueError:
-			error_count += 1
-			logging.error('Column name "%s" not found in header row of input file', col_name)
-	## If we have encontered errors stop and print header row
-	if error_count > 0:
-		logging.error('Column names missing from infile. Stopping!')
-		logging.error('Problem header row: %s', header_line)
-		sys.exit(1)
-	
-	## Iterate over the file and return the columns of interest.
-	for line in infile:
-		line = line.strip('\n')
-		if not line or line.startswith('#'):
-			continue # Ignore blank or comment lines
-		
-		try:
-			line_split = line.split(delim)
-			yield [line_split[i] for i in headers_index]
-		except IndexError:
-			logging.error('Row found that is missing some columns!')
-			logging.error('Problem row: %s', line)
-			logging.error('Problem row split: %s', line_split)
-			logging.error('Column indexes used: %s', headers_index)
-			sys.exit(1)
-
-
 class File(object):
 	'''
 	Context Manager class for opening stdin/stdout/normal/gzip files.
@@ -7,14 +7,35 @@ NOTE:
 	- Does **NOT** consider the direction of the reaction. 
 		RHEA ID might be for a reaction the goes in a dirrection that is different to the KEGG reaction returned.
 	- **CAN NOT** fetch KEGG reaction ID for non RHEA IDs (e.g. 5-NUCLEOTID-RXN). Will print en error and move on.
+	- IDs are first looked up in the RHEA to KEGG Reaction mapping file (--mapping; from prepare_RHEA_rdf_file.py)
+	   or ID crosswalk (--crosswalk; from build_ID_crosswalk.py); only IDs that are not in them are scraped
+	   from rhea-db.org (unless --offline). RHEA IDs in the mapping file without a KEGG reaction are not scraped.
+	- The number of IDs resolved from each source is printed at the end.
+	- Pages are downloaded by --threads threads sharing one session (kept alive connections), no faster
+	   than --rate requests per second in total. Requests that time out (--timeout) or fail (connection
+	   errors, HTTP 5xx/429) are retried up to --retries times with exponential backoff and jitter.
+	- Results are written as they finish, so the output is not in input order unless --keep_order is
+	   used (IDs resolved locally are written first).
+	- The 4 RHEA IDs of a reaction (master, 2 directional and bidirectional; master ID = RHEA ID - RHEA ID % 4)
+	   share one "Links to other resources" table, so IDs are grouped by master ID and only one page is
+	   downloaded per reaction.
+	- The KEGG reaction IDs scraped for each reaction are kept in --cache (keyed by master ID), so IDs
+	   scraped by an earlier run are not downloaded again. Failed downloads are not cached.
 '''
 import sys
 import os
 import argparse
 import logging
 import gzip
+import collections
+import random
+import threading
+import time
+import sqlite3
 import requests
+from multiprocessing.pool import ThreadPool
 from bs4 import BeautifulSoup
+import build_ID_crosswalk as X
 
 ## Pass arguments.
 def main():
@@ -28,7 +49,58 @@ def main():
 		required=False, default=sys.stdout, type=lambda x: File(x, 'w'),
 	help='Output [gzip] file (default: stdout)'
 	)
-
+	parser.add_argument('-m', '--mapping', metavar='RHEA_2_KEGG_Reaction_mapping.txt.gz',
+		required=False, default=None, type=lambda x: File(x, 'r'),
+		help='RHEA to KEGG Reaction mapping file to look IDs up in before scraping rhea-db.org (default: not used)'
+	)
+	parser.add_argument('-c', '--crosswalk', metavar='ID_crosswalk.sqlite',
+		required=False, default=None, type=str,
+		help='ID crosswalk (build_ID_crosswalk.py) to look IDs up in before scraping rhea-db.org (default: not used)'
+	)
+	parser.add_argument('--cache', metavar='RHEA_KEGG_cache.sqlite',
+		required=False, default=None, type=str,
+		help='SQLite database to keep the KEGG reaction IDs scraped for each reaction in between runs (default: no caching)'
+	)
+	parser.add_argument('--cache_ttl',
+		required=False, default=30, type=float,
+		help='Number of days a cached reaction is valid for; 0 = never expire (default: %(default)s)'
+	)
+	parser.add_argument('--offline',
+		required=False, action='store_true',
+		help='Never scrape rhea-db.org; IDs not in --mapping/--crosswalk are reported as not found (default: %(default)s)'
+	)
+	parser.add_argument('-t', '--threads',
+		required=False, default=4, type=int,
+		help='Number of rhea-db.org pages to download at the same time (default: %(default)s)'
+	)
+	parser.add_argument('--rate',
+		required=False, default=5, type=float,
+		help='Max number of requests per second to rhea-db.org (all threads); 0 = no limit (default: %(default)s)'
+	)
+	parser.add_argument('--timeout',
+		required=False, default=30, type=float,
+		help='Seconds to wait for rhea-db.org to respond (default: %(default)s)'
+	)
+	parser.add_argument('--retries',
+		required=False, default=3, type=int,
+		help='Number of times to retry a failed request (default: %(default)s)'
+	)
+	parser.add_argument('--backoff',
+		required=False, default=1, type=float,
+		help='Base delay (seconds) between retries; doubles after each retry (default: %(default)s)'
+	)
+	parser.add_argument('--max_backoff',
+		required=False, default=60, type=float,
+		help='Max delay (seconds) between retries (default: %(default)s)'
+	)
+	parser.add_argument('--keep_order',
+		required=False, action='store_true',
+		help='Write the output in input order (default: in the order IDs are resolved)'
+	)
+	parser.add_argument('--rhea_url', metavar='https://www.rhea-db.org/rhea/',
+		required=False, default='https://www.rhea-db.org/rhea/', type=str,
+		help='URL of rhea-db.org reaction pages (default: %(default)s)'
+	)
 	parser.add_argument('--debug', 
 		required=False, action='store_true', 
 		help='Print DEBUG info (default: %(default)s)'
@@ -44,61 +116,340 @@ def main():
 	logging.debug('%s', args) ## DEBUG
 	
 	
+	## Set up local ID lookup
+	local = None
+	if args.mapping is not None:
+		with args.mapping as mapping_file:
+			local = RHEA_mapping(mapping_file)
+	elif args.crosswalk is not None:
+		local = RHEA_crosswalk(args.crosswalk)
+	
+	cache = None
+	if args.cache is not None:
+		cache = RHEA_result_cache(args.cache, args.cache_ttl)
+	
+	fetcher = RHEA_page_fetcher(args.threads, args.rate, args.timeout, args.retries,
+		args.backoff, args.max_backoff, args.rhea_url)
+	
 	with args.rhea as infile, args.out as outfile:
-		scrape_rheaDB(infile, outfile)
+		get_KEGG_reaction_IDs(infile, outfile, local, args.offline, fetcher=fetcher, keep_order=args.keep_order, cache=cache)
+	
+	if cache is not None:
+		cache.close()
+		logging.info('RHEA cache: %s hits, %s misses, %s requests to rhea-db.org', cache.hits, cache.misses, fetcher.requests) ## INFO
 
 
 
-def scrape_rheaDB(RHEA_IDs, outfile, stop_on_invalid_url = False):
+def get_KEGG_reaction_IDs(RHEA_IDs, outfile, local=None, offline=False, stop_on_invalid_url=False, fetcher=None, keep_order=False, cache=None):
+	'''
+	Write "RHEA_ID<tab>KEGG_ID" for each KEGG reaction of each RHEA ID in RHEA_IDs.
 	
+	local: RHEA_mapping or RHEA_crosswalk to look IDs up in before scraping rhea-db.org
+	
+	offline: Dont scrape rhea-db.org for IDs not found in local
+	
+	fetcher: RHEA_page_fetcher to scrape rhea-db.org with (default: RHEA_page_fetcher())
+	
+	keep_order: Write output in the order of RHEA_IDs (default: in the order IDs are resolved)
+	
+	cache: RHEA_result_cache to look reactions up in before scraping rhea-db.org (and to save scraped reactions to)
+	'''
+	if fetcher is None:
+		fetcher = RHEA_page_fetcher()
+	local_name = local.name if local is not None else 'local'
+	sources = [local_name, 'cache', 'rhea-db.org'] if cache is not None else [local_name, 'rhea-db.org']
+	counts = collections.OrderedDict([[source, 0] for source in sources] + [['not found', 0], ['failed', 0]])
+	
+	## Output lines of each ID (by input index) waiting for the IDs before them (only with keep_order)
+	waiting = {}
+	next_index = [0]
+	def write(index, RHEA_ID, KEGG_IDs):
+		lines = ''.join([RHEA_ID+"\t"+KEGG_ID+"\n" for KEGG_ID in KEGG_IDs])
+		if not keep_order:
+			outfile.write(lines)
+			return
+		waiting[index] = lines
+		while next_index[0] in waiting:
+			outfile.write(waiting.pop(next_index[0]))
+			next_index[0] += 1
+	
+	## IDs to scrape grouped by master ID, so only one page is downloaded for the 4 IDs of a reaction
+	to_scrape = collections.OrderedDict() # {master ID:[[index, RHEA_ID], ...]}
+	index = 0
 	for RHEA_ID in RHEA_IDs:
 		RHEA_ID = RHEA_ID.strip()
 		if not RHEA_ID or RHEA_ID.startswith('#'):
 			continue
 		
+		KEGG_IDs = local.get(RHEA_ID) if local is not None else None
+		if KEGG_IDs is not None:
+			counts[local_name] += 1
+			write(index, RHEA_ID, KEGG_IDs)
+		elif offline:
+			logging.debug('No KEGG reaction IDs found for %s', RHEA_ID) ## DEBUG
+			counts['not found'] += 1
+			write(index, RHEA_ID, [])
+		else:
+			master_ID = master_RHEA_ID(RHEA_ID)
+			cached = cache.get(master_ID) if cache is not None else None
+			if cached is None:
+				to_scrape.setdefault(master_ID, []).append([index, RHEA_ID])
+			elif cached[0]:
+				counts['cache'] += 1
+				write(index, RHEA_ID, cached[1])
+			else:
+				counts['not found'] += 1
+				write(index, RHEA_ID, [])
+		index += 1
+	
+	## Scrape the page of the first ID of each reaction and use it for all IDs of that reaction
+	jobs = [[master_ID, group[0][1]] for master_ID, group in to_scrape.iteritems()]
+	if jobs:
+		logging.debug('Scraping %s RHEA IDs (%s reactions) from rhea-db.org', sum([len(group) for group in to_scrape.itervalues()]), len(jobs)) ## DEBUG
+	for master_ID, scraped_ID, KEGG_IDs, error in fetcher.scrape_all(jobs):
+		if error is None and cache is not None:
+			cache.put(master_ID, KEGG_IDs)
+		for index, RHEA_ID in to_scrape[master_ID]:
+			if error is not None:
+				logging.error('Failed to download page of %s: %s', RHEA_ID, error) ## ERROR
+				counts['failed'] += 1
+			elif KEGG_IDs is None:
+				counts['not found'] += 1
+				if stop_on_invalid_url:
+					sys.exit(1)
+			else:
+				counts['rhea-db.org'] += 1
+			write(index, RHEA_ID, KEGG_IDs if KEGG_IDs is not None else [])
+	logging.info('Resolved RHEA IDs: %s', ', '.join(['%s from %s' % (n, source) if source in sources else '%s %s' % (n, source)
+		for source, n in counts.iteritems()])) ## INFO
+	return counts
+
+
+
+class RHEA_mapping(object):
+	'''
+	RHEA to KEGG Reaction mapping (RHEA_2_KEGG_Reaction_mapping.txt.gz from prepare_RHEA_rdf_file.py) held in memory.
+	
+	 - get() returns the KEGG reaction IDs of a RHEA ID ("RHEA:10750" or "10750"), [] if the RHEA
+	    ID has none, or None if the RHEA ID is not in the mapping.
+	'''
+	name = 'mapping file'
+	def __init__(self, mapping_file):
+		self.KEGG = {} # {RHEA_ID:[KEGG reaction IDs]}
+		for line in mapping_file:
+			line = line.rstrip('\n')
+			if not line or line.startswith('#'):
+				continue
+			cells = line.split('\t')
+			self.KEGG[cells[0]] = [x for x in cells[1].split(',') if x] if len(cells) > 1 else []
+		logging.debug('Loaded %s RHEA IDs from mapping file', len(self.KEGG)) ## DEBUG
+	def get(self, RHEA_ID):
+		return self.KEGG.get(X.normalize_ID('rhea', RHEA_ID))
+
+
+
+class RHEA_crosswalk(object):
+	'''
+	Same as RHEA_mapping but looks RHEA IDs up in a ID crosswalk (build_ID_crosswalk.py).
+	'''
+	name = 'crosswalk'
+	def __init__(self, db_file):
+		self.crosswalk = X.ID_crosswalk(db_file)
+		self.known = set(self.crosswalk.types())
+	def get(self, RHEA_ID):
+		KEGG_IDs = self.crosswalk.lookup('rhea', RHEA_ID, 'kegg_reaction')
+		if KEGG_IDs:
+			return KEGG_IDs
+		## Only RHEA IDs in the crosswalk (with links to any other type) are resolved without KEGG IDs
+		for to_type in ['metacyc', 'ec']:
+			if to_type in self.known and self.crosswalk.lookup('rhea', RHEA_ID, to_type):
+				return []
+		return None
+
+
+
+def master_RHEA_ID(RHEA_ID):
+	## Master ID of the reaction of RHEA_ID ("RHEA:10750" or "10750" -> "RHEA:10748"); non RHEA IDs are returned as is
+	number = RHEA_ID.split(':')[1] if RHEA_ID.startswith('RHEA:') else RHEA_ID
+	if not number.isdigit():
+		return RHEA_ID
+	return 'RHEA:%s' % (int(number) - int(number) % 4)
+
+
+
+class RHEA_result_cache(object):
+	'''
+	SQLite database with the KEGG reaction IDs scraped from rhea-db.org for each reaction.
+	
+	 - Keyed by the master ID of the reaction (see master_RHEA_ID()), so the result is shared by
+	    all 4 RHEA IDs of the reaction.
+	 - Parsed results are stored (not the pages), including RHEA IDs without a "Links to other
+	    resources" table (i.e. not found).
+	 - A reaction is scraped again if it was cached more than 'ttl' days ago (ttl=0: never expire).
+	'''
+	def __init__(self, db_file, ttl=30):
+		self.db_file = db_file
+		self.ttl = ttl * 24 * 60 * 60 # days -> seconds
+		self.hits = 0
+		self.misses = 0
+		self.db = sqlite3.connect(db_file, timeout=600, isolation_level=None)
+		self.db.execute('CREATE TABLE IF NOT EXISTS reactions (master_id TEXT PRIMARY KEY, found INTEGER, kegg TEXT, cached REAL)')
+	def get(self, master_ID):
+		## RETURN: [True, [KEGG reaction IDs]] or [False, None] if not found on rhea-db.org; None if not cached
+		row = self.db.execute('SELECT found, kegg, cached FROM reactions WHERE master_id=?', (master_ID,)).fetchone()
+		if row is None or (self.ttl > 0 and time.time() - row[2] > self.ttl):
+			self.misses += 1
+			return None
+		self.hits += 1
+		if not row[0]:
+			return [False, None]
+		return [True, [str(x) for x in row[1].split(',') if x]]
+	def put(self, master_ID, KEGG_IDs):
+		## Save KEGG_IDs (list or None if not found) for master_ID
+		self.db.execute('INSERT OR REPLACE INTO reactions VALUES (?, ?, ?, ?)',
+			(master_ID, int(KEGG_IDs is not None), ','.join(KEGG_IDs) if KEGG_IDs is not None else None, time.time()))
+	def close(self):
+		self.db.close()
+
+
+
+def scrape_rheaDB(RHEA_IDs, outfile, stop_on_invalid_url = False, fetcher = None, keep_order = True):
+	## Scrape the KEGG reaction IDs of all RHEA_IDs from rhea-db.org (no local lookup)
+	return get_KEGG_reaction_IDs(RHEA_IDs, outfile, stop_on_invalid_url=stop_on_invalid_url, fetcher=fetcher, keep_order=keep_order)
+
+
+
+class RHEA_page_fetcher(object):
+	'''
+	Downloads rhea-db.org reaction pages with a pool of threads and gets the KEGG reaction IDs from them.
+	
+	 - All threads share one requests session (so connections are kept alive) and one rate limit.
+	 - Requests that time out or fail (connection errors, HTTP 5xx/429) are retried with exponential
+	    backoff and full jitter; a page that is not found (HTTP 404) is not retried.
+	'''
+	def __init__(self, threads=4, rate=5, timeout=30, retries=3, backoff=1, max_backoff=60, rhea_url='https://www.rhea-db.org/rhea/', session=None):
+		self.threads = max(1, threads)
+		self.rate = rate
+		self.timeout = timeout
+		self.retries = retries
+		self.backoff = backoff
+		self.max_backoff = max_backoff
+		self.rhea_url = rhea_url.rstrip('/') + '/'
+		if session is None:
+			session = requests.Session()
+			adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.threads)
+			session.mount('http://', adapter)
+			session.mount('https://', adapter)
+		self.session = session
+		self.lock = threading.Lock()
+		self.next_request = 0 # Time the next request can be made (rate limit)
+		self.requests = 0
+	def scrape_all(self, jobs):
+		## Scrape the page of each [key, RHEA_ID] in jobs using a pool of threads.
+		## YIELD: [key, RHEA_ID, KEGG_IDs, error] in the order they finish (see scrape())
+		if not jobs:
+			return
+		pool = ThreadPool(min(self.threads, len(jobs)))
+		try:
+			for result in pool.imap_unordered(self.scrape, jobs):
+				yield result
+			pool.close()
+		except:
+			pool.terminate()
+			raise
+		finally:
+			pool.join()
+	def scrape(self, job):
+		## RETURN: [key, RHEA_ID, [KEGG reaction IDs] (None if no "Links to other resources" table), error (None if downloaded)]
+		key, RHEA_ID = job
 		if ':' in RHEA_ID:
-			rhea_url = "https://www.rhea-db.org/rhea/" + RHEA_ID.split(':')[1]
+			rhea_url = self.rhea_url + RHEA_ID.split(':')[1]
 		else:
-			rhea_url = "https://www.rhea-db.org/rhea/" + RHEA_ID
+			rhea_url = self.rhea_url + RHEA_ID
 		logging.info('Scraping reaction info for %s from %s', RHEA_ID, rhea_url) ## DEBUG
-		
-		## Get "Links to other resources" table
-		html_text = requests.get(rhea_url).text
-		soup = BeautifulSoup(html_text, 'html.parser')
-		table = soup.find(lambda tag: tag.name=='table' and tag.has_attr('id') and tag['id']=="otherresources") 
-		
-		## Check that we actually found a table. If we didnt then we probabily used an incorrect RHEA ID
-		if table is None:
-			logging.error('No "Links to other resources" table found. Maybe "%s" is not a valid RHEA ID?', RHEA_ID) ## ERROR
-			if stop_on_invalid_url:
-				sys.exit(1)
-			else:
+		html_text, error = self.get(rhea_url)
+		if error is not None:
+			return [key, RHEA_ID, None, error]
+		return [key, RHEA_ID, parse_rheaDB_page(RHEA_ID, html_text), None]
+	def wait(self):
+		## Sleep until this thread can make a request without going over the rate limit
+		if self.rate <= 0:
+			return
+		with self.lock:
+			now = time.time()
+			start = max(now, self.next_request)
+			self.next_request = start + 1.0 / self.rate
+		if start > now:
+			time.sleep(start - now)
+	def get(self, url):
+		## Download url, retrying failed requests with exponential backoff (+ jitter).
+		## RETURN: [page text ('' if not found), error (None if downloaded)]
+		error = None
+		for attempt in range(self.retries + 1):
+			if attempt > 0:
+				delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+				logging.debug('Retrying %s in %.2f seconds (%s)', url, delay, error) ## DEBUG
+				time.sleep(delay)
+			self.wait()
+			with self.lock:
+				self.requests += 1
+			try:
+				r = self.session.get(url, timeout=self.timeout)
+			except requests.exceptions.RequestException as e:
+				error = str(e)
 				continue
-			
-		
-		## Split table into rows
-		rows = table.findAll(lambda tag: tag.name=='tr')
-		
-		## Get first/header row and extract RHEA ids from each column
-		col_names = []
-		header_cells = rows[0].findAll(lambda tag: tag.name=='th')
-		for cell in header_cells[1:]:
-			# Get either <b> (for other related RHEA IDs) or <span> (for current RHEA ID 
-			# [not a hyperlink which is why it uses <span> and not <b>])
-			col_names.append(cell.findAll(lambda tag: tag.name=='b' or tag.name=='span')[0].get_text())
-		logging.debug('"Links to other resources" table column names: %s', col_names) ## DEBUG
+			if r.status_code == 404:
+				return ['', None]
+			if r.status_code == 429 or r.status_code >= 500:
+				error = 'HTTP %s' % r.status_code
+				continue
+			if r.status_code != 200:
+				return ['', 'HTTP %s' % r.status_code]
+			return [r.text, None]
+		return ['', error]
+
+
+
+def parse_rheaDB_page(RHEA_ID, html_text):
+	## Get the KEGG reaction IDs from the rhea-db.org page of RHEA_ID
+	## RETURN: [KEGG reaction IDs] or None if the page has no "Links to other resources" table
+	
+	## Get "Links to other resources" table
+	soup = BeautifulSoup(html_text, 'html.parser')
+	table = soup.find(lambda tag: tag.name=='table' and tag.has_attr('id') and tag['id']=="otherresources") 
+	
+	## Check that we actually found a table. If we didnt then we probabily used an incorrect RHEA ID
+	if table is None:
+		logging.error('No "Links to other resources" table found. Maybe "%s" is not a valid RHEA ID?', RHEA_ID) ## ERROR
+		return None
 		
-		## Iterate over rows to find 'KEGG' row
-		for row in rows[1:]:
-			cells = row.findAll(lambda tag: tag.name=='td')
-			row_name = cells[0].findAll(lambda tag: tag.name=='b')[0].get_text()
-			logging.debug('Row name: %s', row_name) ## DEBUG
-			if row_name == "KEGG":
-				## Find non-empty cells and write KEGG reaction ID to output
-				for cell in cells[1:]:
-					c = cell.get_text().strip()
-					if c:
-						outfile.write(RHEA_ID+"\t"+c+"\n")
+	
+	## Split table into rows
+	rows = table.findAll(lambda tag: tag.name=='tr')
+	
+	## Get first/header row and extract RHEA ids from each column
+	col_names = []
+	header_cells = rows[0].findAll(lambda tag: tag.name=='th')
+	for cell in header_cells[1:]:
+		# Get either <b> (for other related RHEA IDs) or <span> (for current RHEA ID 
+		# [not a hyperlink which is why it uses <span> and not <b>])
+		col_names.append(cell.findAll(lambda tag: tag.name=='b' or tag.name=='span')[0].get_text())
+	logging.debug('"Links to other resources" table column names: %s', col_names) ## DEBUG
+	
+	## Iterate over rows to find 'KEGG' row
+	KEGG_IDs = []
+	for row in rows[1:]:
+		cells = row.findAll(lambda tag: tag.name=='td')
+		row_name = cells[0].findAll(lambda tag: tag.name=='b')[0].get_text()
+		logging.debug('Row name: %s', row_name) ## DEBUG
+		if row_name == "KEGG":
+			## Find non-empty cells and add KEGG reaction ID to output
+			for cell in cells[1:]:
+				c = cell.get_text().strip()
+				if c:
+					KEGG_IDs.append(c)
+	return KEGG_IDs
+
 
 
 class File(object):
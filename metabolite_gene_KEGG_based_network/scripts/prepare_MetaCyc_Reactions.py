@@ -13,6 +13,9 @@ RXN-11319  [tab] <a href='http://www.genome.jp/dbget-bin/www_bget?rn:R10246'>R10
 ...
 
 NOTE: Multiple IDs are seperated by ' // '
+NOTE: IDs in the simple <a href='...'>ID</a> form above are read with a regex; anything else is parsed by BeautifulSoup.
+NOTE: --procs N reads the input in batches of --batch_size lines that are processed in N processes; at most 2*N
+      batches are in flight and their output is written in input order (same output as the default mode).
 
 ## Output:
 MetaCyc_ID [tab] KEGG_Reaction_IDs [tab] RHEA_IDs [tab] EC_Numbers
@@ -20,14 +23,27 @@ MetaCyc_ID [tab] KEGG_Reaction_IDs [tab] RHEA_IDs [tab] EC_Numbers
 KEGG_Reaction_IDs: Blank if no associated IDS, multiple IDs seperated by commas
 RHEA_IDs: Blank if no associated IDS, multiple IDs seperated by commas
 EC_Numbers: Blank if no associated IDS, multiple IDs seperated by commas
+
+## Reverse index outputs (optional; --kegg_index, --rhea_index, --ec_index):
+KEGG_Reaction_ID/RHEA_ID/EC_Number [tab] MetaCyc_IDs
+
+Built while the input is processed (no second pass). Lines are sorted by ID and the MetaCyc IDs of
+each ID are unique, sorted and seperated by commas.
 '''
 import sys
 import os
 import argparse
 import logging
 import gzip
+import re
+import collections
+import itertools
+import multiprocessing
 from bs4 import BeautifulSoup
 
+## A single <a href='...'>ID</a> element (as written by MetaCyc); other HTML is parsed by BeautifulSoup
+ANCHOR_RE = re.compile(r'''^\s*<a href=(['"])[^'"<>]*\1>([^<>&]*)</a>\s*$''')
+
 
 ## Pass arguments.
 def main():
@@ -41,6 +57,26 @@ def main():
 		required=False, default=sys.stdout, type=lambda x: File(x, 'w'), 
 		help='Output [gzip] MetaCyc to KEGG Reaction mapping file (default: stdout)'
 	)
+	parser.add_argument('--kegg_index', metavar='KEGG_Reaction_2_MetaCyc_mapping.txt.gz', 
+		required=False, default=None, type=lambda x: File(x, 'w'), 
+		help='Output [gzip] KEGG Reaction to MetaCyc reverse index (default: not written)'
+	)
+	parser.add_argument('--rhea_index', metavar='RHEA_2_MetaCyc_mapping.txt.gz', 
+		required=False, default=None, type=lambda x: File(x, 'w'), 
+		help='Output [gzip] RHEA to MetaCyc reverse index (default: not written)'
+	)
+	parser.add_argument('--ec_index', metavar='EC_2_MetaCyc_mapping.txt.gz', 
+		required=False, default=None, type=lambda x: File(x, 'w'), 
+		help='Output [gzip] EC Number to MetaCyc reverse index (default: not written)'
+	)
+	parser.add_argument('-p', '--procs', 
+		required=False, default=1, type=int, 
+		help='Number of processes to process the input with; >1 processes batches of lines in parallel (default: %(default)s)'
+	)
+	parser.add_argument('--batch_size', 
+		required=False, default=1000, type=int, 
+		help='Number of lines in each batch processed with --procs (default: %(default)s)'
+	)
 	parser.add_argument('--debug', 
 		required=False, action='store_true', 
 		help='Print DEBUG info (default: %(default)s)'
@@ -56,20 +92,93 @@ def main():
 	logging.debug('%s', args) ## DEBUG
 	
 	
+	## Reverse indexes to build ([index file, MetaCyc_reverse_index])
+	indexes = []
+	for index_file, column in [[args.kegg_index, 1], [args.rhea_index, 2], [args.ec_index, 3]]:
+		if index_file is not None:
+			indexes.append([index_file, MetaCyc_reverse_index(column)])
+	
 	with args.input as metaCycFile, args.out as outfile:
-		process_MetaCyc_Reactions(metaCycFile, outfile)
+		process_MetaCyc_Reactions(metaCycFile, outfile, procs=args.procs, batch_size=args.batch_size, indexes=[index for index_file, index in indexes])
+	
+	for index_file, index in indexes:
+		with index_file as outfile:
+			index.write(outfile)
 
 
 
-def process_MetaCyc_Reactions(metaCycFile, outfile, writeDelim=','):
+def process_MetaCyc_Reactions(metaCycFile, outfile, writeDelim=',', procs=1, batch_size=1000, indexes=None):
 	'''
 	Takes a file detailing all the reactions in MetaCyc and cleans up the ID mappings.
 	
 	Expected File format: MetaCyc [tab] KEGG [tab] RHEA [tab] EC-Number
 	
+	procs/batch_size: Process batches of batch_size lines in procs processes (see pool_MetaCyc_Reactions())
+	
+	indexes: MetaCyc_reverse_index objects to add each output line to
 	'''
 	metaCycFile.next()
-	for line in metaCycFile:
+	if procs > 1:
+		batches = pool_MetaCyc_Reactions(metaCycFile, procs, batch_size, writeDelim)
+	else:
+		batches = itertools.imap(process_MetaCyc_batch, read_batches(metaCycFile, batch_size), itertools.repeat(writeDelim))
+	for lines, bad_line in batches:
+		outfile.write(lines)
+		if indexes:
+			for line in lines.splitlines():
+				cells = line.split('\t')
+				for index in indexes:
+					index.add(cells, writeDelim)
+		if bad_line is not None:
+			logging.error("Filed to split line into 4 columns: %s", bad_line)
+			sys.exit(1)
+
+
+
+def pool_MetaCyc_Reactions(metaCycFile, procs=4, batch_size=1000, writeDelim=','):
+	'''
+	Process batches of batch_size lines of metaCycFile in a pool of worker processes.
+	At most 2*procs batches are in flight (read but not yet written), so memory use does not grow with
+	the size of metaCycFile.
+	
+	YIELD: The output of each batch in input order (see process_MetaCyc_batch())
+	'''
+	pool = multiprocessing.Pool(procs)
+	try:
+		in_flight = collections.deque()
+		n_batches = 0
+		for batch in read_batches(metaCycFile, batch_size):
+			in_flight.append(pool.apply_async(process_MetaCyc_batch, (batch, writeDelim)))
+			n_batches += 1
+			if len(in_flight) >= 2 * procs:
+				yield in_flight.popleft().get()
+		while in_flight:
+			yield in_flight.popleft().get()
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	finally:
+		pool.join()
+	logging.debug('Processed %s batches with %s processes', n_batches, procs) ## DEBUG
+
+
+
+def read_batches(metaCycFile, batch_size):
+	## YIELD: Lists of batch_size lines of metaCycFile (the last one may be shorter)
+	while True:
+		batch = list(itertools.islice(metaCycFile, batch_size))
+		if not batch:
+			return
+		yield batch
+
+
+
+def process_MetaCyc_batch(batch, writeDelim=','):
+	## Clean up the ID mappings of a batch of lines (in a worker process with --procs).
+	## RETURN: [output lines, first line that could not be split into 4 columns (None if all lines were fine)]
+	out = []
+	for line in batch:
 		line = line.strip('\n')
 		if not line or line.startswith('#'):
 			continue # Ignore blank or comment lines
@@ -77,25 +186,18 @@ def process_MetaCyc_Reactions(metaCycFile, outfile, writeDelim=','):
 		try:
 			MetaCyc, KEGG_raw, RHEA_raw, EC_Number_raw = line.split('\t')
 		except ValueError:
-			logging.error("Filed to split line into 4 columns: %s", line)
-			sys.exit(1)
+			return [''.join(out), line]
 		
 		## Process IDS and write output
 		##	- Seperate IDs split by " // "
-		## 	- Also findAll each ID and iterate over each possible element.
+		## 	- Also get the text of each <a> element in each ID (see get_anchor_texts()).
 		
 		## KEGG IDs
-		KEGG = []
-		for IDs in KEGG_raw.split(' // '):
-			for ID in BeautifulSoup(IDs, 'html.parser').findAll("a"):
-				KEGG.append(ID.text)
+		KEGG = get_anchor_texts(KEGG_raw)
 		KEGG_string = writeDelim.join(KEGG)
 		
 		## RHEA IDs
-		RHEA = []
-		for IDs in RHEA_raw.split(' // '):
-			for ID in BeautifulSoup(IDs, 'html.parser').findAll("a"):
-				RHEA.append('RHEA:'+ID.text)
+		RHEA = ['RHEA:'+ID for ID in get_anchor_texts(RHEA_raw)]
 		RHEA_string = writeDelim.join(RHEA)
 		
 		## EC Numbers
@@ -104,8 +206,49 @@ def process_MetaCyc_Reactions(metaCycFile, outfile, writeDelim=','):
 			EC_Number.append(ID)
 		EC_Number_string = writeDelim.join(EC_Number)
 		
-		## Write to output
-		outfile.write('{}\t{}\t{}\t{}\n'.format(MetaCyc, KEGG_string, RHEA_string, EC_Number_string))
+		## Add to output
+		out.append('{}\t{}\t{}\t{}\n'.format(MetaCyc, KEGG_string, RHEA_string, EC_Number_string))
+	return [''.join(out), None]
+
+
+
+def get_anchor_texts(cell):
+	## Text of each <a> element in each " // " seperated part of cell.
+	## Parts that are a single simple <a> element are matched with ANCHOR_RE, so BeautifulSoup is only
+	## used for parts with other HTML (e.g. entities, extra tags/attributes, unquoted or uppercase tags).
+	texts = []
+	for IDs in cell.split(' // '):
+		if '<' not in IDs:
+			continue # No elements (e.g. blank cell)
+		match = ANCHOR_RE.match(IDs)
+		if match is not None:
+			texts.append(match.group(2))
+		else:
+			for ID in BeautifulSoup(IDs, 'html.parser').findAll("a"):
+				texts.append(ID.text)
+	return texts
+
+
+
+class MetaCyc_reverse_index(object):
+	'''
+	MetaCyc IDs of each KEGG reaction, RHEA or EC ID in the output of process_MetaCyc_Reactions().
+	
+	 - column is the output column with the IDs to index (1: KEGG reaction, 2: RHEA, 3: EC Number).
+	 - write() writes "ID<tab>MetaCyc_IDs" lines sorted by ID; the MetaCyc IDs of each ID are
+	    unique, sorted and seperated by writeDelim.
+	'''
+	def __init__(self, column):
+		self.column = column
+		self.MetaCyc = collections.defaultdict(set) # {ID:set(MetaCyc IDs)}
+	def add(self, cells, readDelim=','):
+		## Add an output line (split into cells)
+		for ID in cells[self.column].split(readDelim):
+			if ID:
+				self.MetaCyc[ID].add(cells[0])
+	def write(self, outfile, writeDelim=','):
+		for ID in sorted(self.MetaCyc):
+			outfile.write('{}\t{}\n'.format(ID, writeDelim.join(sorted(self.MetaCyc[ID]))))
 
 
 
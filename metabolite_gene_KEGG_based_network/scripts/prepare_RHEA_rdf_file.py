@@ -8,14 +8,35 @@ RHEA_ID [tab] KEGG_Reaction_IDs [tab] MeatCyc_IDs [tab] EC_Numbers
 KEGG_Reaction_IDs: Blank if no associated IDS, multiple IDs seperated by commas
 MetaCyc_IDs: Blank if no associated IDS, multiple IDs seperated by commas
 EC_Numbers: Blank if no associated IDS, multiple IDs seperated by commas
+
+NOTE:
+	- Reaction descriptions can be in any order; the RHEA IDs of a reaction (undefined, bidirectional
+	   and both directions) are grouped with a union-find (see RHEA_reaction_groups).
+	- --stream parses the RDF file incrementally (lxml iterparse) and drops each top level
+	   rdf:Description once it has been processed, so memory use depends on the number of
+	   reactions kept and not on the size of the RDF file (same output as the default mode).
+	- --workers N splits the (decompressed) RDF file into chunks of ~--chunk_size MB of whole top level
+	   rdf:Description elements and parses the chunks in N processes; the groups of each chunk are
+	   merged in file order, so the output is the same as the default mode.
+	- Chunks are split before lines starting with "<rdf:Description" (top level descriptions are not
+	   indented in the RHEA RDF files); a chunk that is not valid XML stops the run with an error.
 '''
 import sys
 import os
 import argparse
 import logging
 import gzip
+import collections
+import re
+import io
+import multiprocessing
 from lxml import etree
 
+RHEA_DB_URL = 'http://rdf.rhea-db.org/'
+IDENTIFIERS_URL = 'http://identifiers.org/'
+IDENTIFIERS_DELIM = '/'
+EC_URL = 'http://purl.uniprot.org/'
+RDF_ROOT_RE = re.compile(r'<rdf:RDF\b[^>]*>')
 
 ## Pass arguments.
 def main():
@@ -29,6 +50,18 @@ def main():
 		required=False, default=sys.stdout, type=lambda x: File(x, 'w'), 
 		help='Output [gzip] RHEA to KEGG Reaction mapping file (default: stdout)'
 	)
+	parser.add_argument('--stream', 
+		required=False, action='store_true', 
+		help='Parse the RDF file incrementally to keep memory use low (default: %(default)s)'
+	)
+	parser.add_argument('-w', '--workers', 
+		required=False, default=1, type=int, 
+		help='Number of processes to parse the RDF file with; >1 splits the file into chunks (default: %(default)s)'
+	)
+	parser.add_argument('--chunk_size', 
+		required=False, default=8, type=float, 
+		help='Size (MB) of the chunks parsed by each process with --workers (default: %(default)s)'
+	)
 	parser.add_argument('--debug', 
 		required=False, action='store_true', 
 		help='Print DEBUG info (default: %(default)s)'
@@ -45,90 +78,239 @@ def main():
 	
 	
 	with args.rdf as rdffile, args.out as outfile:
-		process_RHEA_rdf_file(rdffile, outfile)
+		process_RHEA_rdf_file(rdffile, outfile, args.stream, args.workers, args.chunk_size)
 
 
 
-def process_RHEA_rdf_file(rdffile, outfile):
+def process_RHEA_rdf_file(rdffile, outfile, stream=False, workers=1, chunk_size=8):
 	'''
 	rdffile: RHEA RDF file from https://ftp.expasy.org/databases/rhea/rdf/rhea.rdf.gz
-		Assumes undefined RHEA ID occures before directional IDs.
 	
 	outfile: Mapping between RHEA IDs, MetaCyc IDs and KEGG Reaction IDs
+	
+	stream: Parse rdffile incrementally (see stream_RHEA_rdf_file())
+	
+	workers/chunk_size: Parse chunks of ~chunk_size MB of rdffile in workers processes (see pool_RHEA_rdf_file())
 	'''
-	RHEA_ID_annots = {} # {RHEA_ID_1:<annot class 001>, RHEA_ID_2:<annot class 001>, RHEA_ID_3:<annot class 002>}
-	RHEA_DB_URL = 'http://rdf.rhea-db.org/'
-	IDENTIFIERS_URL = 'http://identifiers.org/'
-	IDENTIFIERS_DELIM = '/'
-	EC_URL = 'http://purl.uniprot.org/'
+	if workers > 1:
+		groups = pool_RHEA_rdf_file(rdffile, workers, chunk_size)
+	elif stream:
+		groups = stream_RHEA_rdf_file(rdffile)
+	else:
+		groups = parse_RHEA_rdf_file(rdffile)
+	RHEA_ID_annots = groups.annotations() # {RHEA_ID_1:<annot class 001>, RHEA_ID_2:<annot class 001>, RHEA_ID_3:<annot class 002>}
+	
+	## Write annotations to file.
+	for annot_key, annot_value in RHEA_ID_annots.iteritems():
+		outfile.write("RHEA:" + annot_key + '\t' + annot_value.writeKEGG() + '\t' + annot_value.writeMetaCyc() + '\t' + annot_value.writeEC() + '\n')
+
+
+
+def parse_RHEA_rdf_file(rdffile):
+	'''
+	Load the whole RDF file and process each top level rdf:Description.
+	
+	RETURN: RHEA_reaction_groups
+	'''
+	groups = RHEA_reaction_groups()
 	
 	tree = etree.parse(rdffile)
 	root = tree.getroot()
 	nsmap = root.nsmap
 	
 	for child in root.findall('rdf:Description', nsmap):
-		logging.debug('Processing element:\n%s', etree.tostring(child, pretty_print=True)) ## DEBUG
-		
-		## Get name (RHEA ID) of element.
-		element_name = fetch_element_attrib(child, '{%s}about' % nsmap['rdf'], to_lstrip='http://rdf.rhea-db.org/')
-		
-		## Get the type of (subClassOf) reaction we are dealing with.
-		## "Reaction":
-		##     	- top level, will have elements describing other directional reactions.
-		##     	- check for annotations
-		## "BidirectionalReaction" and "DirectionalReaction":
-		##     	- check for annotations
-		subClassOf = fetch_attrib_from_elements(child, '{%s}subClassOf' % nsmap['rdfs'], '{%s}resource' % nsmap['rdf'], RHEA_DB_URL)
-		if "Reaction" in subClassOf:
-			## Associate this element's ID and sub-elements ID with same instance of annotation class
-			RHEA_ID_annots[element_name] = Reaction_group_annotations()
-			for react in fetch_attrib_from_elements(child, '{%s}directionalReaction' % nsmap['rh'], '{%s}resource' % nsmap['rdf'], RHEA_DB_URL):
-				RHEA_ID_annots[react] = RHEA_ID_annots[element_name]
-			for react in fetch_attrib_from_elements(child, '{%s}bidirectionalReaction' % nsmap['rh'], '{%s}resource' % nsmap['rdf'], RHEA_DB_URL):
-				RHEA_ID_annots[react] = RHEA_ID_annots[element_name]
-			
-		elif "BidirectionalReaction" in subClassOf or "DirectionalReaction" in subClassOf:
-			## Do nothing special, IDs already should be in "RHEA_ID_annots"; move onto next part where we find KEGG and MetaCyc annotations.
-			pass
-		else:
-			## Found another type of element that we dont need (e.g. compound information)
-			## Dont continue to the next part where we try and find links to external databases
+		process_RHEA_description(child, nsmap, groups)
+	return groups
+
+
+
+def stream_RHEA_rdf_file(rdffile):
+	'''
+	Same as parse_RHEA_rdf_file() but parses rdffile incrementally; each top level rdf:Description
+	is processed once its end tag is reached and is then cleared and removed from the root (along
+	with any other top level elements before it), so only one element is held in memory at a time.
+	
+	RETURN: RHEA_reaction_groups
+	'''
+	groups = RHEA_reaction_groups()
+	
+	root = None
+	nsmap = None
+	depth = 0
+	for event, element in etree.iterparse(rdffile, events=('start', 'end')):
+		if event == 'start':
+			if root is None:
+				root = element
+				nsmap = root.nsmap
+			depth += 1
 			continue
-			
-		## Get links to other resources (if associated with this element)
-		## Loop over each link and check if it a KEGG link, a MetaCyc link, or a EC link.
-		attrib_list = []
-		attrib_list.extend(fetch_attrib_from_elements(child, '{%s}seeAlso' % nsmap['rdfs'], '{%s}resource' % nsmap['rdf'], IDENTIFIERS_URL))
-		attrib_list.extend(fetch_attrib_from_elements(child, '{%s}ec' % nsmap['rh'], '{%s}resource' % nsmap['rdf'], EC_URL))
-		for attrib in attrib_list:
-			## Expected attrib:
-			##      "kegg.reaction/R02511"
-			##     	"biocyc/METACYC:CYSTEAMINE-DIOXYGENASE-RXN"
-			##      "biocyc/ECOCYC:1.5.8.2-RXN"
-			try:
-				database_name, database_id = attrib.split(IDENTIFIERS_DELIM)
-				## Update annot instance with new annotation IDs
-				if database_name == 'kegg.reaction':
-					RHEA_ID_annots[element_name].add_KEGG(database_id)
-				elif database_name == 'biocyc' and 'METACYC:' in database_id:
-					## We only care about the 'METACYC' IDs for now.
-					RHEA_ID_annots[element_name].add_MetaCyc(database_id.lstrip('METACYC:'))
-				elif database_name == 'enzyme':
-					RHEA_ID_annots[element_name].add_EC(database_id)
-				else:
-					pass
-			except ValueError:
-				logging.error('Could not split link "%s" to other resources corrrectly\n%s',
-					attrib, etree.tostring(child, pretty_print=True)) ## ERROR
-				sys.exit(1)
-			except KeyError:
-				logging.error('ID "%s" was not seen previously. This should not have happened.\n%s',
-					attrib, etree.tostring(child, pretty_print=True)) ## ERROR
-				sys.exit(1)
+		depth -= 1
+		if depth != 1:
+			continue
+		## Top level element (child of rdf:RDF) is complete
+		if element.tag == '{%s}Description' % nsmap['rdf']:
+			process_RHEA_description(element, nsmap, groups)
+		element.clear()
+		while element.getprevious() is not None:
+			del root[0]
+	return groups
+
+
+
+def pool_RHEA_rdf_file(rdffile, workers=4, chunk_size=8):
+	'''
+	Split rdffile into chunks (see split_RHEA_rdf_file()) and parse them in a pool of worker processes.
+	At most 2*workers chunks are read ahead, and the groups of each chunk are merged in file order.
+	
+	RETURN: RHEA_reaction_groups
+	'''
+	groups = RHEA_reaction_groups()
+	pool = multiprocessing.Pool(workers)
+	try:
+		in_flight = collections.deque()
+		n_chunks = 0
+		for chunk in split_RHEA_rdf_file(rdffile, int(chunk_size * 1024 * 1024)):
+			in_flight.append(pool.apply_async(parse_RHEA_rdf_chunk, (chunk,)))
+			n_chunks += 1
+			if len(in_flight) >= 2 * workers:
+				merge_RHEA_rdf_chunk(groups, in_flight.popleft().get())
+		while in_flight:
+			merge_RHEA_rdf_chunk(groups, in_flight.popleft().get())
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	finally:
+		pool.join()
+	logging.debug('Parsed %s chunks with %s workers', n_chunks, workers) ## DEBUG
+	return groups
+
+
+
+def parse_RHEA_rdf_chunk(chunk):
+	## Parse a chunk (a small RDF file) in a worker process.
+	## Errors are logged and sys.exit() is called while parsing; a worker that exits never returns its
+	## result (the main process would wait for it forever), so the exit is caught and returned instead.
+	## RETURN: [RHEA_reaction_groups (None if parsing failed), exit code of the failed parse (None if the chunk was fine)]
+	try:
+		return [parse_RHEA_rdf_file(io.BytesIO(chunk)), None]
+	except SystemExit as e:
+		return [None, e.code]
+
+
+
+def merge_RHEA_rdf_chunk(groups, result):
+	## Merge the result of parse_RHEA_rdf_chunk() into groups, or exit (in the main process) if the chunk failed.
+	chunk_groups, exit_code = result
+	if chunk_groups is None:
+		logging.error('Failed to parse a chunk of the RDF file (see the error above)') ## ERROR
+		sys.exit(exit_code)
+	groups.merge(chunk_groups)
+
+
+
+def split_RHEA_rdf_file(rdffile, chunk_size):
+	'''
+	Split rdffile into chunks of at least chunk_size bytes that end before a line starting with
+	"<rdf:Description" (or at the end of the file). Each chunk is a small RDF file: the XML declaration
+	and rdf:RDF start tag (with the namespaces) of rdffile, the top level elements of the chunk, and a
+	rdf:RDF end tag.
+	
+	YIELD: chunk (str)
+	'''
+	## Read up to (and including) the rdf:RDF start tag (readline() as file objects can't mix iterating and read())
+	header = ''
+	for line in iter(rdffile.readline, ''):
+		header += line
+		match = RDF_ROOT_RE.search(header)
+		if match is not None:
+			break
+	else:
+		logging.error('Could not find the rdf:RDF start tag in the RDF file') ## ERROR
+		sys.exit(1)
+	chunk = [header[match.end():]]
+	header = header[:match.end()] + '\n'
+	
+	while True:
+		## Read a block of chunk_size bytes and then up to the start of the next top level description
+		block = rdffile.read(chunk_size)
+		if not block:
+			break
+		chunk.append(block)
+		if not block.endswith('\n'):
+			chunk.append(rdffile.readline())
+		next_line = ''
+		for line in iter(rdffile.readline, ''):
+			if line.startswith('<rdf:Description'):
+				next_line = line
+				break
+			chunk.append(line)
+		yield header + ''.join(chunk).replace('</rdf:RDF>', '') + '</rdf:RDF>\n'
+		chunk = [next_line]
+	if ''.join(chunk).strip():
+		yield header + ''.join(chunk).replace('</rdf:RDF>', '') + '</rdf:RDF>\n'
+
+
+
+def process_RHEA_description(child, nsmap, groups):
+	'''
+	Add the RHEA IDs and KEGG/MetaCyc/EC links of a rdf:Description element (of a reaction) to
+	groups (RHEA_reaction_groups). Other elements (e.g. compounds) are ignored.
+	'''
+	logging.debug('Processing element:\n%s', etree.tostring(child, pretty_print=True)) ## DEBUG
+	
+	## Get name (RHEA ID) of element.
+	## IDs are interned as each RHEA ID is seen up to 3 times (and each EC number etc. in many reactions)
+	element_name = intern(fetch_element_attrib(child, '{%s}about' % nsmap['rdf'], to_lstrip='http://rdf.rhea-db.org/'))
+	
+	## Get the type of (subClassOf) reaction we are dealing with.
+	## "Reaction":
+	##     	- top level, will have elements describing other directional reactions.
+	##     	- check for annotations
+	## "BidirectionalReaction" and "DirectionalReaction":
+	##     	- check for annotations
+	subClassOf = fetch_attrib_from_elements(child, '{%s}subClassOf' % nsmap['rdfs'], '{%s}resource' % nsmap['rdf'], RHEA_DB_URL)
+	if "Reaction" in subClassOf:
+		## Group this element's ID with the IDs of its sub-elements (they will share the same annotations)
+		reacts = fetch_attrib_from_elements(child, '{%s}directionalReaction' % nsmap['rh'], '{%s}resource' % nsmap['rdf'], RHEA_DB_URL)
+		reacts.extend(fetch_attrib_from_elements(child, '{%s}bidirectionalReaction' % nsmap['rh'], '{%s}resource' % nsmap['rdf'], RHEA_DB_URL))
+		groups.add_group(element_name, [intern(react) for react in reacts])
 		
-	## Write annotations to file.
-	for annot_key, annot_value in RHEA_ID_annots.iteritems():
-		outfile.write("RHEA:" + annot_key + '\t' + annot_value.writeKEGG() + '\t' + annot_value.writeMetaCyc() + '\t' + annot_value.writeEC() + '\n')
+	elif "BidirectionalReaction" in subClassOf or "DirectionalReaction" in subClassOf:
+		## Do nothing special, IDs are grouped when their "Reaction" element is found (before or after this one); move onto next part where we find KEGG and MetaCyc annotations.
+		pass
+	else:
+		## Found another type of element that we dont need (e.g. compound information)
+		## Dont continue to the next part where we try and find links to external databases
+		return
+		
+	## Get links to other resources (if associated with this element)
+	## Loop over each link and check if it a KEGG link, a MetaCyc link, or a EC link.
+	attrib_list = []
+	attrib_list.extend(fetch_attrib_from_elements(child, '{%s}seeAlso' % nsmap['rdfs'], '{%s}resource' % nsmap['rdf'], IDENTIFIERS_URL))
+	attrib_list.extend(fetch_attrib_from_elements(child, '{%s}ec' % nsmap['rh'], '{%s}resource' % nsmap['rdf'], EC_URL))
+	for attrib in attrib_list:
+		## Expected attrib:
+		##      "kegg.reaction/R02511"
+		##     	"biocyc/METACYC:CYSTEAMINE-DIOXYGENASE-RXN"
+		##      "biocyc/ECOCYC:1.5.8.2-RXN"
+		try:
+			database_name, database_id = attrib.split(IDENTIFIERS_DELIM)
+			database_id = intern(database_id)
+			## Update annot instance with new annotation IDs
+			if database_name == 'kegg.reaction':
+				groups.annots(element_name).add_KEGG(database_id)
+			elif database_name == 'biocyc' and 'METACYC:' in database_id:
+				## We only care about the 'METACYC' IDs for now.
+				groups.annots(element_name).add_MetaCyc(intern(database_id.lstrip('METACYC:')))
+			elif database_name == 'enzyme':
+				groups.annots(element_name).add_EC(database_id)
+			else:
+				pass
+		except ValueError:
+			logging.error('Could not split link "%s" to other resources corrrectly\n%s',
+				attrib, etree.tostring(child, pretty_print=True)) ## ERROR
+			sys.exit(1)
 
 
 
@@ -169,7 +351,7 @@ def fetch_element_attrib(element, attrib_key, to_lstrip='', to_rstrip=''):
 
 
 
-class Reaction_group_annotations():
+class Reaction_group_annotations(object):
 	'''
 	Class to store the annotations from a group of RHEA IDS.
 	
@@ -178,26 +360,133 @@ class Reaction_group_annotations():
 	- Main point of this class is that we can create a dict with RHEA IDs and associate all IDs with the
 		same instance of this class. That way when we easily access the shared annotation for a set of
 		IDs froma dict.
+	- Annotations are kept as tuples in the order they were added (without duplicates) and the class
+		uses __slots__, as there is one instance per reaction. A reaction has at most a few IDs of
+		each type, so checking the tuple is faster than a set and uses a lot less memory (all empty
+		annotations share the same empty tuple).
 	'''
+	__slots__ = ('KEGG', 'MetaCyc', 'EC')
 	def __init__(self):
-		self.KEGG = [] # Store KEGG Reaction IDs
-		self.MetaCyc = [] # Store Metacyc IDs
-		self.EC = [] # Store EC numbers
+		self.KEGG = () # Store KEGG Reaction IDs
+		self.MetaCyc = () # Store Metacyc IDs
+		self.EC = () # Store EC numbers
 	def add_KEGG(self, annot):
 		if annot not in self.KEGG:
-			self.KEGG.append(annot)
+			self.KEGG += (annot,)
 	def add_MetaCyc(self, annot):
 		if annot not in self.MetaCyc:
-			self.MetaCyc.append(annot)
+			self.MetaCyc += (annot,)
 	def add_EC(self, annot):
 		if annot not in self.EC:
-			self.EC.append(annot)
+			self.EC += (annot,)
+	def merge(self, other):
+		## Add the annotations of other (another Reaction_group_annotations) after our own
+		for annot in other.KEGG:
+			self.add_KEGG(annot)
+		for annot in other.MetaCyc:
+			self.add_MetaCyc(annot)
+		for annot in other.EC:
+			self.add_EC(annot)
 	def writeKEGG(self, delim=','):
 		return delim.join(self.KEGG)
 	def writeMetaCyc(self, delim=','):
 		return delim.join(self.MetaCyc)
 	def writeEC(self, delim=','):
 		return delim.join(self.EC)
+	def __getstate__(self):
+		return [self.KEGG, self.MetaCyc, self.EC]
+	def __setstate__(self, state):
+		self.KEGG, self.MetaCyc, self.EC = state
+
+
+
+class RHEA_reaction_groups(object):
+	'''
+	Groups the RHEA IDs of each reaction (using a union-find) and keeps the links found for each ID,
+	so descriptions can be added in any order.
+	
+	 - add_group() joins the ID of a "Reaction" element with its directional/bidirectional IDs.
+	 - annots() returns the Reaction_group_annotations of a single ID; they are only combined
+	    into one Reaction_group_annotations per group by annotations() (in the order the IDs were
+	    added), so the groups of different parts of the RDF file can be built separately and
+	    merged afterwards with merge().
+	'''
+	def __init__(self):
+		self.parent = {} # {RHEA_ID:parent RHEA_ID}; roots are their own parent. Only has the IDs in a "Reaction" group
+		self.ids = [] # IDs in a "Reaction" group (in the order first seen)
+		self.links = {} # {RHEA_ID:Reaction_group_annotations} of the links of each ID
+		self.linked = [] # IDs in links (in the order first seen)
+	def __getstate__(self):
+		## Pickle as lists of IDs/tuples (much faster to send between processes than the dicts of objects)
+		parents = [[RHEA_ID, self.find(RHEA_ID)] for RHEA_ID in self.ids if self.parent[RHEA_ID] != RHEA_ID]
+		links = [[RHEA_ID, self.links[RHEA_ID].__getstate__()] for RHEA_ID in self.linked]
+		return [self.ids, parents, links]
+	def __setstate__(self, state):
+		self.__init__()
+		ids, parents, links = state
+		self.ids = [intern(RHEA_ID) for RHEA_ID in ids]
+		self.parent = dict.fromkeys(self.ids)
+		for RHEA_ID in self.ids:
+			self.parent[RHEA_ID] = RHEA_ID
+		for RHEA_ID, root in parents:
+			self.parent[intern(RHEA_ID)] = intern(root)
+		for RHEA_ID, annot_state in links:
+			self.annots(intern(RHEA_ID)).__setstate__([tuple([intern(annot) for annot in annots]) for annots in annot_state])
+	def find(self, RHEA_ID):
+		## Root of the group of RHEA_ID (with path halving)
+		while self.parent[RHEA_ID] != RHEA_ID:
+			self.parent[RHEA_ID] = self.parent[self.parent[RHEA_ID]]
+			RHEA_ID = self.parent[RHEA_ID]
+		return RHEA_ID
+	def union(self, RHEA_ID_1, RHEA_ID_2):
+		root_1, root_2 = self.find(RHEA_ID_1), self.find(RHEA_ID_2)
+		if root_1 != root_2:
+			self.parent[root_2] = root_1
+	def add_id(self, RHEA_ID):
+		if RHEA_ID not in self.parent:
+			self.parent[RHEA_ID] = RHEA_ID
+			self.ids.append(RHEA_ID)
+	def add_group(self, RHEA_ID, reacts):
+		self.add_id(RHEA_ID)
+		for react in reacts:
+			self.add_id(react)
+			self.union(RHEA_ID, react)
+	def annots(self, RHEA_ID):
+		if RHEA_ID not in self.links:
+			self.links[RHEA_ID] = Reaction_group_annotations()
+			self.linked.append(RHEA_ID)
+		return self.links[RHEA_ID]
+	def merge(self, other):
+		## Add the IDs, groups and links of other (RHEA_reaction_groups of a later part of the RDF file)
+		for RHEA_ID in other.ids:
+			self.add_id(RHEA_ID)
+		for RHEA_ID in other.ids:
+			self.union(other.find(RHEA_ID), RHEA_ID)
+		for RHEA_ID in other.linked:
+			if RHEA_ID in self.links:
+				self.links[RHEA_ID].merge(other.links[RHEA_ID])
+			else:
+				self.links[RHEA_ID] = other.links[RHEA_ID]
+				self.linked.append(RHEA_ID)
+	def annotations(self):
+		## RETURN: {RHEA_ID:Reaction_group_annotations} with the same instance for all IDs in a group
+		## (the Reaction_group_annotations of the first linked ID of each group is reused for its group,
+		## and all groups without links share one empty instance).
+		group_annots = {}
+		for RHEA_ID in self.linked:
+			if RHEA_ID not in self.parent:
+				logging.error('ID "%s" has links to other resources but is not part of any reaction. This should not have happened.', RHEA_ID) ## ERROR
+				sys.exit(1)
+			root = self.find(RHEA_ID)
+			if root in group_annots:
+				group_annots[root].merge(self.links[RHEA_ID])
+			else:
+				group_annots[root] = self.links[RHEA_ID]
+		empty = Reaction_group_annotations()
+		RHEA_ID_annots = {}
+		for RHEA_ID in self.ids:
+			RHEA_ID_annots[RHEA_ID] = group_annots.get(self.find(RHEA_ID), empty)
+		return RHEA_ID_annots
 
 
 
@@ -0,0 +1,126 @@
+#!/usr/bin/env python2
+DESCRIPTION = '''
+Translates a list (or a column of a table) of IDs to other ID types using the crosswalk built by
+build_ID_crosswalk.py.
+
+Output: each input line with one extra column per --to ID type, holding the linked IDs (comma separated;
+blank if there are none).
+
+e.g. RHEA IDs to KEGG reactions and EC numbers:
+	translate_IDs.py -c ID_crosswalk.sqlite --from rhea --to kegg_reaction,ec -i rhea_ids.txt
+
+NOTE:
+	- Lines are translated in batches of --batch lines, so the input file is never loaded at once
+	   (the IDs of a batch are looked up in queries of at most build_ID_crosswalk.SQL_MAX_IDS IDs).
+	- Blank lines and lines starting with '#' are copied as is.
+'''
+import sys
+import os
+import argparse
+import logging
+import gzip
+import itertools
+import build_ID_crosswalk as X
+
+## Pass arguments.
+def main():
+	## Pass command line arguments.
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=DESCRIPTION)
+	parser.add_argument('-c', '--crosswalk', metavar='ID_crosswalk.sqlite',
+		required=True, type=str,
+		help='SQLite crosswalk built by build_ID_crosswalk.py (required)'
+	)
+	parser.add_argument('-i', '--input', metavar='ids.txt',
+		required=False, default=sys.stdin, type=lambda x: X.File(x, 'r'),
+		help='Input [gzip] file with one ID per line (or a table, see --column) (default: stdin)'
+	)
+	parser.add_argument('-o', '--out', metavar='ids.translated.txt',
+		required=False, default=sys.stdout, type=lambda x: X.File(x, 'w'),
+		help='Output [gzip] file (default: stdout)'
+	)
+	parser.add_argument('-f', '--from', dest='from_type',
+		required=True, choices=X.ID_TYPES,
+		help='ID type of the input IDs (required)'
+	)
+	parser.add_argument('-t', '--to', dest='to_types', metavar='kegg_reaction,ec',
+		required=True, type=lambda x: to_types(x),
+		help='Comma separated ID types to translate to (one output column each) (required)'
+	)
+	parser.add_argument('--column',
+		required=False, default=1, type=int,
+		help='Column (tab separated) of the input file with the IDs (default: %(default)s)'
+	)
+	parser.add_argument('--header',
+		required=False, action='store_true',
+		help='First line of the input file is a header; the --to ID types are added to it (default: %(default)s)'
+	)
+	parser.add_argument('--batch',
+		required=False, default=1000, type=int,
+		help='Number of lines to translate at a time (default: %(default)s)'
+	)
+	parser.add_argument('--debug',
+		required=False, action='store_true',
+		help='Print DEBUG info (default: %(default)s)'
+	)
+	args = parser.parse_args()
+	
+	## Set up basic debugger
+	logFormat = "[%(levelname)s]: %(message)s"
+	logging.basicConfig(format=logFormat, stream=sys.stderr, level=logging.INFO)
+	if args.debug:
+		logging.getLogger().setLevel(logging.DEBUG)
+	
+	logging.debug('%s', args) ## DEBUG
+	
+	crosswalk = X.ID_crosswalk(args.crosswalk)
+	with args.input as in_file, args.out as out_file:
+		translate_IDs(in_file, out_file, crosswalk, args.from_type, args.to_types, args.column, args.header, args.batch)
+	crosswalk.close()
+
+
+
+def to_types(types):
+	## argparse type of --to
+	types = [x.strip() for x in types.split(',') if x.strip()]
+	for id_type in types:
+		if id_type not in X.ID_TYPES:
+			raise argparse.ArgumentTypeError('Unknown ID type "%s" (choose from %s)' % (id_type, ', '.join(X.ID_TYPES)))
+	return types
+
+
+
+def translate_IDs(in_file, out_file, crosswalk, from_type, to_types, column=1, header=False, batch=1000):
+	'''
+	Add the to_types IDs linked to the from_type ID in column (1-based) of each line of in_file
+	and write them to out_file.
+	'''
+	if header:
+		out_file.write('\t'.join([in_file.readline().rstrip('\n')] + to_types) + '\n')
+	n_lines = 0
+	n_found = 0
+	lines = []
+	for line in itertools.chain(in_file, [None]):
+		if line is not None:
+			lines.append(line.rstrip('\n'))
+			if len(lines) < batch:
+				continue
+		## Translate batch of lines
+		IDs = [line.split('\t')[column-1].strip() for line in lines if line and not line.startswith('#')]
+		translations = [crosswalk.translate(from_type, IDs, to_type) for to_type in to_types]
+		for line in lines:
+			if not line or line.startswith('#'):
+				out_file.write(line + '\n')
+				continue
+			ID = line.split('\t')[column-1].strip()
+			cells = [','.join(translation[ID]) for translation in translations]
+			out_file.write('\t'.join([line] + cells) + '\n')
+			n_lines += 1
+			if any(cells):
+				n_found += 1
+		lines = []
+	logging.info('Translated %s of %s IDs', n_found, n_lines) ## INFO
+
+
+
+if __name__ == '__main__':
+	main()
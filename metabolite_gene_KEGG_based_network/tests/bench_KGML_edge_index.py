@@ -0,0 +1,116 @@
+#!/usr/bin/env python2
+DESCRIPTION = '''
+Micro-benchmark of the edge deduplication in KEGG_KGML_2_Cytoscape_network().
+
+Builds synthetic KGML files with 10^3 - 10^5 'relation' tags (entries have no links so
+nothing is downloaded) and times:
+	- list:  the old list based deduplication ('if edge not in edges') + flattening all edges
+	          into a set to find nodes without edges.
+	- index: Edge_index (dict based deduplication + degree counter).
+	- total: full KEGG_KGML_2_Cytoscape_network() run using Edge_index.
+
+The list method is quadratic so it is skipped for sizes > --max_list.
+'''
+import sys
+import os
+import argparse
+import random
+import time
+import StringIO
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import KEGG_reaction_KGML_to_network_format as KGML
+
+
+def main():
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=DESCRIPTION)
+	parser.add_argument('--sizes',
+		required=False, default='1000,10000,100000', type=str,
+		help='Comma seperated number of relations to benchmark (default: %(default)s)'
+	)
+	parser.add_argument('--max_list',
+		required=False, default=20000, type=int,
+		help='Largest number of relations to time the list method with (default: %(default)s)'
+	)
+	args = parser.parse_args()
+
+	print '\t'.join(['relations', 'edges', 'list_sec', 'index_sec', 'total_sec'])
+	for n_relations in [int(x) for x in args.sizes.split(',')]:
+		kgml = synthetic_KGML(n_relations)
+		root = ET.fromstring(kgml)
+		edge_lists = []
+		for child in root:
+			if child.tag == 'relation':
+				edge_lists.append(KGML.parse_relation(child))
+			elif child.tag == 'reaction':
+				edge_lists.append(KGML.parse_reaction(child))
+		node_ids = [child.attrib['id'] for child in root if child.tag == 'entry']
+
+		list_time = 'NA'
+		if n_relations <= args.max_list:
+			start = time.time()
+			n_edges = dedupe_list(edge_lists, node_ids)
+			list_time = '%.3f' % (time.time() - start)
+
+		start = time.time()
+		n_edges = dedupe_index(edge_lists, node_ids)
+		index_time = '%.3f' % (time.time() - start)
+
+		start = time.time()
+		KGML.KEGG_KGML_2_Cytoscape_network(StringIO.StringIO(kgml), StringIO.StringIO(), StringIO.StringIO())
+		total_time = '%.3f' % (time.time() - start)
+
+		print '\t'.join([str(n_relations), str(n_edges), list_time, index_time, total_time])
+
+
+def synthetic_KGML(n_relations, seed=1):
+	## KGML with n_relations 'relation' tags (and n_relations/4 'reaction' tags) between random reaction and compound entries.
+	random.seed(seed)
+	n_reactions = max(2, n_relations / 4)
+	n_compounds = max(2, n_relations / 4)
+	lines = ['<?xml version="1.0"?>', '<pathway name="path:rn99999" org="rn" number="99999" title="Synthetic">']
+	for i in range(n_reactions + n_compounds):
+		entry_type = 'reaction' if i < n_reactions else 'compound'
+		lines.append('<entry id="%s" name="x:%s" type="%s"><graphics type="circle" x="%s" y="%s" width="8" height="8"/></entry>' % (i, i, entry_type, i, i))
+	for i in range(n_relations):
+		lines.append('<relation entry1="%s" entry2="%s" type="ECrel"><subtype name="compound" value="%s"/></relation>' % (
+			random.randrange(n_reactions), random.randrange(n_reactions), n_reactions + random.randrange(n_compounds)))
+	for i in range(n_relations / 4):
+		lines.append('<reaction id="%s" name="rn:R%s" type="reversible"><substrate id="%s" name="x"/><product id="%s" name="x"/></reaction>' % (
+			random.randrange(n_reactions), i, n_reactions + random.randrange(n_compounds), n_reactions + random.randrange(n_compounds)))
+	lines.append('</pathway>')
+	return '\n'.join(lines)
+
+
+def dedupe_list(edge_lists, node_ids):
+	## Old method: list membership + flatten edges into set.
+	edges = []
+	for edge_list in edge_lists:
+		for edge in edge_list:
+			if edge not in edges:
+				edges.append(edge)
+	all_edges = []
+	for x in edges:
+		all_edges.extend(x)
+	all_edges = set(all_edges)
+	for n_id in node_ids:
+		if n_id not in all_edges:
+			edges.append([n_id, n_id])
+	return len(edges)
+
+
+def dedupe_index(edge_lists, node_ids):
+	## New method: Edge_index.
+	edges = KGML.Edge_index()
+	for edge_list in edge_lists:
+		for edge in edge_list:
+			edges.add(edge)
+	for n_id in node_ids:
+		if edges.degree[n_id] == 0:
+			edges.add([n_id, n_id])
+	return len(edges)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python2
+DESCRIPTION = '''
+Benchmark of the anchor text extraction in prepare_MetaCyc_Reactions.py.
+
+Rebuilds an All_reactions_of_MetaCyc.txt like table from data/MetaCyc_2_KEGG_Reaction_mapping.txt.gz
+(--copies times) and times process_MetaCyc_Reactions() using:
+	- soup:  a BeautifulSoup parser for every " // " seperated part of the KEGG and RHEA cells (the old code).
+	- regex: prepare_MetaCyc_Reactions.get_anchor_texts() (ANCHOR_RE with BeautifulSoup as fallback).
+Then times process_MetaCyc_Reactions() with --procs 1, 2, 4 and 8 (batches of --batch_size lines).
+All runs must give the same output as the mapping file.
+'''
+import sys
+import os
+import argparse
+import gzip
+import time
+import StringIO
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import prepare_MetaCyc_Reactions as MetaCyc
+
+MAPPING_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'MetaCyc_2_KEGG_Reaction_mapping.txt.gz')
+
+
+def main():
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=DESCRIPTION)
+	parser.add_argument('--copies',
+		required=False, default=1, type=int,
+		help='Number of copies of the MetaCyc reaction set to benchmark (default: %(default)s)'
+	)
+	parser.add_argument('--procs',
+		required=False, default='1,2,4,8', type=str,
+		help='Comma seperated number of processes to benchmark (default: %(default)s)'
+	)
+	parser.add_argument('--batch_size',
+		required=False, default=1000, type=int,
+		help='Number of lines in each batch (default: %(default)s)'
+	)
+	args = parser.parse_args()
+
+	with gzip.open(MAPPING_FILE, 'rb') as in_file:
+		expected = in_file.read()
+	table = reactions_table(expected.splitlines())
+	table = table[0] + ''.join(table[1:]) * args.copies
+	expected = expected * args.copies
+
+	print '\t'.join(['method', 'reactions', 'sec', 'speedup'])
+	fast = MetaCyc.get_anchor_texts
+	base_time = None
+	for method, get_anchor_texts in [['soup', soup_anchor_texts], ['regex', fast]]:
+		MetaCyc.get_anchor_texts = get_anchor_texts
+		elapsed = run(table, expected, 1, args.batch_size)
+		if base_time is None:
+			base_time = elapsed
+		print '\t'.join([method, str(expected.count('\n')), '%.2f' % elapsed, '%.2f' % (base_time / elapsed)])
+	MetaCyc.get_anchor_texts = fast
+
+	print
+	print '\t'.join(['procs', 'sec', 'speedup'])
+	base_time = None
+	for procs in [int(x) for x in args.procs.split(',')]:
+		elapsed = run(table, expected, procs, args.batch_size)
+		if base_time is None:
+			base_time = elapsed
+		print '\t'.join([str(procs), '%.2f' % elapsed, '%.2f' % (base_time / elapsed)])
+
+
+def run(table, expected, procs, batch_size):
+	## Time process_MetaCyc_Reactions() on table and check its output
+	out_file = StringIO.StringIO()
+	start = time.time()
+	MetaCyc.process_MetaCyc_Reactions(StringIO.StringIO(table), out_file, procs=procs, batch_size=batch_size)
+	elapsed = time.time() - start
+	if out_file.getvalue() != expected:
+		print 'Output with %s processes is different from %s' % (procs, MAPPING_FILE)
+		sys.exit(1)
+	return elapsed
+
+
+def reactions_table(mapping_lines):
+	## Lines of an All_reactions_of_MetaCyc.txt like table (with header) with the IDs of each mapping line
+	def cell(IDs, url):
+		return ' // '.join(["<a href='%s%s'>%s</a>" % (url, ID, ID) for ID in IDs.split(',') if ID])
+	lines = ['Reaction\tKEGG reaction\tRhea reaction\tEC-Number\n']
+	for line in mapping_lines:
+		MetaCyc_ID, KEGG, RHEA, EC = line.split('\t')
+		RHEA = ','.join([ID.split(':')[1] for ID in RHEA.split(',') if ID])
+		lines.append('\t'.join([MetaCyc_ID, cell(KEGG, 'http://www.genome.jp/dbget-bin/www_bget?rn:'),
+			cell(RHEA, 'http://www.rhea-db.org/reaction?id='), EC.replace(',', ' // ')]) + '\n')
+	return lines
+
+
+def soup_anchor_texts(cell):
+	## get_anchor_texts() before ANCHOR_RE (a BeautifulSoup parser for every part of the cell)
+	texts = []
+	for IDs in cell.split(' // '):
+		for ID in BeautifulSoup(IDs, 'html.parser').findAll("a"):
+			texts.append(ID.text)
+	return texts
+
+
+if __name__ == '__main__':
+	main()
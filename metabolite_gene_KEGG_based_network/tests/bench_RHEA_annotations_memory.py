@@ -0,0 +1,108 @@
+#!/usr/bin/env python2
+DESCRIPTION = '''
+Memory benchmark of the RHEA_ID_annots map built by prepare_RHEA_rdf_file.py.
+
+Reads the full Rhea reaction set from data/RHEA_2_KEGG_Reaction_mapping.txt.gz (--copies times, with
+the RHEA IDs offset in each copy) and builds {RHEA_ID:annotations} with the same instance for the
+4 IDs of each reaction (master ID = RHEA ID - RHEA ID % 4), using:
+	- list:  the old Reaction_group_annotations (lists in a __dict__, IDs not interned).
+	- slots: prepare_RHEA_rdf_file.Reaction_group_annotations (tuples, __slots__, interned IDs).
+
+Each method runs in its own process and the increase in peak RSS (ru_maxrss) is reported.
+'''
+import sys
+import os
+import argparse
+import gzip
+import resource
+import subprocess
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import prepare_RHEA_rdf_file as RHEA
+
+MAPPING_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'RHEA_2_KEGG_Reaction_mapping.txt.gz')
+
+
+def main():
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=DESCRIPTION)
+	parser.add_argument('--copies',
+		required=False, default='1,10', type=str,
+		help='Comma seperated number of copies of the Rhea reaction set to benchmark (default: %(default)s)'
+	)
+	parser.add_argument('--method',
+		required=False, default=None, choices=['list', 'slots'],
+		help=argparse.SUPPRESS
+	)
+	args = parser.parse_args()
+
+	if args.method is not None:
+		## Child process: build the map and print [IDs, peak RSS increase (MB), seconds]
+		rows = load_rows(MAPPING_FILE)
+		start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		start = time.time()
+		RHEA_ID_annots = build(rows, int(args.copies), args.method)
+		elapsed = time.time() - start
+		rss = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_rss) / 1024.0
+		print '%s\t%.1f\t%.2f' % (len(RHEA_ID_annots), rss, elapsed)
+		return
+
+	print '\t'.join(['copies', 'ids', 'list_MB', 'slots_MB', 'list_sec', 'slots_sec'])
+	for copies in args.copies.split(','):
+		results = {}
+		for method in ['list', 'slots']:
+			output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--copies', copies, '--method', method])
+			results[method] = output.strip().split('\t')
+		print '\t'.join([copies, results['list'][0], results['list'][1], results['slots'][1], results['list'][2], results['slots'][2]])
+
+
+def load_rows(mapping_file):
+	## [[RHEA ID (int), KEGG, MetaCyc, EC], ...]; the annotation columns are kept as the comma separated strings
+	rows = []
+	with gzip.open(mapping_file, 'rb') as in_file:
+		for line in in_file:
+			RHEA_ID, KEGG, MetaCyc, EC = line.rstrip('\n').split('\t')
+			rows.append([int(RHEA_ID.split(':')[1]), KEGG, MetaCyc, EC])
+	return rows
+
+
+def build(rows, copies, method):
+	## Build {RHEA_ID:annotations}; new strings are made for every ID (like parsing the RDF file does).
+	annot_class = Reaction_group_annotations_list if method == 'list' else RHEA.Reaction_group_annotations
+	to_str = str if method == 'list' else lambda x: intern(str(x))
+	RHEA_ID_annots = {}
+	for copy in range(copies):
+		offset = copy * 1000000
+		for RHEA_ID, KEGG, MetaCyc, EC in rows:
+			RHEA_ID += offset
+			master_ID = to_str(RHEA_ID - RHEA_ID % 4)
+			if master_ID not in RHEA_ID_annots:
+				RHEA_ID_annots[master_ID] = annot_class()
+			annot = RHEA_ID_annots[master_ID]
+			RHEA_ID_annots[to_str(RHEA_ID)] = annot
+			for add, annots in [[annot.add_KEGG, KEGG], [annot.add_MetaCyc, MetaCyc], [annot.add_EC, EC]]:
+				for x in annots.split(','):
+					if x:
+						add(to_str(x))
+	return RHEA_ID_annots
+
+
+class Reaction_group_annotations_list():
+	## Reaction_group_annotations before it used __slots__ and tuples
+	def __init__(self):
+		self.KEGG = []
+		self.MetaCyc = []
+		self.EC = []
+	def add_KEGG(self, annot):
+		if annot not in self.KEGG:
+			self.KEGG.append(annot)
+	def add_MetaCyc(self, annot):
+		if annot not in self.MetaCyc:
+			self.MetaCyc.append(annot)
+	def add_EC(self, annot):
+		if annot not in self.EC:
+			self.EC.append(annot)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python2
+DESCRIPTION = '''
+Benchmark of prepare_RHEA_rdf_file.py --workers.
+
+Writes a synthetic RHEA RDF file (--reactions reactions, each with its undefined, bidirectional and
+two directional descriptions plus --compounds compound descriptions per reaction) and times
+process_RHEA_rdf_file() with 1, 2, 4 and 8 workers (and the default single process mode), checking that
+every run gives the same output.
+'''
+import sys
+import os
+import argparse
+import random
+import time
+import tempfile
+import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import prepare_RHEA_rdf_file as RHEA
+
+
+def main():
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=DESCRIPTION)
+	parser.add_argument('--reactions',
+		required=False, default=20000, type=int,
+		help='Number of reactions in the synthetic RDF file (default: %(default)s)'
+	)
+	parser.add_argument('--compounds',
+		required=False, default=3, type=int,
+		help='Number of compound descriptions per reaction (default: %(default)s)'
+	)
+	parser.add_argument('--workers',
+		required=False, default='1,2,4,8', type=str,
+		help='Comma seperated number of workers to benchmark (default: %(default)s)'
+	)
+	parser.add_argument('--chunk_size',
+		required=False, default=2, type=float,
+		help='Chunk size (MB) (default: %(default)s)'
+	)
+	args = parser.parse_args()
+
+	rdf_file_name = synthetic_RDF(args.reactions, args.compounds)
+	try:
+		print 'RDF file: %.1f MB' % (os.path.getsize(rdf_file_name) / 1048576.0)
+		print '\t'.join(['workers', 'sec', 'speedup'])
+		expected = run(rdf_file_name, 1, args.chunk_size)[1]
+		base_time = None
+		for workers in [int(x) for x in args.workers.split(',')]:
+			elapsed, output = run(rdf_file_name, workers, args.chunk_size)
+			if output != expected:
+				print 'Output with %s workers is different from the default mode' % workers
+				sys.exit(1)
+			if base_time is None:
+				base_time = elapsed
+			print '\t'.join([str(workers), '%.2f' % elapsed, '%.2f' % (base_time / elapsed)])
+	finally:
+		os.remove(rdf_file_name)
+
+
+def run(rdf_file_name, workers, chunk_size):
+	out_file = StringIO.StringIO()
+	start = time.time()
+	with open(rdf_file_name, 'r') as rdf_file:
+		RHEA.process_RHEA_rdf_file(rdf_file, out_file, workers=workers, chunk_size=chunk_size)
+	return time.time() - start, out_file.getvalue()
+
+
+def synthetic_RDF(n_reactions, n_compounds, seed=1):
+	## Write a RHEA like RDF file to a tmp file; returns its name.
+	random.seed(seed)
+	fd, file_name = tempfile.mkstemp(suffix='.rdf')
+	with os.fdopen(fd, 'w') as rdf_file:
+		rdf_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+		rdf_file.write('<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#" xmlns:rh="http://rdf.rhea-db.org/">\n')
+		for i in range(n_reactions):
+			rhea_id = 10000 + i * 4
+			lines = ['<rdf:Description rdf:about="http://rdf.rhea-db.org/%s">' % rhea_id,
+				'  <rdfs:subClassOf rdf:resource="http://rdf.rhea-db.org/Reaction"/>',
+				'  <rh:accession>RHEA:%s</rh:accession>' % rhea_id,
+				'  <rh:equation>A%s + B = C + D</rh:equation>' % i,
+				'  <rh:directionalReaction rdf:resource="http://rdf.rhea-db.org/%s"/>' % (rhea_id + 1),
+				'  <rh:directionalReaction rdf:resource="http://rdf.rhea-db.org/%s"/>' % (rhea_id + 2),
+				'  <rh:bidirectionalReaction rdf:resource="http://rdf.rhea-db.org/%s"/>' % (rhea_id + 3)]
+			if random.random() < 0.6:
+				lines.append('  <rdfs:seeAlso rdf:resource="http://identifiers.org/kegg.reaction/R%05d"/>' % random.randrange(100000))
+			for j in range(random.randrange(3)):
+				lines.append('  <rdfs:seeAlso rdf:resource="http://identifiers.org/biocyc/METACYC:RXN-%s"/>' % random.randrange(100000))
+			for j in range(random.randrange(3)):
+				lines.append('  <rh:ec rdf:resource="http://purl.uniprot.org/enzyme/%s.%s.%s.%s"/>' % tuple([random.randrange(1, 100) for x in range(4)]))
+			lines.append('</rdf:Description>')
+			for j in range(n_compounds):
+				lines.extend(['<rdf:Description rdf:about="http://rdf.rhea-db.org/Compound_%s_%s">' % (i, j),
+					'  <rdfs:subClassOf rdf:resource="http://rdf.rhea-db.org/SmallMolecule"/>',
+					'  <rh:name>compound %s %s</rh:name>' % (i, j),
+					'  <rh:formula>C%sH%sO%s</rh:formula>' % (random.randrange(50), random.randrange(100), random.randrange(20)),
+					'</rdf:Description>'])
+			for d, reaction_type in [[1, 'DirectionalReaction'], [2, 'DirectionalReaction'], [3, 'BidirectionalReaction']]:
+				lines.extend(['<rdf:Description rdf:about="http://rdf.rhea-db.org/%s">' % (rhea_id + d),
+					'  <rdfs:subClassOf rdf:resource="http://rdf.rhea-db.org/%s"/>' % reaction_type,
+					'  <rh:accession>RHEA:%s</rh:accession>' % (rhea_id + d),
+					'</rdf:Description>'])
+			rdf_file.write('\n'.join(lines) + '\n')
+		rdf_file.write('</rdf:RDF>\n')
+	return file_name
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python2
+DESCRIPTION = '''
+Benchmark of csv_columns.iter_columns_by_name() (csv module) against the line.split(',') reader the MAGI
+filters used before.
+
+Writes a synthetic magi_compound_results.csv of --size MB (rows sampled from tests/magi_compound_results.csv,
+without quoted fields so both readers can read it) and times reading the 9 columns used by
+filter_magi_compound_results.py with:
+	- split: line.split(',') for every line (the old reader).
+	- csv:   csv_columns.iter_columns_by_name().
+Both readers must return the same columns.
+
+Then writes the same file with every note field quoted (with commas in it), which split can not read, and
+times csv_columns.iter_columns_by_name() against a plain csv.reader.
+'''
+import sys
+import os
+import argparse
+import random
+import tempfile
+import time
+import csv
+import operator
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import csv_columns as CSV
+
+MAGI_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'magi_compound_results.csv')
+COL_NAMES = ["feature", "original_compound", "neighbor", "original_mz", "database_id_r2g", "compound_score", "reciprocal_score", "e_score_r2g", "e_score_g2r"]
+
+
+def main():
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=DESCRIPTION)
+	parser.add_argument('--size',
+		required=False, default=200, type=float,
+		help='Size (MB) of the synthetic magi_compound_results.csv file (default: %(default)s)'
+	)
+	args = parser.parse_args()
+
+	for quoted, readers in [[False, [['split', split_iter_columns_by_name], ['csv_columns', CSV.iter_columns_by_name]]],
+			[True, [['csv.reader', reader_iter_columns_by_name], ['csv_columns', CSV.iter_columns_by_name]]]]:
+		csv_file_name = synthetic_CSV(int(args.size * 1024 * 1024), quoted)
+		try:
+			print
+			print '%s CSV file: %.1f MB' % ('Quoted' if quoted else 'Unquoted', os.path.getsize(csv_file_name) / 1048576.0)
+			print '\t'.join(['reader', 'rows', 'sec', 'MB/sec', 'speedup'])
+			expected = None
+			base_time = None
+			for reader, iter_columns in readers:
+				elapsed, n_rows, checksum = run(csv_file_name, iter_columns)
+				if expected is None:
+					expected = checksum
+					base_time = elapsed
+				elif checksum != expected:
+					print 'Columns read by %s are different from %s' % (reader, readers[0][0])
+					sys.exit(1)
+				print '\t'.join([reader, str(n_rows), '%.2f' % elapsed, '%.1f' % (os.path.getsize(csv_file_name) / 1048576.0 / elapsed), '%.2f' % (base_time / elapsed)])
+		finally:
+			os.remove(csv_file_name)
+
+
+def run(csv_file_name, iter_columns):
+	## Read COL_NAMES from csv_file_name; returns [seconds, rows, checksum of the columns]
+	start = time.time()
+	n_rows = 0
+	checksum = 0
+	with open(csv_file_name, 'r') as csv_file:
+		for columns in iter_columns(csv_file, COL_NAMES):
+			n_rows += 1
+			checksum = hash((checksum, tuple(columns)))
+	return time.time() - start, n_rows, checksum
+
+
+def synthetic_CSV(size, quoted=False, seed=1):
+	## Write a tmp file of ~size bytes with the header and random rows of MAGI_FILE (with the note field
+	## quoted if quoted=True); returns its name.
+	random.seed(seed)
+	with open(MAGI_FILE, 'r') as in_file:
+		header = in_file.next()
+		rows = [line for line in in_file if line.strip()]
+	if quoted:
+		for i, row in enumerate(rows):
+			cells = row.split(',')
+			cells[4] = '"%s, ""quoted"", note"' % cells[4]
+			rows[i] = ','.join(cells)
+	fd, file_name = tempfile.mkstemp(suffix='.csv')
+	with os.fdopen(fd, 'w') as csv_file:
+		csv_file.write(header)
+		written = len(header)
+		while written < size:
+			block = ''.join([random.choice(rows) for i in range(10000)])
+			csv_file.write(block)
+			written += len(block)
+	return file_name
+
+
+def split_iter_columns_by_name(infile, col_names, delim=','):
+	## iter_columns_by_name() of the MAGI filters before csv_columns.py (no quoting, no error handling)
+	headers = infile.next().strip('\n').split(delim)
+	headers_index = [headers.index(col_name) for col_name in col_names]
+	for line in infile:
+		line = line.strip('\n')
+		if not line or line.startswith('#'):
+			continue
+		line_split = line.split(delim)
+		yield [line_split[i] for i in headers_index]
+
+
+def reader_iter_columns_by_name(infile, col_names, delim=','):
+	## Plain csv.reader with the same column projection (no error handling)
+	reader = csv.reader(infile, delimiter=delim)
+	headers = reader.next()
+	get_columns = operator.itemgetter(*[headers.index(col_name) for col_name in col_names])
+	for row in reader:
+		if row and not row[0].startswith('#'):
+			yield get_columns(row)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python2
+DESCRIPTION = '''
+Local stand-in for the KEGG/Rhea web servers used by the tests.
+
+Serves files from --dir using the request path (e.g. "/get/rn00290/kgml" -> DIR/get/rn00290/kgml).
+Missing files return 404.
+
+NOTE:
+	- KEGG REST style multi-ID requests ("/get/cpd:C00001+cpd:C00002") return the files of
+	   each ID that exists joined together (404 if none of them exist), like rest.kegg.jp does.
+	- ':' in IDs is replaced with '_' when looking for files (DIR/get/cpd_C00001).
+	- Requests with a query are served from the file of the path and query joined by '_' if it exists
+	   ("/dbget-bin/www_bget?C00001" -> DIR/dbget-bin/www_bget_C00001), otherwise the query is ignored.
+	- --latency and --error_rate can be used to inject slow responses and (HTTP 503) errors.
+	- Writes one line per request to --log (default: stderr) so tests can count requests.
+'''
+import sys
+import os
+import argparse
+import random
+import time
+import threading
+import urllib
+import BaseHTTPServer
+import SocketServer
+
+
+def main():
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=DESCRIPTION)
+	parser.add_argument('-d', '--dir', metavar='kegg_rest',
+		required=True, type=str,
+		help='Directory with the files to serve (required)'
+	)
+	parser.add_argument('-p', '--port',
+		required=False, default=8765, type=int,
+		help='Port to listen on (default: %(default)s)'
+	)
+	parser.add_argument('--latency',
+		required=False, default=0, type=float,
+		help='Max random delay (seconds) added to each response (default: %(default)s)'
+	)
+	parser.add_argument('--error_rate',
+		required=False, default=0, type=float,
+		help='Fraction of requests that fail with HTTP 503 (default: %(default)s)'
+	)
+	parser.add_argument('--seed',
+		required=False, default=1, type=int,
+		help='Random seed for --latency and --error_rate (default: %(default)s)'
+	)
+	parser.add_argument('--log', metavar='requests.log',
+		required=False, default=None, type=str,
+		help='File to write one line per request to (default: stderr)'
+	)
+	args = parser.parse_args()
+
+	random.seed(args.seed)
+	Handler.root = args.dir
+	Handler.latency = args.latency
+	Handler.error_rate = args.error_rate
+	Handler.log = sys.stderr if args.log is None else open(args.log, 'a', 0)
+	server = Server(('127.0.0.1', args.port), Handler)
+	server.serve_forever()
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+	root = '.'
+	latency = 0
+	error_rate = 0
+	log = sys.stderr
+	lock = threading.Lock()
+
+	def do_GET(self):
+		with self.lock:
+			self.log.write('GET %s\n' % self.path)
+			delay = random.uniform(0, self.latency)
+			fail = random.random() < self.error_rate
+		time.sleep(delay)
+		if fail:
+			self.send(503, '')
+			return
+
+		path, _, query = self.path.partition('?')
+		parts = urllib.unquote(path).strip('/').split('/')
+		query = urllib.unquote(query)
+		## KEGG REST multi-ID request
+		if len(parts) == 2 and parts[0] == 'get' and '+' in parts[1]:
+			texts = [self.read(['get', x]) for x in parts[1].split('+')]
+			texts = [x for x in texts if x is not None]
+			if texts:
+				self.send(200, ''.join(texts))
+			else:
+				self.send(404, '')
+			return
+
+		text = None
+		if query:
+			text = self.read(parts[:-1] + [parts[-1] + '_' + query])
+		if text is None:
+			text = self.read(parts)
+		if text is None:
+			self.send(404, '')
+		else:
+			self.send(200, text)
+
+	def read(self, parts):
+		file_name = os.path.join(self.root, *[x.replace(':', '_') for x in parts if x not in ('', '.', '..')])
+		if not os.path.isfile(file_name):
+			return None
+		with open(file_name, 'rb') as fh:
+			return fh.read()
+
+	def send(self, code, text):
+		self.send_response(code)
+		self.send_header('Content-Type', 'text/plain; charset=utf-8')
+		self.send_header('Content-Length', str(len(text)))
+		self.end_headers()
+		self.wfile.write(text)
+
+	def log_message(self, format, *args):
+		pass
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env bash
+
+set -eu
+
+## Build the crosswalk from the step 0 mapping files and translate IDs in both directions
+rm -f __ID_crosswalk.sqlite
+./../scripts/build_ID_crosswalk.py -o __ID_crosswalk.sqlite \
+	-r ../data/RHEA_2_KEGG_Reaction_mapping.txt.gz \
+	-m ../data/MetaCyc_2_KEGG_Reaction_mapping.txt.gz \
+	-i ../data/InChIKey_2_KEGG_Compound_mapping.txt.gz
+
+## RHEA -> KEGG reaction
+cut -f1 test.rhea_id-reaction_id | ./../scripts/translate_IDs.py -c __ID_crosswalk.sqlite --from rhea --to kegg_reaction > __crosswalk.rhea.txt
+diff test.rhea_id-reaction_id __crosswalk.rhea.txt
+
+## KEGG reaction -> RHEA/MetaCyc/EC (reverse lookups), IDs in the 2nd column of a table with a header
+printf "name\tkegg\nA\tR02651\nB\trn:R00200\nC\tR99999\n" | ./../scripts/translate_IDs.py -c __ID_crosswalk.sqlite \
+	--from kegg_reaction --to rhea,metacyc,ec --column 2 --header --batch 2 > __crosswalk.kegg.txt
+diff <(printf "name\tkegg\trhea\tmetacyc\tec
+A\tR02651\tRHEA:11542,RHEA:11543,RHEA:11540,RHEA:11541\tN-ACYLMANNOSAMINE-1-DEHYDROGENASE-RXN\t1.1.1.233
+B\trn:R00200\tRHEA:18158,RHEA:18159,RHEA:18157,RHEA:18160\tPEPDEPHOS-RXN\t2.7.1.40
+C\tR99999\t\t\t
+") __crosswalk.kegg.txt
+
+## EC numbers with/without the MetaCyc "EC-" prefix
+printf "EC-1.4.1.19\n1.4.1.19\n" | ./../scripts/translate_IDs.py -c __ID_crosswalk.sqlite --from ec --to metacyc > __crosswalk.ec.txt
+test $(cut -f2 __crosswalk.ec.txt | sort -u | wc -l) -eq 1
+grep -q "TRYPTOPHAN-DEHYDROGENASE-RXN" __crosswalk.ec.txt
+
+## InChIKey <-> KEGG compound
+printf "ISWSIDIOOBJBQZ-UHFFFAOYSA-N\n" | ./../scripts/translate_IDs.py -c __ID_crosswalk.sqlite --from inchikey --to kegg_compound > __crosswalk.inchikey.txt
+diff <(printf "ISWSIDIOOBJBQZ-UHFFFAOYSA-N\tC15584,C00146\n") __crosswalk.inchikey.txt
+printf "C00146\n" | ./../scripts/translate_IDs.py -c __ID_crosswalk.sqlite --from kegg_compound --to inchikey > __crosswalk.compound.txt
+diff <(printf "C00146\tISWSIDIOOBJBQZ-UHFFFAOYSA-N\n") __crosswalk.compound.txt
+
+## More than 999 distinct IDs (+ duplicates) in one batch are looked up in several queries (SQLite < 3.32 allows 999 variables)
+(zcat ../data/RHEA_2_KEGG_Reaction_mapping.txt.gz | head -n 2500 | cut -f1; zcat ../data/RHEA_2_KEGG_Reaction_mapping.txt.gz | head -n 10 | cut -f1) > __crosswalk.many_ids.txt
+test $(sort -u __crosswalk.many_ids.txt | wc -l) -gt 999
+./../scripts/translate_IDs.py -c __ID_crosswalk.sqlite --from rhea --to kegg_reaction,ec -i __crosswalk.many_ids.txt --batch 5000 > __crosswalk.many_ids.batch.txt
+./../scripts/translate_IDs.py -c __ID_crosswalk.sqlite --from rhea --to kegg_reaction,ec -i __crosswalk.many_ids.txt --batch 7 > __crosswalk.many_ids.small.txt
+diff __crosswalk.many_ids.small.txt __crosswalk.many_ids.batch.txt
+diff __crosswalk.many_ids.txt <(cut -f1 __crosswalk.many_ids.batch.txt)
+test $(cut -f2 __crosswalk.many_ids.batch.txt | grep -c "R") -gt 999
+python2 -c "import sys; sys.path.insert(0, '../scripts'); import build_ID_crosswalk as X; sys.exit(0 if X.ID_crosswalk('__ID_crosswalk.sqlite', 5000).chunk_size <= 997 else 1)"
@@ -0,0 +1,52 @@
+#!/usr/bin/env bash
+
+set -eu
+
+## Batch conversion should give the same rows as converting each map and adding the "NAME__" prefixes with awk
+PORT=8791
+rm -fr __mock_kegg_batch.log __kgml_batch
+python2 mock_http_server.py --dir kegg_rest --port $PORT --log __mock_kegg_batch.log &
+SERVER=$!
+trap "kill $SERVER" EXIT
+sleep 1
+
+mkdir __kgml_batch
+cp rn00290.xml __kgml_batch/00290_Valine_leucine_and_isoleucine_biosynthesis.kgml
+cp rn00290.xml __kgml_batch/99999_Copy_of_rn00290.kgml
+
+./../scripts/KEGG_KGML_batch_to_network_format.py --dir __kgml_batch --edges __batch.edges.txt --nodes __batch.nodes.txt --nnf __batch.edges.nnf \
+	--metrics __batch.metrics.json --workers 2 --backend rest --rest_url "http://127.0.0.1:$PORT"
+
+(
+	head -n 1 rn00290.rest.nodes.txt
+	for NAME in 00290_Valine_leucine_and_isoleucine_biosynthesis 99999_Copy_of_rn00290; do
+		awk -F'\t' -vNAME="$NAME" 'NR>1{print NAME"__"$0}' rn00290.rest.nodes.txt
+	done
+) > __batch.expected.nodes.txt
+(
+	head -n 1 rn00290.rest.edges.txt
+	for NAME in 00290_Valine_leucine_and_isoleucine_biosynthesis 99999_Copy_of_rn00290; do
+		awk -F'\t' -vNAME="$NAME" 'NR>1{print NAME"__"$1"\t"NAME"__"$2}' rn00290.rest.edges.txt
+	done
+) > __batch.expected.edges.txt
+
+diff __batch.expected.nodes.txt __batch.nodes.txt
+diff __batch.expected.edges.txt __batch.edges.txt
+
+## NNF: "KEGG\tNAME" then the edges of each map
+for NAME in 00290_Valine_leucine_and_isoleucine_biosynthesis 99999_Copy_of_rn00290; do
+	echo -e "KEGG\t$NAME"
+	awk -F'\t' -vNAME="$NAME" 'NR>1{ if($1==$2){print NAME"\t"NAME"__"$1} else {print NAME"\t"NAME"__"$1"\tflow\t"NAME"__"$2} }' rn00290.rest.edges.txt
+done > __batch.expected.edges.nnf
+diff __batch.expected.edges.nnf __batch.edges.nnf
+
+## Build report: every request made to the mock server is counted once, and the 55 entries of each map were parsed
+python2 -c "
+import json
+report = json.load(open('__batch.metrics.json'))
+total = report['total']
+assert sum([x['fetches'] for x in total['types'].values()]) == $(wc -l < __mock_kegg_batch.log)
+assert sum([x['parsed'] for x in total['types'].values()]) == 2 * 55
+assert total['maps'] == {'converted':2, 'cached':0, 'failed':0}
+assert sorted(report['maps'].keys()) == ['00290_Valine_leucine_and_isoleucine_biosynthesis', '99999_Copy_of_rn00290']
+"
@@ -0,0 +1,89 @@
+#!/usr/bin/env bash
+
+set -eu
+
+## Rebuilds with --shard_dir should only convert maps whose KGML file changed, and give the same merged files as a full rebuild
+PORT=8793
+SLOW_PORT=8799
+rm -fr __mock_kegg_shards.log __mock_kegg_shards_slow.log __kgml_shards __kgml_shards_dir __kgml_shards_killed __kgml_shards_killed_dir
+python2 mock_http_server.py --dir kegg_rest --port $PORT --log __mock_kegg_shards.log &
+SERVER=$!
+python2 mock_http_server.py --dir kegg_rest --port $SLOW_PORT --log __mock_kegg_shards_slow.log --latency 0.4 &
+SLOW_SERVER=$!
+trap "kill $SERVER $SLOW_SERVER" EXIT
+sleep 1
+
+A="00290_Valine_leucine_and_isoleucine_biosynthesis"
+B="99999_Copy_of_rn00290"
+mkdir __kgml_shards
+cp rn00290.xml __kgml_shards/$A.kgml
+cp rn00290.xml __kgml_shards/$B.kgml
+
+convert() {
+	./../scripts/KEGG_KGML_batch_to_network_format.py --dir __kgml_shards --edges __shards.edges.txt --nodes __shards.nodes.txt --nnf __shards.edges.nnf \
+		--workers 2 --backend rest --rest_url "http://127.0.0.1:$PORT" "${@}"
+}
+expected() {
+	for SUFFIX in nodes edges; do
+		head -n 1 rn00290.rest.$SUFFIX.txt > __shards.expected.$SUFFIX.txt
+		for NAME in "${@}"; do
+			awk -F'\t' -vNAME="$NAME" -vSUFFIX=$SUFFIX 'NR>1{ if(SUFFIX=="edges"){$0=$1"\t"NAME"__"$2}; print NAME"__"$0}' rn00290.rest.$SUFFIX.txt
+		done >> __shards.expected.$SUFFIX.txt
+	done
+	diff __shards.expected.nodes.txt __shards.nodes.txt
+	diff __shards.expected.edges.txt __shards.edges.txt
+}
+
+## First run converts both maps
+convert --shard_dir __kgml_shards_dir
+expected $A $B
+N_REQUESTS=$(wc -l < __mock_kegg_shards.log)
+
+## Nothing changed: merged files are built from the shards without downloading anything
+convert --shard_dir __kgml_shards_dir
+expected $A $B
+test $(wc -l < __mock_kegg_shards.log) -eq $N_REQUESTS
+
+## Changed map is converted again and removed map is dropped
+sed -e 's/<\/pathway>/<entry id="999" name="cpd:C99999" type="compound"><graphics name="C99999" type="circle" x="1" y="1" width="8" height="8"\/><\/entry>\n<\/pathway>/' \
+	rn00290.xml > __kgml_shards/$A.kgml
+rm __kgml_shards/$B.kgml
+convert --shard_dir __kgml_shards_dir
+test $(wc -l < __mock_kegg_shards.log) -gt $N_REQUESTS
+grep -q C99999 __kgml_shards_dir/$A.nodes.txt
+test ! -e __kgml_shards_dir/$B.nodes.txt
+
+cp __shards.nodes.txt __shards.incremental.nodes.txt
+cp __shards.edges.txt __shards.incremental.edges.txt
+cp __shards.edges.nnf __shards.incremental.edges.nnf
+convert
+diff __shards.nodes.txt __shards.incremental.nodes.txt
+diff __shards.edges.txt __shards.incremental.edges.txt
+diff __shards.edges.nnf __shards.incremental.edges.nnf
+
+## A run that is killed part way keeps the maps it finished (manifest saved after each map with --shard_save_every 1)
+mkdir __kgml_shards_killed
+for NAME in 00010_Map_A 00020_Map_B 00030_Map_C 00040_Map_D; do
+	cp rn00290.xml __kgml_shards_killed/$NAME.kgml
+done
+n_manifest_maps() {
+	python2 -c "import json, sys; print len(json.load(open(sys.argv[1])))" __kgml_shards_killed_dir/manifest.json 2> /dev/null || echo 0
+}
+./../scripts/KEGG_KGML_batch_to_network_format.py --dir __kgml_shards_killed --edges __shards.edges.txt --nodes __shards.nodes.txt \
+	--workers 1 --backend rest --rest_url "http://127.0.0.1:$SLOW_PORT" --shard_dir __kgml_shards_killed_dir --shard_save_every 1 2> /dev/null &
+CONVERT=$!
+for i in $(seq 300); do
+	test $(n_manifest_maps) -ge 1 && break
+	sleep 0.1
+done
+kill -9 $CONVERT # Fails if the run already finished
+wait $CONVERT || true
+N_SAVED=$(n_manifest_maps)
+test $N_SAVED -ge 1
+test $N_SAVED -lt 4
+./../scripts/KEGG_KGML_batch_to_network_format.py --dir __kgml_shards_killed --edges __shards.edges.txt --nodes __shards.nodes.txt \
+	--workers 2 --backend rest --rest_url "http://127.0.0.1:$PORT" --shard_dir __kgml_shards_killed_dir 2> __shards.killed.log
+grep -q "used $N_SAVED unchanged maps from shards" __shards.killed.log
+grep -q "Converted $((4 - N_SAVED)) maps" __shards.killed.log
+expected 00010_Map_A 00020_Map_B 00030_Map_C 00040_Map_D
+test $(n_manifest_maps) -eq 4
@@ -0,0 +1,48 @@
+#!/usr/bin/env bash
+
+set -eu
+
+## --deferred writes placeholder nodes without fetching anything; fill_KEGG_node_annotations.py fills them in afterwards
+R="rn00290"
+PORT=8795
+rm -fr __mock_kegg_deferred.log __kegg_deferred_cache
+python2 mock_http_server.py --dir kegg_rest --port $PORT --log __mock_kegg_deferred.log &
+SERVER=$!
+trap "kill $SERVER" EXIT
+sleep 1
+
+./../scripts/KEGG_reaction_KGML_to_network_format.py -x $R.xml --edges __$R.deferred.edges.txt --nodes __$R.deferred.nodes.txt \
+	--backend rest --rest_url "http://127.0.0.1:$PORT" --deferred __$R.pending.txt
+
+diff $R.rest.edges.txt __$R.deferred.edges.txt
+test ! -s __mock_kegg_deferred.log
+test $(wc -l < __$R.pending.txt) -eq 55
+
+./../scripts/fill_KEGG_node_annotations.py --nodes __$R.deferred.nodes.txt --pending __$R.pending.txt --out __$R.filled.nodes.txt \
+	--backend rest --rest_url "http://127.0.0.1:$PORT" --cache_dir __kegg_deferred_cache
+
+diff $R.rest.nodes.txt __$R.filled.nodes.txt
+test $(wc -l < __mock_kegg_deferred.log) -eq 7
+
+## --enrich compound only fetches compound info (from the cache filled above)
+./../scripts/KEGG_reaction_KGML_to_network_format.py -x $R.xml --edges __$R.deferred.edges.txt --nodes __$R.compound.nodes.txt \
+	--backend rest --rest_url "http://127.0.0.1:$PORT" --enrich compound --cache_dir __kegg_deferred_cache --cache_only
+
+diff <(awk -F'\t' '$4 == "compound"' $R.rest.nodes.txt) <(awk -F'\t' '$4 == "compound"' __$R.compound.nodes.txt)
+test $(awk -F'\t' '$4 != "compound" && $3 != "-"' __$R.compound.nodes.txt | wc -l) -eq 1
+
+## Batch converter: pending entries of all maps (and of maps spliced from their shards) end up in one file
+rm -fr __kgml_deferred __kgml_deferred_shards
+mkdir __kgml_deferred
+cp $R.xml __kgml_deferred/00290_A.kgml
+cp $R.xml __kgml_deferred/99999_B.kgml
+for RUN in convert splice; do
+	./../scripts/KEGG_KGML_batch_to_network_format.py --dir __kgml_deferred --edges __batch.deferred.edges.txt --nodes __batch.deferred.nodes.txt \
+		--backend rest --rest_url "http://127.0.0.1:$PORT" --shard_dir __kgml_deferred_shards --deferred __batch.pending.txt
+	test $(wc -l < __batch.pending.txt) -eq 110
+done
+./../scripts/KEGG_KGML_batch_to_network_format.py --dir __kgml_deferred --edges __batch.edges.txt --nodes __batch.nodes.txt \
+	--backend rest --rest_url "http://127.0.0.1:$PORT" --cache_dir __kegg_deferred_cache --cache_only
+./../scripts/fill_KEGG_node_annotations.py --nodes __batch.deferred.nodes.txt --pending __batch.pending.txt --out __batch.filled.nodes.txt \
+	--backend rest --rest_url "http://127.0.0.1:$PORT" --cache_dir __kegg_deferred_cache --cache_only
+diff __batch.nodes.txt __batch.filled.nodes.txt
@@ -0,0 +1,46 @@
+#!/usr/bin/env bash
+
+set -eu
+
+## Downloader should retry failed requests (mock server fails 30% of requests), fall back to hsa, and resume from its ledger
+PORT=8794
+rm -fr __mock_kegg_download.log __kegg_kgml __kgml_download
+mkdir -p __kegg_kgml/get/rn00290 __kegg_kgml/get/hsa04010
+cp rn00290.xml __kegg_kgml/get/rn00290/kgml
+cp rn00290.xml __kegg_kgml/get/hsa04010/kgml
+python2 mock_http_server.py --dir __kegg_kgml --port $PORT --log __mock_kegg_download.log --error_rate 0.3 &
+SERVER=$!
+trap "kill $SERVER" EXIT
+sleep 1
+
+printf "00290 Valine, leucine and isoleucine biosynthesis\n04010 MAPK signaling pathway\n99999 Not a map\n" \
+	| sed -e 's/,//' > __kgml_download.maps.txt
+
+download() {
+	./../scripts/download_KEGG_KGML_files.py --input __kgml_download.maps.txt --out_dir __kgml_download \
+		--list __kgml_download.files.txt --rest_url "http://127.0.0.1:$PORT" --workers 2 --retries 20 --backoff 0.01 --max_backoff 0.05
+}
+
+download
+diff rn00290.xml __kgml_download/00290_Valine_leucine_and_isoleucine_biosynthesis.kgml
+diff rn00290.xml __kgml_download/04010_MAPK_signaling_pathway.kgml
+test ! -e __kgml_download/99999_Not_a_map.kgml
+printf "__kgml_download/00290_Valine_leucine_and_isoleucine_biosynthesis.kgml\n__kgml_download/04010_MAPK_signaling_pathway.kgml\n" \
+	| diff - __kgml_download.files.txt
+
+## rn00290 (1 request), hsa04010 (rn + hsa), 99999 (rn + hsa) = 5 successful requests; the rest were retries
+python2 -c "import sqlite3; print '\n'.join(['%s\t%s\t%s\t%s' % x for x in sqlite3.connect('__kgml_download/KEGG_KGML_downloads.sqlite').execute('SELECT kegg_id, status, org, attempts FROM jobs ORDER BY kegg_id')])" \
+	| cut -f 1-3 | diff - <(printf "00290\tdone\trn\n04010\tdone\thsa\n99999\tmissing\tNone\n")
+test $(wc -l < __mock_kegg_download.log) -ge 5
+
+## Second run resumes from the ledger, so nothing is downloaded again
+N_REQUESTS=$(wc -l < __mock_kegg_download.log)
+download
+test $(wc -l < __mock_kegg_download.log) -eq $N_REQUESTS
+
+## Map left 'pending' (e.g. run stopped part way) is downloaded on the next run
+rm __kgml_download/04010_MAPK_signaling_pathway.kgml
+python2 -c "import sqlite3; sqlite3.connect('__kgml_download/KEGG_KGML_downloads.sqlite', isolation_level=None).execute('UPDATE jobs SET status=\"pending\" WHERE kegg_id=\"04010\"')"
+download
+diff rn00290.xml __kgml_download/04010_MAPK_signaling_pathway.kgml
+test $(wc -l < __mock_kegg_download.log) -gt $N_REQUESTS
@@ -0,0 +1,27 @@
+#!/usr/bin/env bash
+
+set -eu
+
+## Graph built from two copies of rn00290 should have one vertex per KEGG ID, linked to the node in each map
+rm -fr __graph
+for SUFFIX in nodes edges; do
+	head -n 1 rn00290.rest.$SUFFIX.txt > __graph.$SUFFIX.txt
+	for NAME in A B; do
+		awk -F'\t' -vNAME="$NAME" -vSUFFIX=$SUFFIX 'NR>1{ if(SUFFIX=="edges"){$0=$1"\t"NAME"__"$2}; print NAME"__"$0}' rn00290.rest.$SUFFIX.txt
+	done >> __graph.$SUFFIX.txt
+done
+
+./../scripts/build_KEGG_network_graph.py --nodes __graph.nodes.txt --edges __graph.edges.txt --out __graph
+
+cd ../scripts
+python2 -c "
+import build_KEGG_network_graph as G
+graph = G.KEGG_network_graph('../tests/__graph')
+assert (graph.n_nodes, graph.n_global, graph.n_edges) == (110, 52, 128)
+pyruvate = graph.vertex_id('cpd:C00022')
+assert graph.is_global(pyruvate)
+assert [graph.vertex_name(v) for v in graph.neighbors(pyruvate)] == ['A__55', 'B__55']
+assert [graph.vertex_name(v) for v in graph.neighbors(graph.vertex_id('A__23'))] == ['A__26', 'A__56', 'rn:R00994']
+assert [graph.vertex_name(v) for v in graph.map_nodes('path:rn00260')] == ['A__31', 'B__31']
+assert sum([graph.degree(v) for v in range(graph.n_vertices)]) == 2 * (128 + 110)
+"
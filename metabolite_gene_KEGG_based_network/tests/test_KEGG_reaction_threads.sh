@@ -0,0 +1,53 @@
+#!/usr/bin/env bash
+
+set -eu
+
+## Concurrent downloads (--threads) must give the same output as the sequential path
+## (local stand-in for rest.kegg.jp with random latency, so the threads finish out of order)
+R="rn00290"
+PORT=8800
+rm -fr __mock_kegg_threads.log
+python2 mock_http_server.py --dir kegg_rest --port $PORT --log __mock_kegg_threads.log --latency 0.5 --seed 3 &
+SERVER=$!
+trap "kill $SERVER" EXIT
+sleep 1
+
+convert() {
+	./../scripts/KEGG_reaction_KGML_to_network_format.py -x $R.xml --backend rest --rest_url "http://127.0.0.1:$PORT" "${@}"
+}
+convert --edges __$R.edges.txt --nodes __$R.nodes.txt
+convert --edges __$R.threads.edges.txt --nodes __$R.threads.nodes.txt --threads 8
+
+diff __$R.edges.txt __$R.threads.edges.txt
+diff __$R.nodes.txt __$R.threads.nodes.txt
+
+diff $R.rest.edges.txt __$R.threads.edges.txt
+diff $R.rest.nodes.txt __$R.threads.nodes.txt
+
+## Both runs downloaded all 7 pages
+test $(wc -l < __mock_kegg_threads.log) -eq 14
+
+## Same for the html backend: the entry links of the KGML file point to a local stand-in for www.kegg.jp
+## serving canned dbget pages (made from the flat files in kegg_rest/, so the nodes match the rest backend)
+WWW_PORT=8803
+rm -fr __mock_kegg_www.log
+python2 mock_http_server.py --dir kegg_www --port $WWW_PORT --log __mock_kegg_www.log --latency 0.2 --seed 3 &
+WWW_SERVER=$!
+trap "kill $SERVER $WWW_SERVER" EXIT
+sleep 1
+sed "s|https://www.kegg.jp/|http://127.0.0.1:$WWW_PORT/|" $R.xml > __$R.www.xml
+
+convert_html() {
+	./../scripts/KEGG_reaction_KGML_to_network_format.py -x __$R.www.xml --backend html "${@}"
+}
+convert_html --edges __$R.html.edges.txt --nodes __$R.html.nodes.txt
+convert_html --edges __$R.html.threads.edges.txt --nodes __$R.html.threads.nodes.txt --threads 8
+
+diff __$R.html.edges.txt __$R.html.threads.edges.txt
+diff __$R.html.nodes.txt __$R.html.threads.nodes.txt
+
+diff $R.rest.edges.txt __$R.html.threads.edges.txt
+diff $R.rest.nodes.txt <(sed "s|http://127.0.0.1:$WWW_PORT/|https://www.kegg.jp/|" __$R.html.threads.nodes.txt)
+
+## The sequential run downloads the page of each of the 55 entries, the threads run each of the 52 different pages once
+test $(grep -c "/dbget-bin/www_bget?" __mock_kegg_www.log) -eq 107
@@ -0,0 +1,88 @@
+#!/usr/bin/env bash
+
+set -eu
+
+## --backend rest against a local stand-in for rest.kegg.jp serving the flat files in kegg_rest/
+R="rn00290"
+PORT=8790
+rm -fr __mock_kegg_rest.log __kegg_cache
+python2 mock_http_server.py --dir kegg_rest --port $PORT --log __mock_kegg_rest.log &
+SERVER=$!
+trap "kill $SERVER" EXIT
+sleep 1
+
+./../scripts/KEGG_reaction_KGML_to_network_format.py -x $R.xml --edges __$R.rest.edges.txt --nodes __$R.rest.nodes.txt \
+	--backend rest --rest_url "http://127.0.0.1:$PORT" --cache_dir __kegg_cache
+
+diff $R.rest.edges.txt __$R.rest.edges.txt
+diff $R.rest.nodes.txt __$R.rest.nodes.txt
+
+## 52 IDs (23 compounds, 25 reactions, 4 maps) should only need 7 requests (max 10 IDs per request)
+test $(wc -l < __mock_kegg_rest.log) -eq 7
+
+## Second run should only use the entries stored in the cache
+./../scripts/KEGG_reaction_KGML_to_network_format.py -x $R.xml --edges __$R.rest.edges.txt --nodes __$R.rest.nodes.txt \
+	--backend rest --rest_url "http://127.0.0.1:$PORT" --cache_dir __kegg_cache --cache_only
+
+diff $R.rest.nodes.txt __$R.rest.nodes.txt
+test $(wc -l < __mock_kegg_rest.log) -eq 7
+
+## Threads writing the same page to the cache at the same time (unique temp files; no temp files left behind)
+python2 -c "
+import sys, threading
+sys.path.insert(0, '../scripts')
+import KEGG_reaction_KGML_to_network_format as KGML
+cache = KGML.KEGG_page_cache('__kegg_cache', max_size=0)
+errors = []
+def put():
+	try:
+		for i in range(200):
+			cache.put('http://127.0.0.1/same_page', u'page text')
+	except Exception as e:
+		errors.append(e)
+threads = [threading.Thread(target=put) for i in range(8)]
+[t.start() for t in threads]
+[t.join() for t in threads]
+sys.exit(1 if errors or cache.lookup('http://127.0.0.1/same_page') != u'page text' else 0)
+"
+test -z "$(find __kegg_cache -name '*.tmp')"
+
+## HTTP 503 errors are retried (with backoff) until the batch is downloaded
+python2 mock_http_server.py --dir kegg_rest --port 8801 --error_rate 0.5 --seed 5 --log __mock_kegg_rest.errors.log &
+ERRORS=$!
+trap "kill $SERVER $ERRORS" EXIT
+sleep 1
+./../scripts/KEGG_reaction_KGML_to_network_format.py -x $R.xml --edges __$R.rest.edges.txt --nodes __$R.rest.nodes.txt \
+	--backend rest --rest_url "http://127.0.0.1:8801" --retries 10 --backoff 0.05
+
+diff $R.rest.edges.txt __$R.rest.edges.txt
+diff $R.rest.nodes.txt __$R.rest.nodes.txt
+test $(wc -l < __mock_kegg_rest.errors.log) -gt 7
+
+## ... and the run fails (instead of writing the entries as not found) once the retries run out
+python2 mock_http_server.py --dir kegg_rest --port 8802 --error_rate 1 --log __mock_kegg_rest.down.log &
+DOWN=$!
+trap "kill $SERVER $ERRORS $DOWN" EXIT
+sleep 1
+status=0
+./../scripts/KEGG_reaction_KGML_to_network_format.py -x $R.xml --edges __$R.down.edges.txt --nodes __$R.down.nodes.txt \
+	--backend rest --rest_url "http://127.0.0.1:8802" --retries 2 --backoff 0.05 2> __$R.down.log || status=$?
+test $status -ne 0
+grep -q 'HTTPError: HTTP 503' __$R.down.log
+test $(wc -l < __mock_kegg_rest.down.log) -eq 3
+
+## --store: a run that fails releases the entries it claimed (other processes dont have to wait for them) ...
+rm -fr __kegg_store.sqlite __kegg_cache_empty
+status=0
+./../scripts/KEGG_reaction_KGML_to_network_format.py -x $R.xml --edges __$R.down.edges.txt --nodes __$R.down.nodes.txt \
+	--backend rest --rest_url "http://127.0.0.1:8802" --retries 0 --store __kegg_store.sqlite 2> __$R.down.log || status=$?
+test $status -ne 0
+test "$(python2 -c "import sqlite3; print sqlite3.connect('__kegg_store.sqlite').execute('SELECT COUNT(*) FROM annotations').fetchone()[0]")" = "0"
+
+## ... and entries whose page was not downloaded (here: not in the cache with --cache_only) are not stored as having no info
+./../scripts/KEGG_reaction_KGML_to_network_format.py -x $R.xml --edges __$R.offline.edges.txt --nodes __$R.offline.nodes.txt \
+	--backend rest --rest_url "http://127.0.0.1:$PORT" --cache_dir __kegg_cache_empty --cache_only --store __kegg_store.sqlite
+test "$(python2 -c "import sqlite3; print sqlite3.connect('__kegg_store.sqlite').execute('SELECT COUNT(*) FROM annotations').fetchone()[0]")" = "0"
+./../scripts/KEGG_reaction_KGML_to_network_format.py -x $R.xml --edges __$R.rest.edges.txt --nodes __$R.rest.nodes.txt \
+	--backend rest --rest_url "http://127.0.0.1:$PORT" --store __kegg_store.sqlite
+diff $R.rest.nodes.txt __$R.rest.nodes.txt
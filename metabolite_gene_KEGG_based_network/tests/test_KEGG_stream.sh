@@ -0,0 +1,23 @@
+#!/usr/bin/env bash
+
+set -eu
+
+## --stream (incremental parsing) must give the same output as parsing the whole KGML file
+R="rn00290"
+PORT=8792
+python2 mock_http_server.py --dir kegg_rest --port $PORT --log /dev/null &
+SERVER=$!
+trap "kill $SERVER" EXIT
+sleep 1
+
+./../scripts/KEGG_reaction_KGML_to_network_format.py -x $R.xml --edges __$R.stream.edges.txt --nodes __$R.stream.nodes.txt \
+	--backend rest --rest_url "http://127.0.0.1:$PORT" --stream
+
+diff $R.rest.edges.txt __$R.stream.edges.txt
+diff $R.rest.nodes.txt __$R.stream.nodes.txt
+
+./../scripts/KEGG_reaction_KGML_to_network_format.py -x $R.xml --edges __$R.stream.edges.txt --nodes __$R.stream.nodes.txt \
+	--backend rest --rest_url "http://127.0.0.1:$PORT" --stream --threads 4
+
+diff $R.rest.edges.txt __$R.stream.edges.txt
+diff $R.rest.nodes.txt __$R.stream.nodes.txt
@@ -0,0 +1,54 @@
+#!/usr/bin/env bash
+
+set -eu
+
+## Rebuild an All_reactions_of_MetaCyc.txt like table from the MetaCyc to KEGG Reaction mapping file
+## (IDs as <a href='...'>ID</a> elements seperated by " // ") and check that it gives back the same mapping
+zcat ../data/MetaCyc_2_KEGG_Reaction_mapping.txt.gz \
+	| awk 'BEGIN{FS=OFS="\t"; print "Reaction", "KEGG reaction", "Rhea reaction", "EC-Number"}
+		function cell(ids, url, prefix,   n, a, i, s) {
+			n = split(ids, a, ","); s = ""
+			for (i = 1; i <= n; i++) { sub(prefix, "", a[i]); s = s (i > 1 ? " // " : "") "<a href='"'"'" url a[i] "'"'"'>" a[i] "</a>" }
+			return s
+		}
+		{gsub(",", " // ", $4); print $1, cell($2, "http://www.genome.jp/dbget-bin/www_bget?rn:", ""), cell($3, "http://www.rhea-db.org/reaction?id=", "^RHEA:"), $4}' \
+	| gzip -c > __All_reactions_of_MetaCyc.txt.gz
+./../scripts/prepare_MetaCyc_Reactions.py -i __All_reactions_of_MetaCyc.txt.gz -o __MetaCyc_2_KEGG_Reaction_mapping.txt.gz
+diff <(zcat ../data/MetaCyc_2_KEGG_Reaction_mapping.txt.gz) <(zcat __MetaCyc_2_KEGG_Reaction_mapping.txt.gz)
+
+## Cells that are not simple <a> elements are parsed by BeautifulSoup
+printf 'Reaction\tKEGG reaction\tRhea reaction\tEC-Number\n' > __MetaCyc_malformed.txt
+printf 'RXN-1\t<a href="x?rn:R00001">R00001</a> // <A HREF=x>R00002</A>\t<a href='"'"'x'"'"' class="y">10</a><a href='"'"'x'"'"'>11</a>\tEC-1.1.1.1\n' >> __MetaCyc_malformed.txt
+printf 'RXN-2\t<a href='"'"'x'"'"'>R&#48;0003</a>\t<b><a href='"'"'x'"'"'>12</a></b> // 13\t\n' >> __MetaCyc_malformed.txt
+printf 'RXN-1\tR00001,R00002\tRHEA:10,RHEA:11\tEC-1.1.1.1\nRXN-2\tR00003\tRHEA:12\t\n' > __MetaCyc_malformed.expected.txt
+./../scripts/prepare_MetaCyc_Reactions.py -i __MetaCyc_malformed.txt -o __MetaCyc_malformed.mapping.txt
+diff __MetaCyc_malformed.expected.txt __MetaCyc_malformed.mapping.txt
+
+## --procs: batches processed in parallel and written in input order
+./../scripts/prepare_MetaCyc_Reactions.py -i __All_reactions_of_MetaCyc.txt.gz -o __MetaCyc_2_KEGG_Reaction_mapping.procs.txt.gz --procs 3 --batch_size 100
+diff <(zcat ../data/MetaCyc_2_KEGG_Reaction_mapping.txt.gz) <(zcat __MetaCyc_2_KEGG_Reaction_mapping.procs.txt.gz)
+./../scripts/prepare_MetaCyc_Reactions.py -i __MetaCyc_malformed.txt -o __MetaCyc_malformed.procs.txt --procs 2 --batch_size 1
+diff __MetaCyc_malformed.expected.txt __MetaCyc_malformed.procs.txt
+
+## A line without 4 columns stops the run after the lines before it are written (in both modes)
+(cat __MetaCyc_malformed.txt; printf 'RXN-3\tR00004\n'; tail -n 1 __MetaCyc_malformed.txt) > __MetaCyc_bad.txt
+for PROCS in 1 2; do
+	if ./../scripts/prepare_MetaCyc_Reactions.py -i __MetaCyc_bad.txt -o __MetaCyc_bad.mapping.txt --procs $PROCS --batch_size 1 2> __MetaCyc_bad.log; then exit 1; fi
+	diff __MetaCyc_malformed.expected.txt __MetaCyc_bad.mapping.txt
+	grep -q "Filed to split line into 4 columns: RXN-3" __MetaCyc_bad.log
+done
+
+## Reverse indexes (built in the same pass) match inverting the mapping file
+./../scripts/prepare_MetaCyc_Reactions.py -i __All_reactions_of_MetaCyc.txt.gz -o __MetaCyc_2_KEGG_Reaction_mapping.index.txt.gz --procs 2 --batch_size 1000 \
+	--kegg_index __KEGG_Reaction_2_MetaCyc_mapping.txt.gz --rhea_index __RHEA_2_MetaCyc_mapping.txt --ec_index __EC_2_MetaCyc_mapping.txt.gz
+diff <(zcat ../data/MetaCyc_2_KEGG_Reaction_mapping.txt.gz) <(zcat __MetaCyc_2_KEGG_Reaction_mapping.index.txt.gz)
+reverse_index() {
+	zcat ../data/MetaCyc_2_KEGG_Reaction_mapping.txt.gz \
+		| awk -F'\t' -v COL=$1 '{n = split($COL, a, ","); for (i = 1; i <= n; i++) if (a[i] != "") print a[i]"\t"$1}' \
+		| LC_ALL=C sort -u \
+		| awk 'BEGIN{FS=OFS="\t"} $1 == ID {M = M","$2; next} {if (NR > 1) print ID, M; ID = $1; M = $2} END{if (NR > 0) print ID, M}'
+}
+diff <(reverse_index 2) <(zcat __KEGG_Reaction_2_MetaCyc_mapping.txt.gz)
+diff <(reverse_index 3) __RHEA_2_MetaCyc_mapping.txt
+diff <(reverse_index 4) <(zcat __EC_2_MetaCyc_mapping.txt.gz)
+test $(zcat __KEGG_Reaction_2_MetaCyc_mapping.txt.gz | grep -c ",") -gt 0
@@ -0,0 +1,43 @@
+#!/usr/bin/env bash
+
+set -eu
+
+## Scraped reactions are cached by master ID and sibling RHEA IDs share one request
+PORT=8798
+rm -fr __mock_rhea_cache.log __rhea_cache.sqlite
+python2 mock_http_server.py --dir rhea_html --port $PORT --log __mock_rhea_cache.log &
+SERVER=$!
+trap "kill $SERVER" EXIT
+sleep 1
+
+## The 11 RHEA IDs with a KEGG reaction, each followed by the other IDs of its reaction (master ID = ID - ID % 4), 
+## 1 page without the "Links to other resources" table and 1 page that does not exist
+cut -f1 test.rhea_id-reaction_id | awk '{split($1, a, ":"); m = a[2] - a[2] % 4; print $1; for (i = 0; i < 4; i++) if (m + i != a[2]) print "RHEA:"(m + i)}' > __rhea_cache_ids.txt
+(echo "RHEA:99999"; echo "5-NUCLEOTID-RXN") >> __rhea_cache_ids.txt
+awk 'BEGIN{OFS="\t"} {split($1, a, ":"); m = a[2] - a[2] % 4; print $0; for (i = 0; i < 4; i++) if (m + i != a[2]) print "RHEA:"(m + i), $2}' test.rhea_id-reaction_id > __rhea_cache.expected.txt
+
+scrape() {
+	./../scripts/get_KEGG_reaction_ID_from_RHEA_ID.py --rhea_url "http://127.0.0.1:$PORT/rhea/" \
+		--threads 4 --rate 0 --cache __rhea_cache.sqlite --keep_order "${@}"
+}
+
+## First half of the IDs: one request per reaction
+head -n 24 __rhea_cache_ids.txt > __rhea_cache_ids.half.txt
+scrape -r __rhea_cache_ids.half.txt -o __rhea_cache.half.txt 2> __rhea_cache.half.log
+diff <(head -n 24 __rhea_cache.expected.txt) __rhea_cache.half.txt
+test $(wc -l < __mock_rhea_cache.log) -eq 6
+grep -q "0 from local, 0 from cache, 24 from rhea-db.org, 0 not found, 0 failed" __rhea_cache.half.log
+
+## All IDs: only the reactions not scraped by the first run are requested
+scrape -r __rhea_cache_ids.txt -o __rhea_cache.all.txt 2> __rhea_cache.all.log
+diff __rhea_cache.expected.txt __rhea_cache.all.txt
+test $(wc -l < __mock_rhea_cache.log) -eq 13
+grep -q "0 from local, 24 from cache, 20 from rhea-db.org, 2 not found, 0 failed" __rhea_cache.all.log
+test -z "$(tail -n +7 __mock_rhea_cache.log | grep -e "/10750" -e "/13065" -e "/13336" -e "/13665" -e "/15093" -e "/16812" || true)"
+
+## Rerun: everything from the cache (including IDs that were not found), no requests
+scrape -r __rhea_cache_ids.txt -o __rhea_cache.rerun.txt 2> __rhea_cache.rerun.log
+diff __rhea_cache.expected.txt __rhea_cache.rerun.txt
+test $(wc -l < __mock_rhea_cache.log) -eq 13
+grep -q "0 from local, 44 from cache, 0 from rhea-db.org, 2 not found, 0 failed" __rhea_cache.rerun.log
+grep -q "0 requests to rhea-db.org" __rhea_cache.rerun.log
@@ -0,0 +1,31 @@
+#!/usr/bin/env bash
+
+set -eu
+
+## Default (whole file) and --stream parsing of a small Rhea RDF file should give the same mapping
+./../scripts/prepare_RHEA_rdf_file.py -r rhea.rdf -o __rhea.mapping.txt
+diff rhea.mapping.txt __rhea.mapping.txt
+
+gzip -c rhea.rdf > __rhea.rdf.gz
+./../scripts/prepare_RHEA_rdf_file.py -r __rhea.rdf.gz -o __rhea.stream.mapping.txt --stream
+diff rhea.mapping.txt __rhea.stream.mapping.txt
+
+## Same reactions with every description in reverse order (directional reactions before their "Reaction" element)
+./../scripts/prepare_RHEA_rdf_file.py -r rhea.reversed.rdf -o __rhea.reversed.mapping.txt
+diff <(sort rhea.mapping.txt) <(sort __rhea.reversed.mapping.txt)
+./../scripts/prepare_RHEA_rdf_file.py -r rhea.reversed.rdf -o __rhea.reversed.mapping.txt --stream
+diff <(sort rhea.mapping.txt) <(sort __rhea.reversed.mapping.txt)
+
+## --workers: chunks of a few descriptions each (groups split across chunks) merged back in file order
+./../scripts/prepare_RHEA_rdf_file.py -r __rhea.rdf.gz -o __rhea.workers.mapping.txt --workers 3 --chunk_size 0.001
+diff rhea.mapping.txt __rhea.workers.mapping.txt
+./../scripts/prepare_RHEA_rdf_file.py -r rhea.reversed.rdf -o __rhea.workers.mapping.txt --workers 2 --chunk_size 0.0005
+diff <(sort rhea.mapping.txt) <(sort __rhea.workers.mapping.txt)
+
+## --workers: a link that can not be split in a worker should fail the run (not hang waiting for the worker)
+sed 's|rdf:resource="http://identifiers.org/kegg.reaction/R|rdf:resource="http://identifiers.org/kegg.reaction/x/R|' rhea.rdf > __rhea.bad_link.rdf
+grep -q 'kegg.reaction/x/R' __rhea.bad_link.rdf
+status=0
+timeout 60 ./../scripts/prepare_RHEA_rdf_file.py -r __rhea.bad_link.rdf -o __rhea.bad_link.mapping.txt --workers 2 --chunk_size 0.001 2> __rhea.bad_link.log || status=$?
+test $status -eq 1
+grep -q 'Could not split link "kegg.reaction/x/R' __rhea.bad_link.log
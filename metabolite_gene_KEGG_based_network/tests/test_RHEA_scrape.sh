@@ -0,0 +1,54 @@
+#!/usr/bin/env bash
+
+set -eu
+
+## Concurrent scraping of (canned) rhea-db.org pages with injected latency and errors
+PORT=8796
+SLOW_PORT=8797
+rm -fr __mock_rhea.log __mock_rhea_slow.log
+python2 mock_http_server.py --dir rhea_html --port $PORT --log __mock_rhea.log --latency 0.2 --error_rate 0.3 &
+SERVER=$!
+python2 mock_http_server.py --dir rhea_html --port $SLOW_PORT --log __mock_rhea_slow.log --latency 2 --seed 2 &
+SLOW_SERVER=$!
+trap "kill $SERVER $SLOW_SERVER" EXIT
+sleep 1
+
+## 11 RHEA IDs with a KEGG reaction, 1 page without the "Links to other resources" table and 1 page that does not exist
+(cut -f1 test.rhea_id-reaction_id; echo "RHEA:99999"; echo "5-NUCLEOTID-RXN") > __rhea_scrape_ids.txt
+
+scrape() {
+	./../scripts/get_KEGG_reaction_ID_from_RHEA_ID.py -r __rhea_scrape_ids.txt --rhea_url "http://127.0.0.1:$PORT/rhea/" \
+		--threads 4 --rate 0 --retries 20 --backoff 0.01 --max_backoff 0.05 "${@}"
+}
+
+## Retries hide the injected errors; --keep_order gives the same output as scraping one ID at a time
+scrape --keep_order -o __rhea_scrape.ordered.txt 2> __rhea_scrape.log
+diff test.rhea_id-reaction_id __rhea_scrape.ordered.txt
+grep -q "0 from local, 11 from rhea-db.org, 2 not found, 0 failed" __rhea_scrape.log
+test $(grep -c "rhea" __mock_rhea.log) -gt 13
+
+## Unordered output has the same lines
+scrape -o __rhea_scrape.unordered.txt 2> /dev/null
+diff <(sort test.rhea_id-reaction_id) <(sort __rhea_scrape.unordered.txt)
+
+## Half of the IDs from a local mapping file, the rest scraped, still in input order
+head -n 5 test.rhea_id-reaction_id | awk 'BEGIN{OFS="\t"} {print $1, $2, "", ""}' > __rhea_scrape.mapping.txt
+N_REQUESTS=$(wc -l < __mock_rhea.log)
+scrape --keep_order --mapping __rhea_scrape.mapping.txt -o __rhea_scrape.mixed.txt 2> __rhea_scrape.mixed.log
+diff test.rhea_id-reaction_id __rhea_scrape.mixed.txt
+grep -q "5 from mapping file, 6 from rhea-db.org, 2 not found, 0 failed" __rhea_scrape.mixed.log
+test -z "$(tail -n +$((N_REQUESTS + 1)) __mock_rhea.log | grep -e "/10750" -e "/13065" -e "/13336" -e "/13665" -e "/15093" || true)"
+
+## Rate limit: 13 (or more, with retries) requests at 10 requests/sec take at least 1.2 sec
+START=$(date +%s.%N)
+./../scripts/get_KEGG_reaction_ID_from_RHEA_ID.py -r __rhea_scrape_ids.txt --rhea_url "http://127.0.0.1:$PORT/rhea/" \
+	--threads 8 --rate 10 --retries 20 --backoff 0.01 --max_backoff 0.05 -o __rhea_scrape.rate.txt 2> /dev/null
+python2 -c "import sys, time; sys.exit(0 if time.time() - $START >= 1.2 else 1)"
+diff <(sort test.rhea_id-reaction_id) <(sort __rhea_scrape.rate.txt)
+
+## Requests that hang are timed out (and retried) instead of stalling the run
+START=$(date +%s.%N)
+./../scripts/get_KEGG_reaction_ID_from_RHEA_ID.py -r __rhea_scrape_ids.txt --rhea_url "http://127.0.0.1:$SLOW_PORT/rhea/" \
+	--threads 13 --rate 0 --timeout 0.2 --retries 1 --backoff 0.01 -o __rhea_scrape.slow.txt 2> __rhea_scrape.slow.log || true
+python2 -c "import sys, time; sys.exit(0 if time.time() - $START < 10 else 1)"
+test $(grep -c "Failed to download page" __rhea_scrape.slow.log) -ge 1
@@ -0,0 +1,17 @@
+#!/usr/bin/env bash
+
+set -eu
+
+## RHEA IDs resolved from the local mapping file / ID crosswalk without scraping rhea-db.org
+(cut -f1 test.rhea_id-reaction_id; echo "5-NUCLEOTID-RXN") > __rhea_ids.txt
+
+./../scripts/get_KEGG_reaction_ID_from_RHEA_ID.py -r __rhea_ids.txt -o __rhea_id-reaction_id.mapping.txt \
+	--mapping ../data/RHEA_2_KEGG_Reaction_mapping.txt.gz --offline 2> __rhea_to_kegg.log
+diff test.rhea_id-reaction_id __rhea_id-reaction_id.mapping.txt
+grep -q "11 from mapping file, 0 from rhea-db.org, 1 not found" __rhea_to_kegg.log
+
+rm -f __ID_crosswalk.rhea.sqlite
+./../scripts/build_ID_crosswalk.py -r ../data/RHEA_2_KEGG_Reaction_mapping.txt.gz -o __ID_crosswalk.rhea.sqlite
+./../scripts/get_KEGG_reaction_ID_from_RHEA_ID.py -r __rhea_ids.txt -o __rhea_id-reaction_id.crosswalk.txt \
+	--crosswalk __ID_crosswalk.rhea.sqlite --offline
+diff test.rhea_id-reaction_id __rhea_id-reaction_id.crosswalk.txt
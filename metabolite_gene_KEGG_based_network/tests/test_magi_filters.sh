@@ -0,0 +1,38 @@
+#!/usr/bin/env bash
+
+set -eu
+
+## Filter MAGI gene/compound results (same filters as the awk commands in make_tests.sh)
+FILTER='NR>1 && $6>=1 && $9==2 && $11>5 && $13>5'
+awk -F',' "$FILTER"' {print $2"\t"$14}' magi_gene_results.csv > __magi_gene_results.expected.txt
+awk -F',' "$FILTER"' {print $17"\t"($4 != "" ? $4 : $3)"\t"$16"\t"$12}' magi_compound_results.csv > __magi_compound_results.expected.txt
+test $(wc -l < __magi_gene_results.expected.txt) -gt 0
+test $(wc -l < __magi_compound_results.expected.txt) -gt 0
+
+./../scripts/filter_magi_gene_results.py -i magi_gene_results.csv -o __magi_gene_results.filtered.txt
+diff __magi_gene_results.expected.txt __magi_gene_results.filtered.txt
+./../scripts/filter_magi_compound_results.py -i magi_compound_results.csv -o __magi_compound_results.filtered.txt
+diff __magi_compound_results.expected.txt __magi_compound_results.filtered.txt
+
+## Quoted note fields with commas and quotes in them (gzip input) give the same results
+for TYPE in gene compound; do
+	awk 'BEGIN{FS=OFS=","} NR>1{$5="\"" $5 ", via \"\"x\"\", y\""} {print}' magi_${TYPE}_results.csv | gzip -c > __magi_${TYPE}_results.quoted.csv.gz
+	./../scripts/filter_magi_${TYPE}_results.py -i __magi_${TYPE}_results.quoted.csv.gz -o __magi_${TYPE}_results.quoted.filtered.txt
+	diff __magi_${TYPE}_results.expected.txt __magi_${TYPE}_results.quoted.filtered.txt
+done
+
+## Quoted fields with new lines in them (first rows unquoted)
+awk 'BEGIN{FS=OFS=","} NR>50{$5="\"" $5 ",\nnext line\""} {print}' magi_gene_results.csv > __magi_gene_results.multiline.csv
+test $(wc -l < __magi_gene_results.multiline.csv) -gt 101
+./../scripts/filter_magi_gene_results.py -i __magi_gene_results.multiline.csv -o __magi_gene_results.multiline.filtered.txt
+diff __magi_gene_results.expected.txt __magi_gene_results.multiline.filtered.txt
+
+## Column projection by header name
+./../scripts/csv_columns.py -i __magi_compound_results.quoted.csv.gz -c feature,note -o __magi_compound_results.columns.txt
+test "$(head -n 1 __magi_compound_results.columns.txt)" == "$(awk -F',' 'NR==2{print $17"\t"$5", via \"x\", y"}' magi_compound_results.csv)"
+test $(wc -l < __magi_compound_results.columns.txt) -eq 100
+
+## Missing columns are reported
+sed '1s/e_score_g2r/e_score_gene2reaction/' magi_gene_results.csv > __magi_gene_results.renamed.csv
+if ./../scripts/filter_magi_gene_results.py -i __magi_gene_results.renamed.csv -o /dev/null 2> __magi_gene_results.renamed.log; then exit 1; fi
+grep -q 'Column name "e_score_g2r" not found' __magi_gene_results.renamed.log